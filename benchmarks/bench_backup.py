@@ -0,0 +1,117 @@
+"""Benchmark: scheduler tick latency while the database is being backed up
+
+A scheduler-like loop writes next run times every tick while a backup of
+a large database runs in a pool process, the way the backup_database
+action runs. Compare the tick percentiles with no backup, a paced backup
+(the defaults), an unpaced one (the whole database in one step) and a
+plain file copy, which is fast but can be torn by concurrent writes.
+
+Run from the project root:
+    python -m benchmarks.bench_backup --size-mb 200 --tasks 1000
+"""
+
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from utils import database, backup
+
+TICK_SECONDS = 0.02
+TICK_WRITES = 20
+FILL_ROW_BYTES = 4000
+
+
+def make_database(db_path, size_mb, tasks):
+    database.initialize_database(db_path, {"tasks": [
+        {"name": f"task-{i}", "action": "check_api_health", "condition_type": "interval", "condition_value": "60"}
+        for i in range(tasks)
+    ]})
+    conn = database.get_connection(db_path)
+    with conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS bench_fill (data BLOB)")
+        conn.executemany("INSERT INTO bench_fill VALUES (randomblob(?))",
+                         ((FILL_ROW_BYTES,) for _ in range(size_mb * 1024 * 1024 // FILL_ROW_BYTES)))
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+def run_ticks(db_path, tasks, stop):
+    """Write next run times like the scheduler until `stop`; returns tick latencies (ms)"""
+    latencies = []
+    task_id = 0
+    while not stop.is_set():
+        started = time.perf_counter()
+        updates = []
+        for _ in range(TICK_WRITES):
+            task_id = task_id % tasks + 1
+            updates.append((time.time() + 60, task_id))
+        database.update_tasks_next_run(db_path, updates)
+        database.get_next_run_after(db_path, time.time())
+        latencies.append((time.perf_counter() - started) * 1000)
+        stop.wait(TICK_SECONDS)
+    database.close_thread_connections()
+    return latencies
+
+
+def file_copy(db_path, directory, settings):
+    os.makedirs(directory, exist_ok=True)
+    shutil.copyfile(db_path, os.path.join(directory, "copy.db"))
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def measure(db_path, tasks, job, directory, settings, pool, idle_seconds):
+    stop = threading.Event()
+    result = {}
+    ticker = threading.Thread(target=lambda: result.update(ticks=run_ticks(db_path, tasks, stop)))
+    ticker.start()
+    started = time.perf_counter()
+    if job is None:
+        time.sleep(idle_seconds)
+    else:
+        pool.submit(job, db_path, directory, settings).result()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    ticker.join()
+    shutil.rmtree(directory, ignore_errors=True)
+    return elapsed, result["ticks"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark tick latency during database backups')
+    parser.add_argument('--size-mb', type=int, default=200, help='Approximate database size')
+    parser.add_argument('--tasks', type=int, default=1000, help='Number of tasks')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "tasks.db")
+        make_database(db_path, args.size_mb, args.tasks)
+        print(f"database: {os.path.getsize(db_path) / (1024 * 1024):.0f} MiB, {os.cpu_count()} CPUs")
+        directory = os.path.join(tmp_dir, "backups")
+        paced = backup.get_backup_settings(None)
+        unpaced = dict(paced, pages_per_step=-1, step_pause=0)
+        runs = [
+            ("no backup", None, paced),
+            ("paced backup", backup.create_backup, paced),
+            ("unpaced backup", backup.create_backup, unpaced),
+            ("paced, no gzip", backup.create_backup, dict(paced, compress=False)),
+            ("file copy", file_copy, paced),
+        ]
+        print(f"{'':16} {'seconds':>8} {'ticks':>6} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            pool.submit(time.sleep, 0).result()  # start the worker up front
+            idle_seconds = 3.0
+            for label, job, settings in runs:
+                elapsed, ticks = measure(db_path, args.tasks, job, directory, settings, pool, idle_seconds)
+                print(f"{label:16} {elapsed:8.2f} {len(ticks):6} {percentile(ticks, 0.5):8.2f} "
+                      f"{percentile(ticks, 0.99):8.2f} {max(ticks):8.2f}")
+        database.close_connections()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Benchmark: scheduler database ticks per second, per-call vs pooled connections
+
+Run from the project root:
+    python -m benchmarks.bench_database --tasks 200 --updates 20 --seconds 3
+"""
+
+import os
+import time
+import sqlite3
+import argparse
+import tempfile
+from datetime import datetime
+from utils import database
+
+
+def legacy_get_tasks(db_path):
+    """The original get_tasks: one connection per call"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM tasks WHERE is_active = 1")
+    tasks = cursor.fetchall()
+    conn.close()
+    return tasks
+
+
+def legacy_update_task_last_run(db_path, task_id):
+    """The original update_task_last_run: one connection and commit per call"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute(
+        "UPDATE tasks SET last_run = ? WHERE id = ?",
+        (datetime.now().isoformat(), task_id)
+    )
+    conn.commit()
+    conn.close()
+
+
+def make_database(db_path, task_count, wal):
+    """Create a tasks database with task_count synthetic rows"""
+    if wal:
+        database.initialize_database(db_path, {})
+        conn = database.get_connection(db_path)
+    else:
+        conn = sqlite3.connect(db_path)
+        conn.execute("""
+        CREATE TABLE tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            action TEXT NOT NULL,
+            condition_type TEXT NOT NULL,
+            condition_value TEXT NOT NULL,
+            is_active BOOLEAN DEFAULT 1,
+            last_run TIMESTAMP DEFAULT NULL
+        )
+        """)
+    with conn:
+        conn.executemany(
+            "INSERT INTO tasks (name, action, condition_type, condition_value) VALUES (?, ?, ?, ?)",
+            ((f"task-{i}", "check_api_health", "time", str(i % 1440)) for i in range(task_count))
+        )
+    if not wal:
+        conn.close()
+
+
+def run_ticks(get_tasks, update_task_last_run, db_path, updates, seconds):
+    """Run read-then-update ticks for `seconds` and return ticks per second"""
+    ticks = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        tasks = get_tasks(db_path)
+        for task in tasks[:updates]:
+            update_task_last_run(db_path, task[0])
+        ticks += 1
+    return ticks / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark database ticks per second')
+    parser.add_argument('--tasks', type=int, default=200, help='Number of task rows')
+    parser.add_argument('--updates', type=int, default=20, help='last_run updates per tick')
+    parser.add_argument('--seconds', type=float, default=3.0, help='Duration of each run')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        before_path = os.path.join(tmp, "before.db")
+        after_path = os.path.join(tmp, "after.db")
+        make_database(before_path, args.tasks, wal=False)
+        make_database(after_path, args.tasks, wal=True)
+
+        before = run_ticks(legacy_get_tasks, legacy_update_task_last_run,
+                           before_path, args.updates, args.seconds)
+        after = run_ticks(database.get_tasks, database.update_task_last_run,
+                          after_path, args.updates, args.seconds)
+        database.close_connections()
+
+    print(f"tasks={args.tasks} updates/tick={args.updates}")
+    print(f"before (connect per call): {before:10.1f} ticks/s")
+    print(f"after  (pooled + WAL):     {after:10.1f} ticks/s")
+    print(f"speedup:                   {after / before:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Benchmark: health-check throughput and latency against the local stub server
+
+Run from the project root:
+    python -m benchmarks.bench_health --checks 5000 --concurrency 200
+"""
+
+import time
+import argparse
+from tests.http_stub import StubServer
+from utils.health import HealthCheckEngine
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a sorted list"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark health-check throughput')
+    parser.add_argument('--checks', type=int, default=5000, help='Number of checks to run')
+    parser.add_argument('--concurrency', type=int, default=200, help='Concurrency cap')
+    parser.add_argument('--idle', type=int, default=64, help='Idle keep-alive connections per host')
+    parser.add_argument('--path', default='/health', help='Stub endpoint, e.g. /slow?delay=0.01')
+    args = parser.parse_args()
+
+    server = StubServer().start()
+    engine = HealthCheckEngine(concurrency=args.concurrency, max_idle_per_host=args.idle)
+    try:
+        urls = [server.url(args.path)] * args.checks
+        started = time.perf_counter()
+        results = engine.submit(engine.check_many(urls)).result()
+        elapsed = time.perf_counter() - started
+    finally:
+        engine.close()
+        server.stop()
+
+    latencies = sorted(result.latency for result in results)
+    failures = sum(1 for result in results if not result.ok)
+    print(f"checks={args.checks} concurrency={args.concurrency} failures={failures}")
+    print(f"throughput:   {args.checks / elapsed:10.1f} checks/s ({args.checks / elapsed * 60:.0f}/min)")
+    print(f"latency p50:  {percentile(latencies, 0.50) * 1000:10.2f} ms")
+    print(f"latency p95:  {percentile(latencies, 0.95) * 1000:10.2f} ms")
+    print(f"latency p99:  {percentile(latencies, 0.99) * 1000:10.2f} ms")
+    print(f"connections:  {engine.connections_opened:10d} opened")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Benchmark: execution history writes, compaction and queries at scale
+
+Run from the project root:
+    python -m benchmarks.bench_history --runs 1000000 --tasks 1000 --days 7
+"""
+
+import os
+import time
+import random
+import argparse
+import tempfile
+from utils import database, history
+
+BATCH = 5000
+
+
+def fill(db_path, runs, tasks, days, now):
+    """Write `runs` raw runs spread evenly over the last `days` days"""
+    step = days * history.DAY / runs
+    started = time.perf_counter()
+    batch = []
+    for i in range(runs):
+        ended = int(now - days * history.DAY + i * step)
+        outcome = history.OUTCOME_FAILED if random.random() < 0.05 else history.OUTCOME_OK
+        batch.append((random.randrange(1, tasks + 1), ended, random.randint(1, 2000), outcome))
+        if len(batch) >= BATCH:
+            history.write_runs(db_path, batch)
+            batch = []
+    if batch:
+        history.write_runs(db_path, batch)
+    return time.perf_counter() - started
+
+
+def timed(function, repeat=5):
+    """Best wall time of `repeat` calls, in milliseconds"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark execution history')
+    parser.add_argument('--runs', type=int, default=1000000, help='Number of recorded runs')
+    parser.add_argument('--tasks', type=int, default=1000, help='Number of distinct tasks')
+    parser.add_argument('--days', type=int, default=7, help='Days the runs are spread over')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "history.db")
+        database.initialize_database(db_path, {})
+        now = time.time()
+
+        recorder = history.HistoryRecorder(db_path)
+        record_ms = timed(lambda: [recorder.record(1, history.OUTCOME_OK, 0.01) for _ in range(10000)], 1)
+        print(f"record():                {record_ms / 10:.2f} us/call")
+
+        seconds = fill(db_path, args.runs, args.tasks, args.days, now)
+        print(f"batched inserts:         {args.runs / seconds:,.0f} runs/s")
+
+        raw_day = timed(lambda: history.task_stats(db_path, now - history.DAY), 1)
+        print(f"24h, all tasks (raw):    {raw_day:.1f} ms")
+
+        started = time.perf_counter()
+        history.compact_history(db_path, now=now)
+        print(f"compaction:              {(time.perf_counter() - started) * 1000:.0f} ms")
+        size = os.path.getsize(db_path) / (1024 * 1024)
+        print(f"database size:           {size:.1f} MiB")
+
+        print(f"24h, all tasks:          {timed(lambda: history.task_stats(db_path, now - history.DAY)):.1f} ms")
+        week = timed(lambda: history.task_stats(db_path, now - 7 * history.DAY, task_id=1))
+        print(f"7d, one task (p95/rate): {week:.2f} ms")
+        database.close_connections()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,391 @@
+"""Benchmark: scheduler scaling with synthetic task populations
+
+Fills a tasks database with N synthetic tasks (a mix of time, daily,
+interval and cron conditions) and drives the scheduler with a simulated
+clock: sleeps are skipped, but the time spent computing still moves the
+clock, so drift reflects real processing delay. Two drivers are measured:
+
+- process: refresh_schedule + process_scheduled_tasks, as the loop calls them
+- loop:    the real run_application_loop with the clock patched in
+
+Each population/driver pair runs in a fresh process so peak RSS is its own.
+Results are written as JSON; pass --baseline to compare with an older run.
+
+Run from the project root:
+    python -m benchmarks.bench_scheduler --tasks 1000 100000 1000000 --duration 900
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import sqlite3
+import argparse
+import tempfile
+import threading
+import concurrent.futures
+import multiprocessing
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+from utils import app, database
+from utils.scheduler import TaskScheduler
+from utils.dispatch import Dispatcher
+
+INTERVALS = ("1m", "5m", "15m", "1h", "6h", "1d")
+CRON_EXPRESSIONS = ("*/5 * * * *", "0 * * * *", "*/15 9-17 * * *", "30 9 * * mon-fri", "@daily")
+DRIVERS = ("process", "loop")
+
+# Drift is sampled rather than stored per fire so it does not inflate RSS
+DRIFT_SAMPLES = 10000
+
+
+def synthetic_tasks(count, seed=1):
+    """Yield `count` task dicts spread evenly across condition types"""
+    rng = random.Random(seed)
+    for i in range(count):
+        kind = i % 4
+        if kind == 0:
+            condition_type, condition_value = "time", str(rng.randrange(1440))
+        elif kind == 1:
+            condition_type = "daily"
+            condition_value = f"{rng.randrange(24):02d}:{rng.randrange(60):02d}:{rng.randrange(60):02d}"
+        elif kind == 2:
+            condition_type, condition_value = "interval", rng.choice(INTERVALS)
+        else:
+            condition_type, condition_value = "cron", rng.choice(CRON_EXPRESSIONS)
+        yield {
+            "name": f"task-{i}",
+            "action": "check_api_health",
+            "condition_type": condition_type,
+            "condition_value": condition_value,
+            "target": f"http://127.0.0.1:8080/health/{i}",
+        }
+
+
+def percentiles(values):
+    """p50/p95/p99/max of a list of values"""
+    values = sorted(values)
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+
+    def at(fraction):
+        return values[min(len(values) - 1, int(fraction * len(values)))]
+
+    return {"p50": at(0.50), "p95": at(0.95), "p99": at(0.99), "max": values[-1]}
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process in KiB (None if unknown)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+class SimulatedClock:
+    """Stands in for the time module: sleeping skips ahead, computing does not"""
+
+    def __init__(self, start):
+        self._offset = start - time.perf_counter()
+
+    def time(self):
+        return time.perf_counter() + self._offset
+
+    monotonic = time
+
+    def perf_counter(self):
+        return time.perf_counter()
+
+    def sleep(self, seconds):
+        self._offset += max(seconds, 0)
+
+
+class TickRecorder:
+    """Collects per-tick latency, DB statements, fires and firing drift"""
+
+    def __init__(self, clock, seed=1):
+        self.clock = clock
+        self.latencies = []
+        self.db_ops = []
+        self.fired = []
+        self.drift = []
+        self.drift_seen = 0
+        self.statements = 0
+        self._rng = random.Random(seed)
+        self._started = None
+        self._statements = 0
+        self._fired = 0
+
+    def trace(self, statement):
+        self.statements += 1
+
+    def begin(self):
+        self._started = time.perf_counter()
+        self._statements = self.statements
+        self._fired = 0
+
+    def end(self):
+        if self._started is None:
+            return
+        self.latencies.append(time.perf_counter() - self._started)
+        self.db_ops.append(self.statements - self._statements)
+        self.fired.append(self._fired)
+        self._started = None
+
+    def fire(self, fire_at):
+        self._fired += 1
+        self.drift_seen += 1
+        drift = self.clock.time() - fire_at
+        # Reservoir sampling keeps a uniform sample of bounded size
+        if len(self.drift) < DRIFT_SAMPLES:
+            self.drift.append(drift)
+        else:
+            slot = self._rng.randrange(self.drift_seen)
+            if slot < DRIFT_SAMPLES:
+                self.drift[slot] = drift
+
+
+class NullExecutor:
+    """TaskExecutor stand-in that records the fire instead of running an action"""
+
+    def __init__(self, recorder, on_complete=None):
+        self.recorder = recorder
+        self.on_complete = on_complete
+
+    def submit(self, task_id, name, action, fire_at=None, target=None):
+        self.recorder.fire(fire_at)
+        if self.on_complete is not None:
+            self.on_complete(_Run(task_id, name, action), True, 0.0)
+        return True
+
+    def has_capacity(self, action):
+        return True
+
+    def check_timeouts(self):
+        return 0
+
+    def seconds_until_timeout(self):
+        return None
+
+    def running(self):
+        return 0
+
+    def shutdown(self, timeout=None):
+        pass
+
+
+class _Run:
+    __slots__ = ("task_id", "name", "action", "timed_out")
+
+    def __init__(self, task_id, name, action):
+        self.task_id = task_id
+        self.name = name
+        self.action = action
+        self.timed_out = False
+
+
+class SimulatedStop:
+    """stop_flag for run_application_loop that advances the clock instead of waiting"""
+
+    def __init__(self, clock, until, recorder):
+        self.clock = clock
+        self.until = until
+        self.recorder = recorder
+        self._event = threading.Event()
+
+    def is_set(self):
+        return self._event.is_set() or self.clock.time() >= self.until
+
+    def set(self):
+        self._event.set()
+
+    def clear(self):
+        self._event.clear()
+
+    def wait(self, timeout=None):
+        # A wait ends one loop iteration and the wake-up starts the next
+        self.recorder.end()
+        self.clock.sleep(timeout or 0)
+        self.recorder.begin()
+        return self.is_set()
+
+
+def drive_process(db_path, clock, recorder, duration):
+    """Call refresh_schedule/process_scheduled_tasks the way the loop does"""
+    cache = database.TaskCache(db_path)
+    scheduler = TaskScheduler()
+    executor = NullExecutor(recorder)
+    dispatcher = Dispatcher()
+    unschedulable = set()
+
+    started = time.perf_counter()
+    app.refresh_schedule(cache, scheduler, clock.time(), unschedulable)
+    startup = time.perf_counter() - started
+
+    end = clock.time() + duration
+    while True:
+        wake = min(d for d in (scheduler.next_deadline(), scheduler.horizon, clock.time() + app.MAX_SLEEP_SECONDS)
+                   if d is not None)
+        if wake >= end:
+            break
+        clock.sleep(wake - clock.time())
+        recorder.begin()
+        now = clock.time()
+        if now >= scheduler.horizon:
+            app.refresh_schedule(cache, scheduler, now, unschedulable)
+        app.process_scheduled_tasks(db_path, scheduler, None, executor, now, cache, dispatcher=dispatcher)
+        recorder.end()
+    return startup
+
+
+def drive_loop(db_path, clock, recorder, duration):
+    """Run the real run_application_loop against the simulated clock"""
+    stop = SimulatedStop(clock, clock.time() + duration, recorder)
+    patched = {
+        (app, "time"): clock,
+        (database, "time"): clock,
+        (app, "TaskExecutor"): lambda run_action, config=None, on_complete=None, *args: NullExecutor(recorder, on_complete),
+    }
+    saved = {key: getattr(*key) for key in patched}
+    try:
+        for (module, name), value in patched.items():
+            setattr(module, name, value)
+        recorder.begin()  # the first iteration includes startup
+        app.run_application_loop(db_path, os.devnull, stop_flag=stop)
+    finally:
+        for (module, name), value in saved.items():
+            setattr(module, name, value)
+    # Report the loading iteration as startup, not as a tick
+    startup = recorder.latencies.pop(0) if recorder.latencies else 0.0
+    if recorder.db_ops:
+        recorder.db_ops.pop(0)
+        recorder.fired.pop(0)
+    return startup
+
+
+def run_driver(template_path, task_count, driver, duration, start):
+    """Run one driver on a private copy of the template database (in a child process)"""
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "tasks.db")
+        shutil.copyfile(template_path, db_path)
+
+        clock = SimulatedClock(start)
+        recorder = TickRecorder(clock)
+        database.get_connection(db_path).set_trace_callback(recorder.trace)
+        drive = drive_process if driver == "process" else drive_loop
+        startup = drive(db_path, clock, recorder, duration)
+        database.close_connections()
+
+    ticks = len(recorder.latencies)
+    return {
+        "tasks": task_count,
+        "driver": driver,
+        "simulated_seconds": duration,
+        "startup_seconds": startup,
+        "ticks": ticks,
+        "fired": recorder.drift_seen,
+        "tick_ms": {k: v * 1000 for k, v in percentiles(recorder.latencies).items()},
+        "drift_ms": {k: v * 1000 for k, v in percentiles(recorder.drift).items()},
+        "db_ops_per_tick": {
+            "mean": sum(recorder.db_ops) / ticks if ticks else 0.0,
+            "max": max(recorder.db_ops) if ticks else 0,
+        },
+        "fired_per_tick_max": max(recorder.fired) if ticks else 0,
+        "peak_rss_kb": peak_rss_kb(),
+    }
+
+
+def build_template(db_path, task_count):
+    """Create the synthetic population once; returns the import time"""
+    started = time.perf_counter()
+    database.initialize_database(db_path, {})
+    database.import_tasks(db_path, synthetic_tasks(task_count))
+    elapsed = time.perf_counter() - started
+    database.close_connections()
+    return elapsed
+
+
+def compare(results, baseline_path):
+    """Print the change in key metrics against an earlier results file"""
+    with open(baseline_path) as file:
+        baseline = {(r["tasks"], r["driver"]): r for r in json.load(file)["results"]}
+    print(f"\nvs {baseline_path}:")
+    for result in results:
+        old = baseline.get((result["tasks"], result["driver"]))
+        if old is None:
+            continue
+        changes = []
+        for label, new_value, old_value in (
+            ("tick p95", result["tick_ms"]["p95"], old["tick_ms"]["p95"]),
+            ("tick p99", result["tick_ms"]["p99"], old["tick_ms"]["p99"]),
+            ("drift p99", result["drift_ms"]["p99"], old["drift_ms"]["p99"]),
+            ("db ops", result["db_ops_per_tick"]["mean"], old["db_ops_per_tick"]["mean"]),
+            ("rss", result["peak_rss_kb"] or 0, old["peak_rss_kb"] or 0),
+        ):
+            if old_value:
+                changes.append(f"{label} {(new_value - old_value) / old_value * 100:+.1f}%")
+        print(f"  {result['tasks']:>8} {result['driver']:<7} " + ", ".join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark scheduler scaling with synthetic tasks')
+    parser.add_argument('--tasks', type=int, nargs='+', default=[1000, 100000, 1000000],
+                        help='Population sizes to test')
+    parser.add_argument('--duration', type=float, default=900.0, help='Simulated seconds per run')
+    parser.add_argument('--drivers', nargs='+', choices=DRIVERS, default=list(DRIVERS))
+    parser.add_argument('--output', default='bench_scheduler.json', help='Where to write JSON results')
+    parser.add_argument('--baseline', help='Earlier results file to compare against')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    # A fixed, local midnight start keeps runs comparable
+    start = datetime(2024, 1, 1).timestamp()
+    spawn = multiprocessing.get_context("spawn")
+    results = []
+
+    print(f"{'tasks':>8} {'driver':<7} {'startup s':>9} {'ticks':>6} {'fired':>8} "
+          f"{'tick p50':>9} {'p95':>8} {'p99':>8} {'drift p99':>9} {'db ops':>7} {'rss MiB':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for task_count in args.tasks:
+            template_path = os.path.join(tmp, f"template-{task_count}.db")
+            import_seconds = build_template(template_path, task_count)
+            for driver in args.drivers:
+                with concurrent.futures.ProcessPoolExecutor(1, mp_context=spawn) as pool:
+                    result = pool.submit(run_driver, template_path, task_count, driver,
+                                         args.duration, start).result()
+                result["import_seconds"] = import_seconds
+                results.append(result)
+                rss = result["peak_rss_kb"]
+                print(f"{task_count:>8} {driver:<7} {result['startup_seconds']:>9.2f} {result['ticks']:>6} "
+                      f"{result['fired']:>8} {result['tick_ms']['p50']:>7.2f}ms {result['tick_ms']['p95']:>6.2f}ms "
+                      f"{result['tick_ms']['p99']:>6.2f}ms {result['drift_ms']['p99']:>7.2f}ms "
+                      f"{result['db_ops_per_tick']['mean']:>7.1f} {rss / 1024 if rss else 0:>8.1f}")
+            os.remove(template_path)
+
+    report = {
+        "created": datetime.now().isoformat(),
+        "python": sys.version.split()[0],
+        "sqlite": sqlite3.sqlite_version,
+        "duration": args.duration,
+        "results": results,
+    }
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Benchmark: memory and due-set time of the in-memory task table
+
+Loads `--tasks` synthetic rows from an in-memory SQLite table (so every
+row carries its own strings, as the service's reads do) into:
+
+    tuples    the previous TaskCache layout: a dict of row tuples by id,
+              a heap of (next_run_at, id) and a set of unscheduled ids
+    columns   TaskTable, the current layout
+
+and reports the memory each holds (tracemalloc), the load time, and the
+time to find the tasks due in the next `--due-seconds`.
+
+Run from the project root:
+    python -m benchmarks.bench_tasktable --tasks 1000000
+"""
+
+import time
+import heapq
+import sqlite3
+import argparse
+import tracemalloc
+from utils.database import TASK_COLUMNS
+from utils.tasktable import TaskTable
+
+ACTIONS = ("check_api_health", "backup_database", "rotate_logs")
+START = 1_700_000_000.0
+
+
+def create_rows(count, spread_seconds):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("""CREATE TABLE tasks (id INTEGER PRIMARY KEY, name TEXT, action TEXT, condition_type TEXT,
+                    condition_value TEXT, is_active INTEGER, last_run TEXT, target TEXT, next_run_at REAL,
+                    priority INTEGER, misfire_policy TEXT)""")
+    conn.executemany(
+        "INSERT INTO tasks VALUES (?, ?, ?, ?, ?, 1, ?, ?, ?, ?, NULL)",
+        ((task_id, f"task-{task_id}", ACTIONS[task_id % len(ACTIONS)], "interval", str(1 + task_id % 60),
+          "2024-01-01T00:00:00" if task_id % 2 else None, f"https://service-{task_id % 100}.local/health",
+          START + (task_id * 7919) % count * spread_seconds / count, task_id % 3)
+         for task_id in range(1, count + 1)))
+    return conn
+
+
+class TupleTable:
+    """The layout TaskCache used before TaskTable"""
+
+    def __init__(self):
+        self.tasks = {}
+        self.unscheduled = set()
+        self.heap = []
+
+    def store(self, row):
+        self.tasks[row[0]] = row
+        if row[8] is None:
+            self.unscheduled.add(row[0])
+        else:
+            self.heap.append((row[8], row[0]))
+
+    def due(self, until):
+        heap, tasks = self.heap, self.tasks
+        due = []
+        seen = set()
+        while heap and heap[0][0] <= until:
+            entry = heapq.heappop(heap)
+            task = tasks.get(entry[1])
+            if task is not None and task[8] == entry[0] and entry[1] not in seen:
+                seen.add(entry[1])
+                due.append(entry)
+        for entry in due:
+            heapq.heappush(heap, entry)
+        return [tasks[task_id] for _, task_id in due]
+
+
+def measure(label, table, conn, args):
+    tracemalloc.start()
+    started = time.perf_counter()
+    for row in conn.execute(f"SELECT {TASK_COLUMNS} FROM tasks"):
+        table.store(row)
+    if isinstance(table, TupleTable):
+        heapq.heapify(table.heap)
+    load_seconds = time.perf_counter() - started
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    until = START + args.due_seconds
+    due = table.due(until)  # warm up: the first lookup may drop stale entries
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        due = table.due(until)
+    due_ms = (time.perf_counter() - started) / args.repeat * 1000
+    print(f"{label:<8} {current / 2**20:8.1f} MiB  {current / args.tasks:6.0f} B/task  "
+          f"load {load_seconds:5.2f}s  due {due_ms:7.2f} ms ({len(due)} tasks)")
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark task table memory and due lookups')
+    parser.add_argument('--tasks', type=int, default=1_000_000, help='Active tasks')
+    parser.add_argument('--spread-seconds', type=float, default=3600.0, help='Window next fire times fall in')
+    parser.add_argument('--due-seconds', type=float, default=1.0, help='Deadline of the due lookup')
+    parser.add_argument('--repeat', type=int, default=20, help='Due lookups timed')
+    args = parser.parse_args()
+
+    conn = create_rows(args.tasks, args.spread_seconds)
+    print(f"{args.tasks} tasks, next fire times over {args.spread_seconds:.0f}s")
+    tuples = measure("tuples", TupleTable(), conn, args)
+    columns = measure("columns", TaskTable(), conn, args)
+    print(f"columns use {columns / tuples:.0%} of the tuple layout's memory")
+
+
+if __name__ == "__main__":
+    main()
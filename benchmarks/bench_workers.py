@@ -0,0 +1,98 @@
+"""Benchmark: task throughput of the lease-based workers by process count
+
+Every task is due at once and each run burns `--work-ms` of CPU, so the
+runs/s show how claiming and execution scale across processes.
+
+Run from the project root:
+    python -m benchmarks.bench_workers --tasks 2000 --work-ms 2 --processes 1 2 4
+"""
+
+import os
+import time
+import argparse
+import tempfile
+import functools
+import itertools
+import multiprocessing
+from utils import database
+from utils.workers import TaskWorker
+
+# Runs made by this process; shared by the executor threads
+RUNS = itertools.count()
+
+CONFIG = {"services": {"executor": {"default_max_concurrency": 8}, "history": {"enabled": False}}}
+
+
+def burn(work_ms, action, name, target=None):
+    """A CPU-bound action taking about `work_ms` milliseconds"""
+    next(RUNS)
+    deadline = time.perf_counter() + work_ms / 1000
+    while time.perf_counter() < deadline:
+        pass
+    return True
+
+
+def drain(db_path, now, work_ms, start, results):
+    """Worker process: claim and run due tasks until none are left"""
+    worker = TaskWorker(db_path, CONFIG, run_action=functools.partial(burn, work_ms))
+    start.wait()
+    while worker.step(now) or worker._inflight:
+        worker._wake.wait(0.01)
+        worker._wake.clear()
+    worker.executor.shutdown()
+    worker.finish_runs(now)
+    results.put(next(RUNS))
+
+
+def make_database(db_path, task_count, now):
+    database.initialize_database(db_path, {"tasks": [
+        {"name": f"task-{i}", "action": "burn", "condition_type": "interval", "condition_value": "3600"}
+        for i in range(task_count)
+    ]})
+    conn = database.get_connection(db_path)
+    with conn:
+        conn.execute("UPDATE tasks SET next_run_at = ?", (now - 1,))
+    database.close_connections()
+
+
+def run(task_count, work_ms, processes):
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "tasks.db")
+        now = time.time()
+        make_database(db_path, task_count, now)
+        start = context.Event()
+        results = context.Queue()
+        workers = [context.Process(target=drain, args=(db_path, now, work_ms, start, results))
+                   for _ in range(processes)]
+        for worker in workers:
+            worker.start()
+        time.sleep(1)  # let every process import and connect first
+        started = time.perf_counter()
+        start.set()
+        runs = sum(results.get() for _ in workers)
+        elapsed = time.perf_counter() - started
+        for worker in workers:
+            worker.join()
+    return runs, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark lease-based worker throughput')
+    parser.add_argument('--tasks', type=int, default=2000, help='Number of due tasks')
+    parser.add_argument('--work-ms', type=float, default=2.0, help='CPU time per run')
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4], help='Process counts to try')
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {args.tasks} tasks, {args.work_ms} ms per run")
+    baseline = None
+    for processes in args.processes:
+        runs, elapsed = run(args.tasks, args.work_ms, processes)
+        rate = runs / elapsed
+        baseline = baseline or rate
+        status = "" if runs == args.tasks else f"  (expected {args.tasks} runs!)"
+        print(f"{processes:>3} processes: {rate:8.0f} runs/s  x{rate / baseline:.2f}{status}")
+
+
+if __name__ == "__main__":
+    main()
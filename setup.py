@@ -1,13 +1,14 @@
 """AtlasPi Application Entry Point"""
 
+import time
+STARTED = time.perf_counter()  # for --profile-startup
+
+# Only what every mode needs is imported here; each mode imports the rest,
+# so headless starts do not pay for the menu, UI or log tools
 import logging
 import argparse
 from utils.config import load_config, get_config_paths
 from utils.logging_config import setup_logging
-from utils.database import initialize_database
-from utils.app import run_application_loop
-from utils.ui import print_logo
-from utils.menu import run_interactive_menu
 from utils.common import strings
 
 
@@ -16,33 +17,88 @@ def main():
     # Parse command line arguments
     parser = argparse.ArgumentParser(description='AtlasPi Task Management System')
     parser.add_argument('--debug', action='store_true', help='Enable debug mode with verbose logging')
+    parser.add_argument('--import-tasks', metavar='PATH',
+                        help='Upsert tasks from a JSON-lines file into the database and exit')
+    parser.add_argument('--workers', type=int, metavar='N',
+                        help='Run the service as N worker processes without the menu')
+    parser.add_argument('--daemon', action='store_true',
+                        help='Run the service without the menu (SIGTERM stops, SIGHUP reloads the config)')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='Log how long each startup phase took, up to the first scheduler tick')
+    parser.add_argument('--profile', nargs='?', const='cprofile', choices=['cprofile', 'sampling'],
+                        help='Profile the scheduler thread (default: cprofile) and report slow ticks')
+    subcommands = parser.add_subparsers(dest='command')
+    search = subcommands.add_parser('search-logs', help='Print log lines between two times')
+    search.add_argument('since', help='Start time, e.g. 02:00 or "2024-01-01 02:00"')
+    search.add_argument('until', help='End time, inclusive, e.g. 02:15')
+    search.add_argument('--filter', default='', help='Level and/or text, e.g. "error timeout"')
+    search.add_argument('--log', help='Log file to search (default: the configured log)')
     args = parser.parse_args()
     
     try:
         # Get configuration paths
         paths = get_config_paths()
         
+        if args.command == 'search-logs':
+            run_log_search(args, paths)
+            return
+        
+        if args.import_tasks:
+            from utils.config import iter_task_file
+            from utils.database import initialize_database, import_tasks, TASK_SOURCE_IMPORT
+            config = load_config(paths['config_path'])
+            setup_logging(paths['log_path'], debug_mode=args.debug, config=config)
+            initialize_database(paths['db_path'], config)
+            summary = import_tasks(paths['db_path'], iter_task_file(args.import_tasks), source=TASK_SOURCE_IMPORT)
+            print(strings.DB_TASKS_IMPORTED.format(**summary))
+            return
+        
+        if args.daemon or args.workers:
+            from utils.daemon import run_daemon
+            run_daemon(paths, args.debug, args.workers, args.profile_startup, STARTED, args.profile)
+            return
+        
         # Clean up files in debug mode
         if args.debug:
             cleanup_debug_files(paths)
         
-        # Setup logging with debug mode
-        setup_logging(paths['log_path'], debug_mode=args.debug)
+        # Setup logging with debug mode and the config's logging section
+        setup_logging(paths['log_path'], debug_mode=args.debug, config=load_config(paths['config_path']))
+        
+        from utils.ui import print_logo
+        from utils.menu import run_interactive_menu
         
         # Show logo
         print_logo()
         
         # Run interactive menu (this now handles everything internally)
-        run_interactive_menu(debug_mode=args.debug)
+        run_interactive_menu(debug_mode=args.debug, profile=args.profile)
         
     except Exception as e:
         logging.error(strings.APP_STARTUP_ERROR.format(e))
 
 
+def run_log_search(args, paths):
+    """Print the log lines matching a search-logs command"""
+    import os
+    from utils.logging_config import resolve_log_path
+    from utils.logsearch import search_logs
+    log_file = args.log or resolve_log_path(paths['log_path'], load_config(paths['config_path']))
+    if not args.log and not os.path.exists(log_file):
+        log_file = paths['log_path']
+    try:
+        for line in search_logs(log_file, args.since, args.until, args.filter):
+            print(line)
+    except ValueError as e:
+        print(strings.LOG_SEARCH_BAD_TIME.format(e))
+
+
 def cleanup_debug_files(paths):
     """Remove existing database and log files for fresh debug run"""
     import os
-    files_to_remove = [paths['db_path'], paths['log_path']]
+    from utils.database import database_files
+    from utils.logsearch import INDEX_SUFFIX
+    files_to_remove = database_files(paths['db_path']) + [paths['log_path'], paths['log_path'] + INDEX_SUFFIX]
     
     for file_path in files_to_remove:
         if os.path.exists(file_path):
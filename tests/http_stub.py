@@ -0,0 +1,96 @@
+"""Local stub HTTP server for health-check tests and benchmarks"""
+
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Serves a few canned endpoints over HTTP/1.1 keep-alive
+
+    /health             200 with a small body
+    /status/<code>      the given status code
+    /slow?delay=<s>     200 after sleeping
+    /chunked            200 with a chunked body
+    /close              200 and then closes the connection
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.in_flight += 1
+            self.server.max_in_flight = max(self.server.max_in_flight, self.server.in_flight)
+        try:
+            self.route()
+        finally:
+            with self.server.lock:
+                self.server.in_flight -= 1
+
+    def route(self):
+        parts = urlsplit(self.path)
+        if parts.path == "/health":
+            self.respond(200, b"ok")
+        elif parts.path.startswith("/status/"):
+            self.respond(int(parts.path.rsplit("/", 1)[1]), b"status")
+        elif parts.path == "/slow":
+            time.sleep(float(parse_qs(parts.query).get("delay", ["1"])[0]))
+            self.respond(200, b"slow")
+        elif parts.path == "/chunked":
+            self.send_response(200)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for chunk in (b"hello ", b"world"):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.write(b"0\r\n\r\n")
+        elif parts.path == "/close":
+            self.close_connection = True
+            self.respond(200, b"bye", {"Connection": "close"})
+        else:
+            self.respond(404, b"not found")
+
+    def respond(self, status, body, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StubServer(ThreadingHTTPServer):
+    """Threaded stub server on an ephemeral localhost port"""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._thread = None
+
+    def url(self, path="/health"):
+        return f"http://127.0.0.1:{self.server_address[1]}{path}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
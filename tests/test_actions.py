@@ -0,0 +1,65 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+from utils import actions
+from utils.app import execute_task_action
+from utils.executor import TaskExecutor
+
+PLUGIN = '''
+from utils.actions import action
+
+@action("plugin_echo", pool="process", timeout=5, max_concurrency=2)
+def echo(task_name, target):
+    return target == "ok"
+'''
+
+
+class TestActionRegistry(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        with open(os.path.join(self.tmp_dir, "atlas_test_plugin.py"), "w") as file:
+            file.write(PLUGIN)
+        sys.path.insert(0, self.tmp_dir)
+        self.config = {"services": {"actions": {
+            "plugin_echo": {"module": "atlas_test_plugin", "max_concurrency": 7},
+            "plugin_broken": {"module": "atlas_test_missing"},
+        }}}
+        actions.configure_actions(self.config)
+
+    def tearDown(self):
+        actions.configure_actions(None)
+        actions._actions.pop("plugin_echo", None)
+        sys.modules.pop("atlas_test_plugin", None)
+        sys.path.remove(self.tmp_dir)
+        shutil.rmtree(self.tmp_dir)
+
+    def test_module_loads_on_first_use(self):
+        """An action module is imported when its action is first needed."""
+        self.assertNotIn("atlas_test_plugin", sys.modules)
+        self.assertTrue(execute_task_action("plugin_echo", "Task", "ok"))
+        self.assertFalse(execute_task_action("plugin_echo", "Task", "bad"))
+        self.assertIn("atlas_test_plugin", sys.modules)
+
+    def test_declared_settings_reach_the_executor(self):
+        """The executor uses what the action declares, with the config on top."""
+        executor = TaskExecutor(execute_task_action, self.config, describe_action=actions.action_settings)
+        try:
+            self.assertEqual(executor._settings_for("plugin_echo"), ("process", 7, 5, 0))
+            self.assertEqual(executor._settings_for("check_api_health"), ("async", 1000, 30, 10))
+        finally:
+            executor.shutdown()
+
+    def test_unknown_and_broken_actions_fail(self):
+        """Unknown actions and modules that fail to import are reported, not raised."""
+        self.assertFalse(execute_task_action("no_such_action", "Task"))
+        with self.assertLogs(level="ERROR") as logs:
+            self.assertFalse(execute_task_action("plugin_broken", "Task"))
+            self.assertFalse(execute_task_action("plugin_broken", "Task"))
+        self.assertEqual(len(logs.records), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import os
+import gzip
+import time
+import shutil
+import logging
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from utils import actions, backup, database, logging_config
+from utils.app import execute_task_action
+from utils.executor import TaskExecutor
+
+
+class TestBackup(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, "tasks.db")
+        self.directory = os.path.join(self.tmp_dir, "backups")
+        database.initialize_database(self.db_path, {"tasks": [
+            {"name": f"Task {i}", "action": "check_api_health", "condition_type": "interval", "condition_value": "60"}
+            for i in range(500)
+        ]})
+
+    def tearDown(self):
+        database.close_connections()
+        shutil.rmtree(self.tmp_dir)
+
+    def restore(self, path):
+        restored = os.path.join(self.tmp_dir, "restored.db")
+        with gzip.open(path) as source, open(restored, "wb") as target:
+            shutil.copyfileobj(source, target)
+        return sqlite3.connect(restored)
+
+    def test_backup_during_writes(self):
+        """Writes between steps neither block nor restart a backup."""
+        stop = threading.Event()
+        writes = []
+
+        def write():
+            while not stop.is_set():
+                database.update_tasks_next_run(self.db_path, [(time.time(), len(writes) % 500 + 1)])
+                writes.append(1)
+            database.close_thread_connections()
+
+        steps = []
+        settings = dict(backup.DEFAULT_BACKUP_SETTINGS, pages_per_step=2, step_pause=0.002)
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            summary = backup.create_backup(self.db_path, self.directory, settings,
+                                           progress=lambda copied, total: steps.append(copied))
+        finally:
+            stop.set()
+            writer.join()
+
+        self.assertGreater(len(steps), 1)
+        self.assertEqual(steps, sorted(steps))  # never restarted
+        self.assertGreater(len(writes), 0)
+        self.assertTrue(summary["path"].endswith(".db.gz"))
+        conn = self.restore(summary["path"])
+        try:
+            self.assertEqual(conn.execute("PRAGMA integrity_check").fetchone()[0], "ok")
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0], 500)
+        finally:
+            conn.close()
+        self.assertEqual(os.listdir(self.directory), [os.path.basename(summary["path"])])
+
+    def test_action_in_process_pool(self):
+        """The action backs up the service's database and its progress reaches the log."""
+        log_path = os.path.join(self.tmp_dir, "atlaspi.log")
+        root_level = logging.root.level
+        config = {"services": {"backup": {"pages_per_step": 4, "step_pause": 0}}}
+        logging_config.setup_logging(log_path)
+        actions.configure_actions(config, self.db_path)
+        completed = []
+        executor = TaskExecutor(execute_task_action, config, lambda run, ok, duration: completed.append(ok),
+                                describe_action=actions.action_settings)
+        try:
+            self.assertTrue(executor.submit(1, "Nightly backup", "backup_database"))
+        finally:
+            executor.shutdown(timeout=60)
+            actions.configure_actions(None)
+            logging_config.shutdown_logging()
+            for handler in logging.root.handlers[:]:
+                logging.root.removeHandler(handler)
+            logging.root.setLevel(root_level)
+        self.assertEqual(completed, [True])
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+        with open(log_path) as file:
+            text = file.read()
+        self.assertIn(f"Backing up {self.db_path}: ", text)
+        self.assertIn(f"Backed up {self.db_path} to {self.directory}", text)
+
+    def test_rotation(self):
+        """Backups past the newest `keep` or older than max_age_days are deleted."""
+        os.makedirs(self.directory)
+        now = time.time()
+        for day in range(5):
+            stamp = time.strftime(backup.TIMESTAMP_FORMAT, time.localtime(now - day * 86400))
+            path = os.path.join(self.directory, f"tasks-{stamp}.db.gz")
+            open(path, "w").close()
+            os.utime(path, (now - day * 86400, now - day * 86400))
+        open(os.path.join(self.directory, "tasks-19990101-000000.db.gz.partial"), "w").close()
+
+        self.assertEqual(len(backup.rotate_backups(self.directory, "tasks-", keep=4, now=now)), 1)
+        self.assertEqual(len(backup.rotate_backups(self.directory, "tasks-", max_age_days=1.5, now=now)), 2)
+        self.assertEqual(len(os.listdir(self.directory)), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
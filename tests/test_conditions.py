@@ -0,0 +1,106 @@
+import unittest
+from datetime import datetime
+
+from utils.conditions import compile_condition
+
+
+def ts(*args):
+    return datetime(*args).timestamp()
+
+
+class TestTimeConditions(unittest.TestCase):
+    def test_time_minutes(self):
+        """time conditions are minutes since midnight."""
+        condition = compile_condition("time", "480")
+        self.assertEqual(condition.next_fire_time(ts(2024, 1, 1, 7, 0)), ts(2024, 1, 1, 8, 0))
+        self.assertEqual(condition.next_fire_time(ts(2024, 1, 1, 8, 0)), ts(2024, 1, 2, 8, 0))
+
+    def test_daily(self):
+        """daily conditions accept HH:MM and HH:MM:SS."""
+        self.assertEqual(compile_condition("daily", "14:30").next_fire_time(ts(2024, 1, 1)),
+                         ts(2024, 1, 1, 14, 30))
+        self.assertEqual(compile_condition("daily", "00:00:15").next_fire_time(ts(2024, 1, 1, 1)),
+                         ts(2024, 1, 2, 0, 0, 15))
+
+    def test_matches(self):
+        """A condition matches anywhere within its minute."""
+        condition = compile_condition("time", 480)
+        self.assertTrue(condition.matches(datetime(2024, 1, 1, 8, 0, 45)))
+        self.assertFalse(condition.matches(datetime(2024, 1, 1, 8, 1)))
+
+    def test_compiled_once(self):
+        """Identical conditions share one compiled object."""
+        self.assertIs(compile_condition("time", 480), compile_condition("time", "480"))
+
+
+class TestIntervalConditions(unittest.TestCase):
+    def test_units(self):
+        """Intervals accept plain seconds and s/m/h/d suffixes."""
+        self.assertEqual(compile_condition("interval", "90").seconds, 90)
+        self.assertEqual(compile_condition("interval", "5m").seconds, 300)
+        self.assertEqual(compile_condition("interval", "2h").seconds, 7200)
+
+    def test_aligned(self):
+        """Intervals fire on multiples of the period."""
+        condition = compile_condition("interval", "30s")
+        self.assertEqual(condition.next_fire_time(1000.0), 1020)
+        self.assertEqual(condition.next_fire_time(1020.0), 1050)
+
+    def test_invalid(self):
+        """Intervals under one second are rejected."""
+        with self.assertRaises(ValueError):
+            compile_condition("interval", "0")
+
+
+class TestCronConditions(unittest.TestCase):
+    def test_every_five_minutes(self):
+        """Step values select every n-th minute."""
+        condition = compile_condition("cron", "*/5 * * * *")
+        self.assertEqual(condition.next_fire_time(ts(2024, 1, 1, 10, 2, 30)), ts(2024, 1, 1, 10, 5))
+
+    def test_weekdays_office_hours(self):
+        """Names and ranges work for weekdays; Saturday rolls to Monday."""
+        condition = compile_condition("cron", "0 9-17 * * mon-fri")
+        # 2024-01-06 is a Saturday
+        self.assertEqual(condition.next_fire_time(ts(2024, 1, 6, 12)), ts(2024, 1, 8, 9))
+        self.assertEqual(condition.next_fire_time(ts(2024, 1, 8, 17)), ts(2024, 1, 9, 9))
+
+    def test_month_rollover(self):
+        """Month and year boundaries are crossed."""
+        condition = compile_condition("cron", "@yearly")
+        self.assertEqual(condition.next_fire_time(ts(2024, 3, 1)), ts(2025, 1, 1))
+
+    def test_day_fields_or(self):
+        """When both day fields are restricted, either may match."""
+        condition = compile_condition("cron", "0 0 15 * sun")
+        # 2024-01-07 is a Sunday, before the 15th
+        self.assertEqual(condition.next_fire_time(ts(2024, 1, 2)), ts(2024, 1, 7))
+
+    def test_sunday_as_seven(self):
+        """7 is accepted as Sunday."""
+        self.assertEqual(compile_condition("cron", "0 0 * * 7").weekdays, 1)
+
+    def test_never_matches(self):
+        """Impossible dates never fire."""
+        self.assertIsNone(compile_condition("cron", "0 0 30 2 *").next_fire_time(ts(2024, 1, 1)))
+
+    def test_matches(self):
+        """Cron matching is pure bit tests."""
+        condition = compile_condition("cron", "30 8 * * *")
+        self.assertTrue(condition.matches(datetime(2024, 5, 5, 8, 30, 10)))
+        self.assertFalse(condition.matches(datetime(2024, 5, 5, 8, 31)))
+
+    def test_invalid(self):
+        """Malformed expressions are rejected."""
+        for expression in ("* * * *", "60 * * * *", "*/0 * * * *", "a b c d e"):
+            with self.assertRaises(ValueError):
+                compile_condition("cron", expression)
+
+    def test_unknown_type(self):
+        """Unknown condition types are rejected."""
+        with self.assertRaises(ValueError):
+            compile_condition("weekly", "1")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,14 @@
 import unittest
 import json
 import os
+import shutil
+import tempfile
+import time
+
+from utils import database
+from utils.app import apply_task_changes
+from utils.config import ConfigWatcher, get_service_settings
+from utils.scheduler import TaskScheduler
 
 class TestDefaultConfig(unittest.TestCase):
     def setUp(self):
@@ -36,6 +44,83 @@ class TestDefaultConfig(unittest.TestCase):
         version = self.config["version"]
         self.assertTrue(re.match(r"^\d+\.\d+\.\d+$", version), f"Invalid version format: {version}")
 
+    def test_service_settings_fill_in_defaults(self):
+        """Service settings keep the defaults for keys the config leaves out."""
+        defaults = {"a": 1, "b": 2}
+        self.assertEqual(get_service_settings({"services": {"x": {"b": 3}}}, "x", defaults), {"a": 1, "b": 3})
+        self.assertEqual(get_service_settings(None, "x", defaults), defaults)
+        self.assertEqual(defaults, {"a": 1, "b": 2})
+
+
+class TestConfigWatcher(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.config_path = os.path.join(self.tmp_dir, "config.json")
+        self.db_path = os.path.join(self.tmp_dir, "tasks.db")
+        self.config = self.write_config([
+            {"name": f"Task {i}", "action": "a", "condition_type": "interval", "condition_value": "1h"}
+            for i in range(3)
+        ])
+        self.watcher = ConfigWatcher(self.config_path, self.config, interval=0)
+
+    def tearDown(self):
+        database.close_connections()
+        shutil.rmtree(self.tmp_dir)
+
+    def write_config(self, tasks):
+        config = {"tasks": tasks}
+        with open(self.config_path, "w") as file:
+            json.dump(config, file)
+        # Make sure the edit is visible even on coarse mtime filesystems
+        stat = os.stat(self.config_path)
+        os.utime(self.config_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+        return config
+
+    def test_unchanged_config(self):
+        """Polling an untouched config reports nothing."""
+        self.assertIsNone(self.watcher.poll())
+        self.assertIsNone(self.watcher.poll())
+
+    def test_diff(self):
+        """Only added, edited and removed tasks are reported."""
+        self.watcher.poll()
+        tasks = self.config["tasks"]
+        tasks[1] = dict(tasks[1], condition_value="2h")
+        self.write_config(tasks[:2] + [{"name": "New", "action": "a", "condition_type": "time", "condition_value": 0}])
+        upserts, removed = self.watcher.poll()
+        self.assertEqual(sorted(task["name"] for task in upserts), ["New", "Task 1"])
+        self.assertEqual(removed, ["Task 2"])
+
+    def test_invalid_json_keeps_last_config(self):
+        """A half-written config is ignored until it parses again."""
+        self.watcher.poll()
+        with open(self.config_path, "w") as file:
+            file.write("{")
+        self.assertIsNone(self.watcher.poll())
+        self.assertEqual(len(self.watcher.tasks), 3)
+
+    def test_apply_changes(self):
+        """A diff reschedules the edited task and drops the removed one in place."""
+        database.initialize_database(self.db_path, self.config)
+        cache = database.TaskCache(self.db_path)
+        scheduler = TaskScheduler()
+        # Mid-hour, so the untouched hourly tasks are never inside the window
+        now = time.time() // 3600 * 3600 + 1800
+        apply_task_changes(self.db_path, ([], []), cache, scheduler, now)
+        before = {task[1]: task for task in cache.get_tasks()}
+
+        tasks = self.config["tasks"]
+        tasks[0] = dict(tasks[0], condition_value="30s")
+        self.write_config(tasks[:2])
+        apply_task_changes(self.db_path, self.watcher.poll(), cache, scheduler, now)
+
+        after = {task[1]: task for task in cache.get_tasks()}
+        self.assertEqual(sorted(after), ["Task 0", "Task 1"])
+        self.assertEqual(after["Task 1"], before["Task 1"])
+        self.assertLessEqual(after["Task 0"][8], now + 30)
+        self.assertEqual(len(scheduler), 1)
+        self.assertEqual(cache.stats()["rows_reloaded"], 3 + 2)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,102 @@
+import os
+import sys
+import json
+import time
+import signal
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+import subprocess
+
+from utils.daemon import ServiceFlag
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def wait_until(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+class TestServiceFlag(unittest.TestCase):
+    def test_wake_ends_the_wait_without_stopping(self):
+        flag = ServiceFlag()
+        threading.Timer(0.05, flag.wake).start()
+        started = time.monotonic()
+        self.assertFalse(flag.wait(5))
+        self.assertLess(time.monotonic() - started, 2)
+        flag.set()
+        self.assertTrue(flag.wait(5))
+
+
+class TestDaemon(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.tmp_dir, "config"))
+        self.config_path = os.path.join(self.tmp_dir, "config", "default_config.json")
+        self.log_path = os.path.join(self.tmp_dir, "atlas.log")
+        self.write_config(["Task 1"])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write_config(self, names):
+        config = {
+            "logging": {"log_file": self.log_path},
+            "tasks": [{"name": name, "action": "check_api_health", "condition_type": "interval",
+                       "condition_value": "1h"} for name in names],
+        }
+        with open(self.config_path, "w") as file:
+            json.dump(config, file)
+
+    def log_has(self, text):
+        if not os.path.exists(self.log_path):
+            return False
+        with open(self.log_path) as file:
+            return text in file.read()
+
+    def task_names(self):
+        conn = sqlite3.connect(os.path.join(self.tmp_dir, "tasks.db"))
+        try:
+            return {row[0] for row in conn.execute("SELECT name FROM tasks WHERE is_active = 1")}
+        finally:
+            conn.close()
+
+    def test_imports_only_what_the_service_needs(self):
+        """The headless entry point leaves the menu and slow modules unloaded."""
+        code = ("import sys, utils.daemon; "
+                "print(sorted(m for m in ('utils.menu', 'utils.ui', 'utils.health', 'asyncio', "
+                "'http.server', 'multiprocessing') if m in sys.modules))")
+        output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+        self.assertEqual(output.stdout.strip(), "[]")
+
+    @unittest.skipUnless(hasattr(signal, "SIGHUP"), "needs POSIX signals")
+    def test_reload_and_drain_on_signals(self):
+        """SIGHUP applies config edits; SIGTERM stops cleanly."""
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, "setup.py"), "--daemon", "--profile-startup"],
+            cwd=self.tmp_dir, env=dict(os.environ, PYTHONPATH=ROOT),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            self.assertTrue(wait_until(lambda: self.log_has("Startup took")))
+            self.write_config(["Task 1", "Task 2"])
+            process.send_signal(signal.SIGHUP)
+            self.assertTrue(wait_until(lambda: "Task 2" in self.task_names()))
+            process.send_signal(signal.SIGTERM)
+            self.assertEqual(process.wait(timeout=10), 0)
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+        self.assertTrue(self.log_has("AtlasPi service stopped"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,296 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+
+from utils import database
+
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, "tasks.db")
+        database.initialize_database(self.db_path, {"tasks": [
+            {"name": "Task", "action": "check_api_health", "condition_type": "time", "condition_value": 0}
+        ]})
+
+    def tearDown(self):
+        database.close_connections()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_connection_reused_per_thread(self):
+        """The same thread always gets the same connection."""
+        self.assertIs(database.get_connection(self.db_path), database.get_connection(self.db_path))
+
+    def test_connection_per_thread(self):
+        """Other threads get their own connection."""
+        seen = []
+        thread = threading.Thread(target=lambda: seen.append(database.get_connection(self.db_path)))
+        thread.start()
+        thread.join()
+        self.assertIsNot(seen[0], database.get_connection(self.db_path))
+
+    def test_wal_enabled(self):
+        """Connections use WAL journaling."""
+        mode = database.get_connection(self.db_path).execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(mode, "wal")
+
+    def test_reconnect_after_close(self):
+        """Closing all connections makes every thread reconnect lazily."""
+        conn = database.get_connection(self.db_path)
+        database.close_connections()
+        self.assertIsNot(database.get_connection(self.db_path), conn)
+        self.assertEqual(len(database.get_tasks(self.db_path)), 1)
+
+    def test_update_last_run(self):
+        """last_run updates are committed and visible to other connections."""
+        task_id = database.get_tasks(self.db_path)[0][0]
+        database.update_task_last_run(self.db_path, task_id)
+        seen = []
+        thread = threading.Thread(target=lambda: seen.extend(database.get_tasks(self.db_path)))
+        thread.start()
+        thread.join()
+        self.assertIsNotNone(seen[0][6])
+
+
+class TestSchema(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, "tasks.db")
+
+    def tearDown(self):
+        database.close_connections()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_upgrade_original_schema(self):
+        """Databases created with the original schema are upgraded in place."""
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("""
+        CREATE TABLE tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            action TEXT NOT NULL,
+            condition_type TEXT NOT NULL,
+            condition_value TEXT NOT NULL,
+            is_active BOOLEAN DEFAULT 1,
+            last_run TIMESTAMP DEFAULT NULL
+        )
+        """)
+        conn.execute("INSERT INTO tasks (name, action, condition_type, condition_value) VALUES ('Old', 'a', 'time', '0')")
+        conn.commit()
+        conn.close()
+
+        database.initialize_database(self.db_path, {})
+        conn = database.get_connection(self.db_path)
+        self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], len(database.SCHEMA_MIGRATIONS))
+        self.assertEqual(database.get_unscheduled_tasks(self.db_path)[0][1], "Old")
+
+    def test_due_tasks(self):
+        """Only tasks due by the given time are returned, soonest first."""
+        database.initialize_database(self.db_path, {"tasks": [
+            {"name": f"Task {i}", "action": "a", "condition_type": "time", "condition_value": i}
+            for i in range(3)
+        ]})
+        database.update_tasks_next_run(self.db_path, [(300.0, 1), (100.0, 2), (200.0, 3)])
+        self.assertEqual([task[0] for task in database.get_due_tasks(self.db_path, 250)], [2, 3])
+        self.assertEqual(database.get_next_run_at(self.db_path), 100.0)
+
+    def test_condition_change_reschedules(self):
+        """Changing a task's condition clears its next_run_at."""
+        database.initialize_database(self.db_path, {"tasks": [
+            {"name": "Task", "action": "a", "condition_type": "time", "condition_value": 0}
+        ]})
+        database.update_tasks_next_run(self.db_path, [(100.0, 1)])
+        conn = database.get_connection(self.db_path)
+        with conn:
+            conn.execute("UPDATE tasks SET condition_value = '5' WHERE id = 1")
+        self.assertEqual(len(database.get_unscheduled_tasks(self.db_path)), 1)
+
+
+class TestImportTasks(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, "tasks.db")
+        database.initialize_database(self.db_path, {"tasks": [
+            {"name": f"Task {i}", "action": "a", "condition_type": "time", "condition_value": i}
+            for i in range(3)
+        ]})
+        database.update_tasks_next_run(self.db_path, [(100.0, 1), (100.0, 2), (100.0, 3)])
+
+    def tearDown(self):
+        database.close_connections()
+        shutil.rmtree(self.tmp_dir)
+
+    def task_rows(self):
+        conn = database.get_connection(self.db_path)
+        return {row[0]: row[1:] for row in conn.execute(
+            "SELECT name, id, condition_value, is_active, next_run_at FROM tasks")}
+
+    def test_config_changes_reach_existing_database(self):
+        """Restarting with an edited config upserts by name and deactivates removed tasks."""
+        database.initialize_database(self.db_path, {"tasks": [
+            {"name": "Task 0", "action": "a", "condition_type": "time", "condition_value": 0},
+            {"name": "Task 1", "action": "a", "condition_type": "time", "condition_value": 9},
+            {"name": "Task 3", "action": "a", "condition_type": "time", "condition_value": 3},
+        ]})
+        rows = self.task_rows()
+        self.assertEqual(rows["Task 0"], (1, "0", 1, 100.0))  # untouched
+        self.assertEqual(rows["Task 1"], (2, "9", 1, None))   # edited in place
+        self.assertEqual(rows["Task 2"][2], 0)                # no longer configured
+        self.assertEqual(rows["Task 3"][1:3], ("3", 1))
+
+    def test_imported_tasks_survive_config_sync(self):
+        """Restarting only deactivates config tasks, not imported ones."""
+        database.import_tasks(self.db_path, [{"name": "Bulk", "action": "a", "condition_type": "time",
+                                              "condition_value": 0}], source=database.TASK_SOURCE_IMPORT)
+        database.initialize_database(self.db_path, {"tasks": [
+            {"name": "Task 0", "action": "a", "condition_type": "time", "condition_value": 0},
+        ]})
+        rows = self.task_rows()
+        self.assertEqual((rows["Bulk"][2], rows["Task 1"][2]), (1, 0))
+
+    def test_missing_tasks_section_keeps_tasks(self):
+        """A config without a tasks section leaves stored tasks alone."""
+        database.initialize_database(self.db_path, {})
+        self.assertEqual([row[2] for row in self.task_rows().values()], [1, 1, 1])
+
+    def test_streamed_batches(self):
+        """Large imports are consumed lazily in batches within one transaction."""
+        tasks = ({"name": f"Bulk {i}", "action": "a", "condition_type": "interval", "condition_value": "5m"}
+                 for i in range(2500))
+        summary = database.import_tasks(self.db_path, tasks, database.REMOVE_MISSING_DELETE, batch_size=1000)
+        self.assertEqual((summary["inserted"], summary["removed"]), (2500, 3))
+        self.assertEqual(len(database.get_tasks(self.db_path)), 2500)
+
+    def test_invalid_entries_skipped(self):
+        """Entries missing required fields are skipped without aborting the import."""
+        summary = database.import_tasks(self.db_path, [{"name": "Broken"}, "junk",
+                                                       {"name": "Task 0", "action": "b", "condition_type": "time",
+                                                        "condition_value": 0}])
+        self.assertEqual((summary["skipped"], summary["updated"]), (2, 1))
+
+    def test_upgrade_renames_duplicate_names(self):
+        """Upgrading keeps the oldest of any duplicate names and renames the others."""
+        conn = database.get_connection(self.db_path)
+        with conn:
+            conn.execute("DROP INDEX idx_tasks_name")
+            conn.execute("INSERT INTO tasks (name, action, condition_type, condition_value) VALUES ('Task 0', 'a', 'time', '5')")
+            version = database.SCHEMA_MIGRATIONS.index(database._migrate_unique_task_names)
+            conn.execute(f"PRAGMA user_version = {version}")
+        database.migrate_schema(conn)
+        rows = self.task_rows()
+        self.assertEqual(rows["Task 0"][:2], (1, "0"))
+        self.assertEqual(rows["Task 0 #4"][:3], (4, "5", 0))
+
+
+class TestLastRunBuffer(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, "tasks.db")
+        database.initialize_database(self.db_path, {"tasks": [
+            {"name": f"Task {i}", "action": "check_api_health", "condition_type": "time", "condition_value": i}
+            for i in range(3)
+        ]})
+
+    def tearDown(self):
+        database.close_connections()
+        shutil.rmtree(self.tmp_dir)
+
+    def last_runs(self):
+        return [task[6] for task in database.get_tasks(self.db_path)]
+
+    def test_buffered_until_flush(self):
+        """Completions are only written when the buffer is flushed."""
+        buffer = database.LastRunBuffer(self.db_path)
+        for task in database.get_tasks(self.db_path):
+            buffer.record(task[0])
+        self.assertEqual(self.last_runs(), [None, None, None])
+        self.assertEqual(buffer.flush(), 3)
+        self.assertNotIn(None, self.last_runs())
+        self.assertEqual(len(buffer), 0)
+
+    def test_flush_if_due(self):
+        """The flush window bounds how long completions stay buffered."""
+        buffer = database.LastRunBuffer(self.db_path, flush_interval=60)
+        self.assertIsNone(buffer.seconds_until_flush())
+        buffer.record(1)
+        self.assertEqual(buffer.flush_if_due(), 0)
+        buffer.flush_interval = 0
+        self.assertEqual(buffer.flush_if_due(), 1)
+
+    def test_full_buffer_flushes(self):
+        """A full buffer is due immediately."""
+        buffer = database.LastRunBuffer(self.db_path, flush_interval=60, max_pending=2)
+        buffer.record(1)
+        buffer.record(2)
+        self.assertEqual(buffer.seconds_until_flush(), 0.0)
+
+
+class TestTaskCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, "tasks.db")
+        database.initialize_database(self.db_path, {"tasks": [
+            {"name": f"Task {i}", "action": "a", "condition_type": "time", "condition_value": i}
+            for i in range(3)
+        ]})
+        self.cache = database.TaskCache(self.db_path)
+        self.cache.refresh()
+        # A separate connection stands in for the menu or another process
+        self.other = sqlite3.connect(self.db_path)
+
+    def tearDown(self):
+        self.other.close()
+        database.close_connections()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_hit_when_unchanged(self):
+        """An unchanged table costs no reload."""
+        self.assertEqual(self.cache.refresh(), 0)
+        self.assertEqual(self.cache.stats()["hits"], 1)
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+    def test_bookkeeping_changes_are_hits(self):
+        """last_run writes by other connections do not trigger a reload."""
+        with self.other:
+            self.other.execute("UPDATE tasks SET last_run = '2024-01-01T00:00:00'")
+        self.assertEqual(self.cache.refresh(), 0)
+
+    def test_reloads_only_changed_rows(self):
+        """Inserts, edits, deactivations and deletes reload just those rows."""
+        with self.other:
+            self.other.execute("INSERT INTO tasks (name, action, condition_type, condition_value) VALUES ('New', 'a', 'time', '9')")
+            self.other.execute("UPDATE tasks SET condition_value = '7' WHERE id = 1")
+            self.other.execute("UPDATE tasks SET is_active = 0 WHERE id = 2")
+            self.other.execute("DELETE FROM tasks WHERE id = 3")
+        self.assertEqual(self.cache.refresh(), 3)
+        self.assertEqual(sorted(task[1] for task in self.cache.get_tasks()), ["New", "Task 0"])
+        self.assertEqual(self.cache.get_task(1)[4], "7")
+
+    def test_due_from_memory(self):
+        """Due lookups and next_run_at writes are served by the cache."""
+        self.cache.update_tasks_next_run([(300.0, 1), (100.0, 2), (200.0, 3)])
+        self.assertEqual([task[0] for task in self.cache.get_due_tasks(250)], [2, 3])
+        self.assertEqual([task[0] for task in self.cache.get_due_tasks(250)], [2, 3])
+        self.assertEqual(self.cache.get_next_run_at(), 100.0)
+        self.cache.update_tasks_next_run([(400.0, 2)])
+        self.assertEqual(self.cache.get_next_run_at(), 200.0)
+        self.assertEqual(database.get_next_run_at(self.db_path), 200.0)
+        self.assertEqual(self.cache.get_unscheduled_tasks(), [])
+
+    def test_flushed_last_runs_reach_the_cache(self):
+        """Completions flushed through the cache update its rows too."""
+        buffer = database.LastRunBuffer(self.db_path, cache=self.cache)
+        when = datetime(2024, 5, 1, 12, 30, 45)
+        buffer.record(1, when)
+        self.assertIsNone(self.cache.get_task(1)[6])
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(self.cache.get_task(1)[6], when.isoformat())
+        self.assertEqual(self.cache.refresh(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from utils import database
+from utils.dispatch import Dispatcher, TokenBucket
+from utils.scheduler import TaskScheduler
+
+NOW = 1000020.0  # on a minute boundary, where "interval" tasks fire
+
+
+def make_task(task_id, priority=0, misfire_policy=None, action="a"):
+    return (task_id, f"Task {task_id}", action, "interval", "60", 1, None, None, NOW, priority, misfire_policy)
+
+
+class TestDispatcher(unittest.TestCase):
+    def test_priority_order_and_shedding(self):
+        """Higher priorities start first; a full queue sheds its lowest, newest run."""
+        dispatcher = Dispatcher({"services": {"dispatch": {"max_queue": 3}}})
+        for task in (make_task(1), make_task(2, priority=5), make_task(3)):
+            self.assertIsNone(dispatcher.enqueue(task, NOW))
+        fire_at, shed = dispatcher.enqueue(make_task(4, priority=9), NOW)
+        self.assertEqual(shed[0], 3)
+        self.assertEqual(dispatcher.enqueue(make_task(5), NOW)[1][0], 5)
+        self.assertEqual([task[0] for _, task in dispatcher.take(NOW)], [4, 2, 1])
+        self.assertEqual((len(dispatcher), dispatcher.shed), (0, 2))
+
+    def test_rate_limit_and_capacity(self):
+        """Runs without a token or a free slot stay queued, in order."""
+        dispatcher = Dispatcher({"services": {"actions": {"a": {"rate": 2, "burst": 1}}}})
+        for task_id in range(1, 4):
+            dispatcher.enqueue(make_task(task_id), NOW)
+        dispatcher.enqueue(make_task(4, action="b"), NOW)
+        self.assertEqual([task[0] for _, task in dispatcher.take(NOW)], [1, 4])
+        self.assertEqual(dispatcher.seconds_until_ready(), 0.5)
+        self.assertEqual([task[0] for _, task in dispatcher.take(NOW + 0.5, lambda action: False)], [])
+        self.assertEqual([task[0] for _, task in dispatcher.take(NOW + 0.5)], [2])
+        self.assertEqual(len(dispatcher), 1)
+
+    def test_misfire_policies(self):
+        """Late runs are skipped, coalesced or caught up per task."""
+        dispatcher = Dispatcher({"services": {"dispatch": {"catch_up_limit": 3}}})
+        scheduler = TaskScheduler()
+        scheduler.load([make_task(1, misfire_policy="catch_up")], NOW)
+        late = NOW + 600
+        self.assertEqual(dispatcher.plan(make_task(1), NOW, NOW + 30), [NOW])
+        self.assertEqual(dispatcher.plan(make_task(1), NOW, late), [])
+        self.assertEqual(dispatcher.plan(make_task(1, misfire_policy="coalesce"), NOW, late), [NOW])
+        occurrences = lambda after, until, limit: scheduler.occurrences(1, after, until, limit)
+        self.assertEqual(dispatcher.plan(make_task(1, misfire_policy="catch_up"), NOW, late, occurrences),
+                         [NOW, NOW + 60, NOW + 120])
+
+    def test_task_waiting_is_not_queued_twice(self):
+        """A task still waiting absorbs its next occurrence; it is merged, not shed."""
+        dispatcher = Dispatcher()
+        dispatcher.enqueue(make_task(1), NOW)
+        self.assertIsNone(dispatcher.enqueue(make_task(1), NOW + 60))
+        self.assertEqual((len(dispatcher), dispatcher.shed, dispatcher.merged), (1, 0, 1))
+
+    def test_token_bucket_refills(self):
+        """Tokens come back at the configured rate, up to the burst."""
+        bucket = TokenBucket(rate=10, burst=2)
+        self.assertEqual([bucket.take(NOW) for _ in range(3)], [True, True, False])
+        self.assertAlmostEqual(bucket.seconds_until_token(NOW), 0.1)
+        self.assertTrue(bucket.take(NOW + 0.1))
+
+
+class TestTaskColumns(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, "tasks.db")
+
+    def tearDown(self):
+        database.close_connections()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_priority_and_policy_columns(self):
+        """Priority and misfire policy come from the config; bad policies are rejected."""
+        with self.assertLogs(level="ERROR"):
+            database.initialize_database(self.db_path, {"tasks": [
+                {"name": "Urgent", "action": "a", "condition_type": "interval", "condition_value": "60",
+                 "priority": 10, "misfire_policy": "catch_up"},
+                {"name": "Plain", "action": "a", "condition_type": "interval", "condition_value": "60"},
+                {"name": "Bad", "action": "a", "condition_type": "interval", "condition_value": "60",
+                 "misfire_policy": "sometimes"},
+            ]})
+        rows = {task[1]: task[9:] for task in database.get_tasks(self.db_path)}
+        self.assertEqual(rows, {"Urgent": (10, "catch_up"), "Plain": (0, None)})
+
+
+if __name__ == "__main__":
+    unittest.main()
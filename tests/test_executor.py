@@ -0,0 +1,103 @@
+import signal
+import threading
+import time
+import unittest
+
+from utils.app import seconds_until_wakeup
+from utils.database import LastRunBuffer
+from utils.executor import TaskExecutor
+from utils.scheduler import TaskScheduler
+
+CONFIG = {
+    "services": {
+        "executor": {"thread_workers": 4},
+        "actions": {
+            "slow": {"pool": "thread", "max_concurrency": 1, "timeout": 0.05},
+        },
+    }
+}
+
+
+
+def stop_signals_ignored(action, name, target=None):
+    return all(signal.getsignal(signum) == signal.SIG_IGN for signum in (signal.SIGINT, signal.SIGTERM))
+
+
+class TestTaskExecutor(unittest.TestCase):
+    def setUp(self):
+        self.release = threading.Event()
+        self.completed = []
+        self.executor = TaskExecutor(self.run_action, CONFIG, self.on_complete)
+
+    def tearDown(self):
+        self.release.set()
+        self.executor.shutdown(timeout=1)
+
+    def run_action(self, action, name, target=None):
+        if action in ("slow", "long"):
+            self.release.wait(1)
+        return action != "failing"
+
+    def on_complete(self, run, ok, duration):
+        self.completed.append((run.task_id, ok))
+
+    def wait_for(self, count):
+        deadline = time.monotonic() + 1
+        while len(self.completed) < count and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+    def test_submit_does_not_block(self):
+        """Submitting returns immediately even while the action runs."""
+        started = time.monotonic()
+        self.assertTrue(self.executor.submit(1, "Slow", "slow"))
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(self.executor.running(), 1)
+
+    def test_concurrency_limit(self):
+        """Runs past an action's max concurrency are skipped."""
+        self.assertTrue(self.executor.submit(1, "Slow", "slow"))
+        self.assertFalse(self.executor.submit(2, "Slow again", "slow"))
+
+    def test_completion_results(self):
+        """Completions report success or failure through the callback."""
+        self.executor.submit(1, "Fast", "fast")
+        self.executor.submit(2, "Failing", "failing")
+        self.wait_for(2)
+        self.assertEqual(sorted(self.completed), [(1, True), (2, False)])
+
+    def test_running_actions_bound_the_sleep(self):
+        """While actions run, the loop wakes in time to flush their completions."""
+        last_runs = LastRunBuffer(None, flush_interval=5)
+        self.assertEqual(seconds_until_wakeup(TaskScheduler(), last_runs, self.executor), 60)
+        self.executor.submit(1, "Long", "long")  # default 60s timeout
+        self.assertEqual(seconds_until_wakeup(TaskScheduler(), last_runs, self.executor), 5)
+
+    def test_timeout(self):
+        """Runs past their timeout are reported as failed."""
+        self.executor.submit(1, "Slow", "slow")
+        time.sleep(0.1)
+        self.assertEqual(self.executor.check_timeouts(), 1)
+        self.assertEqual(self.completed, [(1, False)])
+        self.release.set()
+        time.sleep(0.05)
+        self.assertEqual(self.completed, [(1, False)])
+
+
+
+class TestProcessPool(unittest.TestCase):
+    def test_stop_signals_left_to_the_parent(self):
+        """Pool processes do not run the stop handlers they inherit."""
+        previous = signal.signal(signal.SIGTERM, lambda signum, frame: None)
+        completed = []
+        executor = TaskExecutor(stop_signals_ignored, {"services": {"actions": {"crunch": {"pool": "process"}}}},
+                                lambda run, ok, duration: completed.append(ok))
+        try:
+            executor.submit(1, "Crunch", "crunch")
+        finally:
+            executor.shutdown(timeout=30)
+            signal.signal(signal.SIGTERM, previous)
+        self.assertEqual(completed, [True])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+from utils import database
+from utils.app import refresh_schedule, process_file_changes
+from utils.conditions import compile_condition, FileChangedCondition
+from utils.filewatch import FileWatcher, scan_signature, DEFAULT_FILE_WATCH_SETTINGS
+from utils.scheduler import TaskScheduler
+
+
+def make_task(task_id, path, last_run=None):
+    return (task_id, f"Task {task_id}", "a", "file_changed", path, 1, last_run, None, None, 0, None)
+
+
+def touch(path, text="x", mtime=None):
+    with open(path, "w") as file:
+        file.write(text)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+class TestScanSignature(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_tree_changes(self):
+        """Edits, additions and removals anywhere in a tree change its signature."""
+        os.makedirs(os.path.join(self.tmp_dir, "sub"))
+        nested = os.path.join(self.tmp_dir, "sub", "a.txt")
+        touch(nested, mtime=1000)
+        before = scan_signature(self.tmp_dir)
+        self.assertEqual(scan_signature(self.tmp_dir), before)
+        touch(nested, "xy", mtime=1000)  # same mtime, new size
+        after_edit = scan_signature(self.tmp_dir)
+        self.assertNotEqual(after_edit, before)
+        touch(os.path.join(self.tmp_dir, "b.txt"))
+        self.assertNotEqual(scan_signature(self.tmp_dir), after_edit)
+        os.remove(nested)
+        self.assertEqual(scan_signature(self.tmp_dir)[0], 2)
+        self.assertIsNone(scan_signature(os.path.join(self.tmp_dir, "missing")))
+
+
+class TestFileWatcher(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "input.csv")
+        touch(self.path, mtime=1000)
+        self.watcher = FileWatcher()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_condition(self):
+        """file_changed conditions normalize their path and have no fire times."""
+        condition = compile_condition("file_changed", self.tmp_dir + "/./input.csv")
+        self.assertIsInstance(condition, FileChangedCondition)
+        self.assertEqual((condition.path, condition.next_fire_time(0)), (self.path, None))
+        with self.assertRaises(ValueError):
+            compile_condition("file_changed", " ")
+
+    def test_tasks_share_a_watch(self):
+        """Tasks on one path share a scan; a change fires them all."""
+        self.assertTrue(self.watcher.watch(make_task(1, self.path)))
+        self.assertTrue(self.watcher.watch(make_task(2, self.tmp_dir + "/input.csv")))
+        self.assertFalse(self.watcher.watch((3, "T", "a", "interval", "60", 1, None, None, None, 0, None)))
+        self.assertEqual(self.watcher.poll(100.0), [])  # baseline
+        touch(self.path, "changed", mtime=2000)
+        self.assertEqual(self.watcher.poll(200.0), [1, 2])
+        self.assertEqual(self.watcher.stats(), {"paths": 1, "tasks": 2, "scans": 2, "changes": 1})
+
+    def test_adaptive_interval(self):
+        """Idle paths back off; a change brings the scan rate back up."""
+        settings = DEFAULT_FILE_WATCH_SETTINGS
+        self.watcher.watch(make_task(1, self.path))
+        now = 100.0
+        for _ in range(6):
+            self.watcher.poll(now)
+            now += self.watcher.seconds_until_scan(now)
+        self.assertAlmostEqual(now - 100.0, sum(min(2 ** n, settings["max_interval_seconds"]) for n in range(1, 7)))
+        touch(self.path, "changed", mtime=2000)
+        self.assertEqual(self.watcher.poll(now), [1])
+        self.assertEqual(self.watcher.seconds_until_scan(now), settings["min_interval_seconds"])
+
+    def test_changed_since_last_run(self):
+        """A path changed after a task's last run fires it on the first scan."""
+        old = datetime.fromtimestamp(500).isoformat()
+        new = datetime.fromtimestamp(1500).isoformat()
+        self.watcher.watch(make_task(1, self.path, old))
+        self.watcher.watch(make_task(2, self.path, new))
+        self.assertEqual(self.watcher.poll(100.0), [1])
+        self.assertEqual(self.watcher.poll(200.0), [])
+
+    def test_sync_drops_removed_and_edited_tasks(self):
+        """Removed tasks stop being watched; an edited path moves the watch."""
+        other = os.path.join(self.tmp_dir, "other.csv")
+        tasks = {1: make_task(1, self.path), 2: make_task(2, self.path)}
+        for task in tasks.values():
+            self.watcher.watch(task)
+        del tasks[1]
+        tasks[2] = make_task(2, other)
+        self.watcher.sync(tasks.get)
+        self.assertEqual(self.watcher.stats()["tasks"], 1)
+        self.assertEqual(len(self.watcher), 1)
+        touch(other)
+        self.watcher.poll(100.0)
+        touch(other, "changed", mtime=2000)
+        self.assertEqual(self.watcher.poll(200.0), [2])
+
+
+class TestFileChangedTasks(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.watched = os.path.join(self.tmp_dir, "inbox")
+        os.makedirs(self.watched)
+        self.db_path = os.path.join(self.tmp_dir, "tasks.db")
+        database.initialize_database(self.db_path, {"tasks": [
+            {"name": "Import", "action": "a", "condition_type": "file_changed", "condition_value": self.watched},
+            {"name": "Tick", "action": "a", "condition_type": "interval", "condition_value": "60"},
+        ]})
+
+    def tearDown(self):
+        database.close_connections()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_change_schedules_task(self):
+        """A change schedules the task now; it waits for changes, not the clock."""
+        cache = database.TaskCache(self.db_path)
+        scheduler = TaskScheduler()
+        # Scanned again as soon as the scan cost allows
+        watcher = FileWatcher({"services": {"file_watch": {"min_interval_seconds": 0, "max_interval_seconds": 0}}})
+        now = time.time()
+        refresh_schedule(cache, scheduler, now, set(), watcher)
+        self.assertEqual(len(watcher), 1)
+        self.assertEqual(process_file_changes(watcher, cache, scheduler, now), 0)
+        touch(os.path.join(self.watched, "new.csv"))
+        time.sleep(watcher.seconds_until_scan())
+        self.assertEqual(process_file_changes(watcher, cache, scheduler, now), 1)
+        due = {task[1]: fire_at for fire_at, task in scheduler.pop_due(now)}
+        self.assertEqual(due["Import"], now)
+        self.assertEqual(database.get_connection(self.db_path).execute(
+            "SELECT next_run_at FROM tasks WHERE name = 'Import'").fetchone()[0], now)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+
+from tests.http_stub import StubServer
+from utils.health import HealthCheckEngine
+
+
+class TestHealthCheckEngine(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StubServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.engine = HealthCheckEngine(concurrency=10, request_timeout=2, max_idle_per_host=4)
+
+    def tearDown(self):
+        self.engine.close()
+
+    def test_healthy(self):
+        """A 200 response is healthy."""
+        result = self.engine.check_sync(self.server.url("/health"))
+        self.assertTrue(result.ok)
+        self.assertEqual(result.status, 200)
+
+    def test_unhealthy_status(self):
+        """A 5xx response is unhealthy."""
+        result = self.engine.check_sync(self.server.url("/status/503"))
+        self.assertFalse(result.ok)
+        self.assertEqual(result.status, 503)
+
+    def test_connection_reuse(self):
+        """Sequential checks to one host reuse a keep-alive connection."""
+        for _ in range(5):
+            self.assertTrue(self.engine.check_sync(self.server.url("/health")).ok)
+        self.assertEqual(self.engine.connections_opened, 1)
+
+    def test_chunked_body(self):
+        """Chunked responses are read fully and the connection is reused."""
+        for _ in range(2):
+            self.assertTrue(self.engine.check_sync(self.server.url("/chunked")).ok)
+        self.assertEqual(self.engine.connections_opened, 1)
+
+    def test_server_closes_connection(self):
+        """Connection: close responses are not pooled."""
+        for _ in range(2):
+            self.assertTrue(self.engine.check_sync(self.server.url("/close")).ok)
+        self.assertEqual(self.engine.connections_opened, 2)
+
+    def test_timeout(self):
+        """Requests slower than the timeout fail with an error."""
+        result = self.engine.check_sync(self.server.url("/slow?delay=0.5"), timeout=0.1)
+        self.assertFalse(result.ok)
+        self.assertIn("timed out", result.error)
+
+    def test_connection_refused(self):
+        """Unreachable hosts fail without raising."""
+        server = StubServer()
+        url = server.url("/health")
+        server.server_close()
+        self.assertFalse(self.engine.check_sync(url).ok)
+
+    def test_check_many_respects_cap(self):
+        """Fan-out never has more requests in flight than the concurrency cap."""
+        server = StubServer().start()
+        try:
+            urls = [server.url("/slow?delay=0.05")] * 30
+            results = self.engine.submit(self.engine.check_many(urls)).result(10)
+            self.assertTrue(all(result.ok for result in results))
+            self.assertEqual(server.max_in_flight, 10)
+        finally:
+            server.stop()
+
+    def test_invalid_url(self):
+        """Non-HTTP targets are reported as failures."""
+        self.assertFalse(self.engine.check_sync("ftp://example.com/").ok)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from utils import database, history
+
+# A fixed hour boundary so rollup buckets are predictable
+NOW = 1700000000 - 1700000000 % history.DAY + 12 * history.HOUR
+
+
+class TestHistory(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, "tasks.db")
+        database.initialize_database(self.db_path, {"tasks": [
+            {"name": "Task", "action": "check_api_health", "condition_type": "time", "condition_value": 0}
+        ]})
+        self.recorder = history.HistoryRecorder(self.db_path)
+
+    def tearDown(self):
+        database.close_connections()
+        shutil.rmtree(self.tmp_dir)
+
+    def record_hour(self, hour_start, count=100, task_id=1):
+        """Record `count` runs in one hour: 1-100 ms, every tenth failing"""
+        for i in range(count):
+            outcome = history.OUTCOME_FAILED if i % 10 == 0 else history.OUTCOME_OK
+            self.recorder.record(task_id, outcome, (i + 1) / 1000, ended=hour_start + i)
+        self.recorder.flush()
+
+    def raw_count(self):
+        return database.get_connection(self.db_path).execute("SELECT COUNT(*) FROM task_runs").fetchone()[0]
+
+    def test_stats_from_raw_runs(self):
+        """Uncompacted runs are counted straight from the raw table."""
+        self.record_hour(NOW)
+        self.recorder.record(1, history.OUTCOME_MISSED, ended=NOW + 200)
+        self.recorder.flush()
+        stats = history.task_stats(self.db_path, NOW, NOW + history.HOUR)[1]
+        self.assertEqual((stats.runs, stats.ok, stats.failed, stats.missed), (100, 90, 10, 1))
+        self.assertAlmostEqual(stats.success_rate(), 0.9)
+        self.assertTrue(50 <= stats.quantile_ms(0.95) <= 100)
+
+    def test_compaction_keeps_results(self):
+        """Queries give the same answer before and after compaction."""
+        self.record_hour(NOW - history.HOUR)
+        self.record_hour(NOW)
+        before = history.task_stats(self.db_path, NOW - history.HOUR, NOW + history.HOUR)[1]
+        self.assertEqual(history.compact_history(self.db_path, now=NOW + history.HOUR), 200)
+        after = history.task_stats(self.db_path, NOW - history.HOUR, NOW + history.HOUR)[1]
+        self.assertEqual(before.to_row(), after.to_row())
+
+        # Runs added after compaction are merged with the existing rollup
+        self.record_hour(NOW, count=10)
+        history.compact_history(self.db_path, now=NOW + history.HOUR)
+        self.assertEqual(history.task_stats(self.db_path, NOW, NOW + history.HOUR)[1].runs, 110)
+
+    def test_retention(self):
+        """Old raw runs are dropped, old hours become days, old days expire."""
+        settings = dict(history.DEFAULT_HISTORY_SETTINGS, raw_hours=1, hourly_days=1, daily_days=4)
+        for day in range(5, 0, -1):
+            self.record_hour(NOW - day * history.DAY, count=10)
+        self.record_hour(NOW, count=10)
+        history.compact_history(self.db_path, settings, now=NOW)
+        self.assertEqual(self.raw_count(), 10)
+
+        rows = database.get_connection(self.db_path).execute(
+            "SELECT period, COUNT(*) FROM task_run_rollups GROUP BY period ORDER BY period").fetchall()
+        # Yesterday and today stay hourly; days 2 and 3 are daily; days 4 and 5 expired
+        self.assertEqual(rows, [(history.HOUR, 2), (history.DAY, 2)])
+        stats = history.task_stats(self.db_path, NOW - 10 * history.DAY)[1]
+        self.assertEqual(stats.runs, 40)
+
+    def test_background_writer(self):
+        """The writer thread flushes pending runs when it is closed."""
+        recorder = history.HistoryRecorder(self.db_path, dict(history.DEFAULT_HISTORY_SETTINGS)).start()
+        recorder.record(1, history.OUTCOME_OK, 0.01)
+        recorder.record(1, history.OUTCOME_TIMEOUT, 30)
+        recorder.close(timeout=5)
+        stats = history.task_stats(self.db_path, 0)[1]
+        self.assertEqual((stats.ok, stats.timed_out), (1, 1))
+        self.assertEqual(history.history_report(self.db_path, 0)[0][0], "Task")
+
+
+if __name__ == "__main__":
+    unittest.main()
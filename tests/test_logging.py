@@ -0,0 +1,131 @@
+import os
+import json
+import shutil
+import logging
+import logging.handlers
+import tempfile
+import unittest
+
+from utils import logging_config
+from utils.executor import TaskExecutor
+
+
+def log_in_pool_process(action, name, target=None):
+    logging.info("pool process %d ran %s", os.getpid(), name)
+    return True
+
+
+class TestLoggingSetup(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.tmp_dir, "atlaspi.log")
+        self.root_level = logging.root.level
+
+    def tearDown(self):
+        logging_config.shutdown_logging()
+        for handler in logging.root.handlers[:]:
+            logging.root.removeHandler(handler)
+        logging.root.setLevel(self.root_level)
+        shutil.rmtree(self.tmp_dir)
+
+    def read_lines(self, path=None):
+        # Stopping the listener drains the queue into the file
+        logging_config.shutdown_logging()
+        with open(path or self.log_path) as file:
+            return file.read().splitlines()
+
+    def test_records_go_through_queue(self):
+        """The root logger only enqueues; the listener writes the file."""
+        logging_config.setup_logging(self.log_path)
+        self.assertEqual([type(handler) for handler in logging.root.handlers],
+                         [logging.handlers.QueueHandler])
+        logging.info("hello %s", "queue")
+        self.assertTrue(self.read_lines()[-1].endswith("INFO - hello queue"))
+
+    def test_config_level_and_file(self):
+        """log_level and log_file from the config are honored."""
+        other_path = os.path.join(self.tmp_dir, "other.log")
+        path = logging_config.setup_logging(self.log_path, config={
+            "logging": {"log_level": "warning", "log_file": other_path}})
+        self.assertEqual(path, other_path)
+        self.assertFalse(logging.root.isEnabledFor(logging.INFO))
+        logging.warning("kept")
+        logging.info("dropped")
+        lines = self.read_lines(other_path)
+        self.assertTrue(lines[-1].endswith("kept"))
+        self.assertFalse(any("dropped" in line for line in lines))
+
+    def test_unwritable_log_file_falls_back(self):
+        """An unusable log_file falls back to the default path."""
+        missing = os.path.join(self.tmp_dir, "missing", "atlas.log")
+        path = logging_config.setup_logging(self.log_path, config={"logging": {"log_file": missing}})
+        self.assertEqual(path, self.log_path)
+        self.assertEqual(logging_config.get_log_path(), self.log_path)
+
+    def test_json_lines(self):
+        """The json format writes one parseable object per line."""
+        logging_config.setup_logging(self.log_path, config={"logging": {"format": "json"}})
+        logging.info("structured")
+        entry = json.loads(self.read_lines()[-1])
+        self.assertEqual((entry["level"], entry["message"]), ("INFO", "structured"))
+
+    def test_size_rotation(self):
+        """The file rotates once it reaches max_bytes."""
+        logging_config.setup_logging(self.log_path, config={
+            "logging": {"rotation": "size", "max_bytes": 200, "backup_count": 2}})
+        for i in range(20):
+            logging.info("line %d", i)
+        logging_config.shutdown_logging()
+        self.assertTrue(os.path.exists(self.log_path + ".1"))
+        self.assertFalse(os.path.exists(self.log_path + ".3"))
+
+
+class TestProcessPoolLogging(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.tmp_dir, "atlaspi.log")
+        self.root_level = logging.root.level
+
+    def tearDown(self):
+        logging_config.shutdown_logging()
+        for handler in logging.root.handlers[:]:
+            logging.root.removeHandler(handler)
+        logging.root.setLevel(self.root_level)
+        shutil.rmtree(self.tmp_dir)
+
+    def test_pool_process_records_reach_the_log(self):
+        """Records logged by process-pool actions are written by the parent's listener."""
+        logging_config.setup_logging(self.log_path)
+        completed = []
+        executor = TaskExecutor(log_in_pool_process, {"services": {"actions": {"crunch": {"pool": "process"}}}},
+                                lambda run, ok, duration: completed.append(ok))
+        try:
+            self.assertTrue(executor.submit(1, "Crunch", "crunch"))
+        finally:
+            executor.shutdown(timeout=30)
+        self.assertEqual(completed, [True])
+        logging_config.shutdown_logging()
+        with open(self.log_path) as file:
+            lines = [line for line in file if "ran Crunch" in line]
+        self.assertEqual(len(lines), 1)
+        self.assertNotIn(f"pool process {os.getpid()} ", lines[0])
+
+    def test_inherited_health_engine_is_not_shut_down(self):
+        """Pool processes drop the forked copy of the health engine instead of closing it."""
+        from utils import health
+        logging_config.setup_logging(self.log_path)
+        health.get_engine({"services": {"health_check": {"request_timeout": 0.5}}}).start()
+        executor = TaskExecutor(log_in_pool_process, {"services": {"actions": {"crunch": {"pool": "process"}}}},
+                                lambda run, ok, duration: None)
+        try:
+            executor.submit(1, "Crunch", "crunch")
+        finally:
+            executor.shutdown(timeout=30)
+            health.shutdown_engine()
+        logging_config.shutdown_logging()
+        with open(self.log_path) as file:
+            self.assertNotIn("ERROR", file.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
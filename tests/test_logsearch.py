@@ -0,0 +1,111 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+
+from utils import logsearch
+
+START = datetime(2024, 1, 1, 0, 0, 0)
+
+
+def text_line(when, level, message):
+    return f"{when:%Y-%m-%d %H:%M:%S},000 - {level} - {message}\n"
+
+
+class TestLogSearch(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.tmp_dir, "atlaspi.log")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, lines, mode="a", path=None):
+        with open(path or self.log_path, mode) as file:
+            file.writelines(lines)
+
+    def minutes(self, first, count, level="INFO"):
+        return [text_line(START + timedelta(minutes=minute), level, f"minute {minute}")
+                for minute in range(first, first + count)]
+
+    def search(self, since, until, query=None, stride=512, path=None):
+        index = logsearch.LogIndex(self.log_path + logsearch.INDEX_SUFFIX, stride)
+        return list(logsearch.search_file(path or self.log_path, logsearch.parse_time_bound(since),
+                                          logsearch.parse_time_bound(until, is_end=True),
+                                          logsearch.LineFilter.parse(query), index))
+
+    def test_time_bounds(self):
+        """Minute bounds cover the whole minute; bare times mean today."""
+        self.assertEqual(logsearch.parse_time_bound("2024-01-01 02:15", is_end=True), b"2024-01-01 02:15:59")
+        self.assertEqual(logsearch.parse_time_bound("02:00", today=date(2024, 5, 6)), b"2024-05-06 02:00:00")
+        with self.assertRaises(ValueError):
+            logsearch.parse_time_bound("soon")
+
+    def test_range_across_strides(self):
+        """Only lines inside the range are returned, wherever the strides fall."""
+        self.write(self.minutes(0, 600))
+        lines = self.search("2024-01-01 02:00", "2024-01-01 02:15")
+        self.assertEqual(len(lines), 16)
+        self.assertIn("minute 120", lines[0])
+        self.assertIn("minute 135", lines[-1])
+        # One large stride leaves the work to the binary search within it
+        os.remove(self.log_path + logsearch.INDEX_SUFFIX)
+        self.assertEqual(self.search("2024-01-01 02:00", "2024-01-01 02:15", stride=1 << 20), lines)
+        self.assertEqual(self.search("2024-01-02 00:00", "2024-01-02 01:00"), [])
+
+    def test_continuation_lines_and_filter(self):
+        """Traceback lines stay with their entry and take its level."""
+        self.write(self.minutes(0, 10))
+        self.write([text_line(START + timedelta(minutes=10), "ERROR", "boom"),
+                    "Traceback (most recent call last):\n", "ValueError: bad\n"])
+        self.write(self.minutes(11, 10))
+        lines = self.search("2024-01-01 00:05", "2024-01-01 00:15", "error")
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[-1].startswith("ValueError"))
+
+    def test_index_extends_incrementally(self):
+        """Appended data extends the saved index instead of rebuilding it."""
+        self.write(self.minutes(0, 100))
+        self.search("2024-01-01 00:00", "2024-01-01 00:01")
+        index = logsearch.LogIndex(self.log_path + logsearch.INDEX_SUFFIX, 512)
+        index.load()
+        saved_offsets = list(index.offsets)
+        self.assertTrue(saved_offsets)
+
+        self.write(self.minutes(100, 100))
+        lines = self.search("2024-01-01 03:00", "2024-01-01 03:10")
+        self.assertEqual(len(lines), 11)
+        index = logsearch.LogIndex(self.log_path + logsearch.INDEX_SUFFIX, 512)
+        index.load()
+        self.assertEqual(index.offsets[:len(saved_offsets)], saved_offsets)
+        self.assertGreater(len(index.offsets), len(saved_offsets))
+
+    def test_rotation_rebuilds_index(self):
+        """A new file under the same name is indexed from scratch and backups are searched."""
+        self.write(self.minutes(0, 100))
+        self.search("2024-01-01 00:00", "2024-01-01 00:01")
+        os.rename(self.log_path, self.log_path + ".1")
+        self.write(self.minutes(100, 50), mode="w")
+        lines = self.search("2024-01-01 02:00", "2024-01-01 02:05")
+        self.assertIn("minute 120", lines[0])
+        self.assertEqual(len(lines), 6)
+
+        lines = list(logsearch.search_logs(self.log_path, "2024-01-01 01:35", "2024-01-01 01:44"))
+        self.assertEqual([line.split(" - ")[2] for line in lines],
+                         [f"minute {minute}" for minute in range(95, 105)])
+
+    def test_json_lines(self):
+        """JSON log lines are indexed by their "time" field."""
+        entries = [json.dumps({"time": (START + timedelta(minutes=minute)).isoformat(timespec="milliseconds"),
+                               "level": "WARNING" if minute % 2 else "INFO", "message": f"minute {minute}"}) + "\n"
+                   for minute in range(300)]
+        self.write(entries)
+        lines = self.search("2024-01-01 01:00", "2024-01-01 01:09", "warning")
+        self.assertEqual([json.loads(line)["message"] for line in lines],
+                         [f"minute {minute}" for minute in range(61, 70, 2)])
+
+
+if __name__ == "__main__":
+    unittest.main()
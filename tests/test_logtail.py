@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from utils.logtail import LineFilter, LogFollower
+
+
+def entry(level, message):
+    return f"2024-01-01 08:00:00,000 - {level} - {message}\n"
+
+
+class TestLogFollower(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "atlaspi.log")
+        self.follower = None
+
+    def tearDown(self):
+        if self.follower is not None:
+            self.follower.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, text, mode="a"):
+        with open(self.path, mode) as file:
+            file.write(text)
+
+    def follow(self, line_filter=None, tail=10):
+        self.follower = LogFollower(self.path, line_filter)
+        return self.follower.tail(tail)
+
+    def test_tail_across_blocks(self):
+        """The last lines are found by scanning back over several blocks."""
+        self.write("".join(entry("INFO", f"line {i} " + "x" * 100) for i in range(5000)))
+        lines = self.follow(tail=3)
+        self.assertEqual([line.split(" - ")[2].split()[1] for line in lines], ["4997", "4998", "4999"])
+
+    def test_partial_line_waits(self):
+        """A line still being written is shown once, complete."""
+        self.write(entry("INFO", "done") + "2024-01-01 08:00:01,000 - INFO - hal")
+        self.assertEqual(len(self.follow()), 1)
+        self.write("f written\n")
+        self.assertEqual(self.follower.read_new(), ["2024-01-01 08:00:01,000 - INFO - half written"])
+
+    def test_follows_rotation(self):
+        """Lines written before and after a rotation are both seen."""
+        self.write(entry("INFO", "start"))
+        self.follow()
+        self.write(entry("INFO", "before rotation"))
+        os.rename(self.path, self.path + ".1")
+        self.write(entry("INFO", "after rotation"), mode="w")
+        self.assertEqual([line.rsplit(" - ", 1)[1] for line in self.follower.read_new()],
+                         ["before rotation", "after rotation"])
+
+    def test_follows_truncation(self):
+        """A truncated log is read again from the top."""
+        self.write(entry("INFO", "a") * 10)
+        self.follow()
+        self.write(entry("INFO", "fresh"), mode="w")
+        self.assertEqual([line.rsplit(" - ", 1)[1] for line in self.follower.read_new()], ["fresh"])
+
+    def test_level_filter_keeps_tracebacks(self):
+        """A level filter keeps an entry's continuation lines with it."""
+        self.write(entry("INFO", "ok") + entry("ERROR", "boom") + "Traceback (most recent call last):\n"
+                   + entry("INFO", "ok again"))
+        self.assertEqual(len(self.follow(LineFilter.parse("error"))), 2)
+        self.write("  more traceback\n" + entry("WARNING", "slow") + entry("ERROR", "again"))
+        self.assertEqual([line.rsplit(" - ", 1)[-1] for line in self.follower.read_new()], ["again"])
+
+    def test_text_filter(self):
+        """A text filter matches case-insensitively, combined with a level."""
+        self.write(entry("INFO", "Timeout soft") + entry("ERROR", "timeout hard") + entry("ERROR", "other"))
+        lines = self.follow(LineFilter.parse("error TIMEOUT"))
+        self.assertEqual([line.rsplit(" - ", 1)[1] for line in lines], ["timeout hard"])
+
+
+if __name__ == "__main__":
+    unittest.main()
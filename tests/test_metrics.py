@@ -0,0 +1,94 @@
+import unittest
+import urllib.error
+import urllib.request
+
+from utils import metrics
+from utils.app import process_scheduled_tasks
+from utils.scheduler import TaskScheduler
+
+
+class TestHistogram(unittest.TestCase):
+    def test_buckets_are_inclusive(self):
+        """Values equal to a bound land in that bound's bucket."""
+        histogram = metrics.Histogram((1.0, 2.0))
+        for value in (0.5, 1.0, 1.5, 3.0):
+            histogram.observe(value)
+        self.assertEqual(histogram.snapshot(), ([2, 1, 1], 6.0, 4))
+
+    def test_quantile_estimate(self):
+        """Quantiles interpolate within the bucket that holds them."""
+        histogram = metrics.Histogram((1.0, 2.0, 4.0))
+        for _ in range(100):
+            histogram.observe(1.5)
+        self.assertTrue(1.0 < histogram.quantile(0.95) <= 2.0)
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.metrics = metrics.reset_metrics()
+
+    def test_tick_counts(self):
+        """A tick records its duration, DB time and the tasks it handled."""
+        self.metrics.begin_tick()
+        self.metrics.tasks_evaluated += 3
+        self.metrics.tasks_fired += 2
+        with self.metrics.db_time:
+            pass
+        self.metrics.end_tick()
+        self.assertEqual(self.metrics.last_tick["evaluated"], 3)
+        self.assertEqual(self.metrics.last_tick["fired"], 2)
+        self.assertEqual(self.metrics.snapshot()["ticks"], 1)
+
+    def test_process_scheduled_tasks_counts(self):
+        """Fired and missed runs are counted by the scheduler tick."""
+        scheduler = TaskScheduler()
+        now = 1000000.0
+        scheduler.load([
+            (1, "On time", "noop", "interval", "60", 1, None, None, now, 0, None),
+            (2, "Late", "noop", "interval", "60", 1, None, None, now - 600, 0, None),
+        ], now)
+
+        class Executor:
+            def submit(self, *args):
+                return True
+
+            def has_capacity(self, action):
+                return True
+
+        class Cache:
+            def update_tasks_next_run(self, updates):
+                pass
+
+        process_scheduled_tasks(None, scheduler, executor=Executor(), now=now, cache=Cache())
+        self.assertEqual((self.metrics.tasks_evaluated, self.metrics.tasks_fired, self.metrics.tasks_missed),
+                         (2, 1, 1))
+
+    def test_prometheus_format(self):
+        """Counters, histograms and per-action series use the text format."""
+        self.metrics.observe_action("check_api_health", False, 0.02)
+        text = self.metrics.render_prometheus()
+        self.assertIn("# TYPE atlas_tick_seconds histogram", text)
+        self.assertIn('atlas_action_duration_seconds_bucket{action="check_api_health",le="0.025"} 1', text)
+        self.assertIn('atlas_action_duration_seconds_count{action="check_api_health"} 1', text)
+        self.assertIn('atlas_action_failures_total{action="check_api_health"} 1', text)
+
+    def test_http_endpoint(self):
+        """The endpoint serves /metrics on localhost and nothing else."""
+        server = metrics.start_metrics_server(
+            {"services": {"metrics": {"http_enabled": True, "http_port": 0}}}, self.metrics)
+        try:
+            url = f"http://127.0.0.1:{server.port}"
+            with urllib.request.urlopen(url + "/metrics", timeout=5) as response:
+                self.assertIn(b"atlas_tasks_fired_total 0", response.read())
+            with self.assertRaises(urllib.error.HTTPError):
+                urllib.request.urlopen(url + "/other", timeout=5)
+        finally:
+            server.stop()
+
+    def test_endpoint_disabled_by_default(self):
+        """No server is started unless the config asks for one."""
+        self.assertIsNone(metrics.start_metrics_server({}))
+
+
+if __name__ == "__main__":
+    unittest.main()
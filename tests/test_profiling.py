@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+import pstats
+import shutil
+import tempfile
+import unittest
+import subprocess
+import tracemalloc
+
+from utils.profiling import ServiceProfiler, DEFAULT_PROFILING_SETTINGS, rotate_files
+
+SETTINGS = dict(DEFAULT_PROFILING_SETTINGS, slow_tick_ms=30, sample_seconds=0.005, keep=2)
+
+
+def slow_step():
+    time.sleep(0.15)
+
+
+class TestServiceProfiler(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def files(self, prefix):
+        return sorted(name for name in os.listdir(self.tmp_dir) if name.startswith(prefix))
+
+    def test_profile_and_memory_files_load(self):
+        """Profiles load with pstats and memory snapshots with tracemalloc."""
+        profiler = ServiceProfiler("cprofile", self.tmp_dir, SETTINGS)
+        profiler.start()
+        try:
+            profiler.begin_tick()
+            sorted(range(10000), key=lambda value: -value)
+            profiler.end_tick()
+        finally:
+            profiler.stop()
+        profile, = self.files("profile-")
+        stats = pstats.Stats(os.path.join(self.tmp_dir, profile))
+        self.assertTrue(any("sorted" in name for _, _, name in stats.stats))
+        memory, = self.files("memory-")
+        tracemalloc.Snapshot.load(os.path.join(self.tmp_dir, memory))
+
+    def test_slow_tick_report(self):
+        """A tick past the threshold is reported with its stack and breakdown."""
+        profiler = ServiceProfiler("sampling", self.tmp_dir, dict(SETTINGS, tracemalloc_frames=0))
+        profiler.start()
+        try:
+            profiler.begin_tick()
+            slow_step()
+            profiler.end_tick({"evaluated": 3, "fired": 2, "db_seconds": 0.001})
+            profiler.begin_tick()
+            profiler.end_tick()
+        finally:
+            profiler.stop()
+        self.assertEqual(profiler.slow_ticks, 1)
+        report, = self.files("slow-tick-")
+        with open(os.path.join(self.tmp_dir, report)) as file:
+            text = file.read()
+        self.assertIn("slow_step (test_profiling.py:", text)
+        self.assertIn("Tasks evaluated 3, fired 2", text)
+        samples, = self.files("samples-")
+        self.assertGreater(os.path.getsize(os.path.join(self.tmp_dir, samples)), 0)
+
+    def test_rotation(self):
+        """Only the newest files of a kind are kept."""
+        for stamp in ("20240101", "20240102", "20240103"):
+            open(os.path.join(self.tmp_dir, f"profile-{stamp}.pstats"), "w").close()
+        rotate_files(self.tmp_dir, "profile-", 2)
+        self.assertEqual(self.files("profile-"), ["profile-20240102.pstats", "profile-20240103.pstats"])
+
+    def test_not_loaded_without_profiling(self):
+        """The service does not import the profiler unless asked to."""
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.run(
+            [sys.executable, "-c", "import sys, utils.app, utils.daemon; print('utils.profiling' in sys.modules)"],
+            cwd=root, capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip(), "False")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import threading
+import time
+import unittest
+from concurrent.futures import Future
+
+from utils.executor import TaskExecutor
+from utils.results import ResultCache, normalize_target
+
+CONFIG = {
+    "services": {
+        "executor": {"thread_workers": 4},
+        "actions": {"probe": {"pool": "thread", "max_concurrency": 1, "cache_ttl": 60}},
+    }
+}
+
+
+class TestResultCache(unittest.TestCase):
+    def test_normalize_target(self):
+        """Equivalent URLs normalize to the same key."""
+        self.assertEqual(normalize_target("HTTPS://Example.COM:443"), "https://example.com/")
+        self.assertEqual(normalize_target("http://example.com/a?b=1#top"), "http://example.com/a?b=1")
+        self.assertEqual(normalize_target("http://example.com:8080/"), "http://example.com:8080/")
+        self.assertEqual(normalize_target("/var/backups"), "/var/backups")
+
+    def test_ttl(self):
+        """Results are reused until their TTL passes; failures are not kept."""
+        cache = ResultCache()
+        self.assertIsNone(cache.lookup("a"))
+        done = Future()
+        cache.start("a", 0.05, lambda: done)
+        done.set_result(True)
+        self.assertTrue(cache.lookup("a").result())
+        time.sleep(0.06)
+        self.assertIsNone(cache.lookup("a"))
+
+        failed = Future()
+        cache.start("b", 60, lambda: failed)
+        failed.set_exception(RuntimeError("down"))
+        self.assertIsNone(cache.lookup("b"))
+        self.assertEqual(cache.stats()["hits"], 1)
+
+    def test_coalescing_and_eviction(self):
+        """Lookups of an in-flight key wait for it; the oldest entries are evicted."""
+        cache = ResultCache(max_entries=2)
+        running = Future()
+        cache.start("a", 60, lambda: running)
+        followers = [cache.lookup("a") for _ in range(3)]
+        self.assertFalse(any(future.done() for future in followers))
+        running.set_result("up")
+        self.assertEqual([future.result() for future in followers], ["up"] * 3)
+
+        for key in ("b", "c"):
+            future = Future()
+            cache.start(key, 60, lambda: future)
+            future.set_result(key)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.lookup("a"))
+        stats = cache.stats()
+        self.assertEqual((stats["coalesced"], stats["evictions"]), (3, 1))
+
+
+class TestSharedRuns(unittest.TestCase):
+    def test_tasks_on_one_target_share_a_run(self):
+        """Tasks checking one target make one call, past the concurrency limit."""
+        release = threading.Event()
+        calls = []
+        completed = []
+
+        def run_action(action, name, target=None):
+            calls.append(target)
+            release.wait(1)
+            return True
+
+        executor = TaskExecutor(run_action, CONFIG, lambda run, ok, duration: completed.append(ok))
+        try:
+            for task_id, target in enumerate(["http://api.local", "HTTP://api.local:80/", "http://api.local/"]):
+                self.assertTrue(executor.submit(task_id, f"Check {task_id}", "probe", target=target))
+            release.set()
+            deadline = time.monotonic() + 1
+            while len(completed) < 3 and time.monotonic() < deadline:
+                time.sleep(0.005)
+            self.assertTrue(executor.submit(9, "Later", "probe", target="http://api.local"))
+            self.assertEqual(calls, ["http://api.local"])
+            self.assertEqual(completed[:3], [True] * 3)
+            self.assertEqual(executor.running(), 0)
+        finally:
+            executor.shutdown(timeout=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
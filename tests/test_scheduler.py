@@ -0,0 +1,93 @@
+import unittest
+from datetime import datetime, timedelta
+
+from utils.scheduler import TaskScheduler, next_fire_time
+
+
+def make_task(task_id, minutes, last_run=None, next_run_at=None):
+    return (task_id, f"Task {task_id}", "check_api_health", "time", str(minutes), 1, last_run, None, next_run_at,
+            0, None)
+
+
+class TestNextFireTime(unittest.TestCase):
+    def test_time_later_today(self):
+        """A time condition later in the day fires today at the top of the minute."""
+        after = datetime(2024, 1, 1, 7, 30, 15).timestamp()
+        expected = datetime(2024, 1, 1, 8, 0).timestamp()
+        self.assertEqual(next_fire_time(after, "time", "480"), expected)
+
+    def test_time_already_passed(self):
+        """A time condition that already passed rolls over to tomorrow."""
+        after = datetime(2024, 1, 1, 8, 0).timestamp()
+        expected = datetime(2024, 1, 2, 8, 0).timestamp()
+        self.assertEqual(next_fire_time(after, "time", 480), expected)
+
+    def test_unknown_condition(self):
+        """Unknown condition types never fire."""
+        self.assertIsNone(next_fire_time(0, "bogus", "1"))
+
+
+class TestTaskScheduler(unittest.TestCase):
+    def setUp(self):
+        self.now = datetime(2024, 1, 1, 8, 0, 30).timestamp()
+        self.scheduler = TaskScheduler()
+
+    def test_due_within_current_minute(self):
+        """A task whose minute is in progress is due on startup."""
+        self.scheduler.load([make_task(1, 480)], self.now)
+        due = self.scheduler.pop_due(self.now)
+        self.assertEqual([task[0] for _, task in due], [1])
+
+    def test_already_ran_this_minute(self):
+        """A task that already ran in its minute waits for tomorrow."""
+        last_run = datetime(2024, 1, 1, 8, 0, 1).isoformat()
+        self.scheduler.load([make_task(1, 480, last_run)], self.now)
+        self.assertEqual(self.scheduler.pop_due(self.now), [])
+        self.assertEqual(self.scheduler.next_deadline(),
+                         (datetime(2024, 1, 1, 8, 0) + timedelta(days=1)).timestamp())
+
+    def test_orders_by_deadline(self):
+        """The earliest deadline is always at the front."""
+        self.scheduler.load([make_task(1, 600), make_task(2, 540)], self.now)
+        self.assertEqual(self.scheduler.next_deadline(), datetime(2024, 1, 1, 9, 0).timestamp())
+
+    def test_reschedule_only_fired_task(self):
+        """Firing a task pushes only its next occurrence."""
+        self.scheduler.load([make_task(1, 480), make_task(2, 600)], self.now)
+        (fire_at, task), = self.scheduler.pop_due(self.now)
+        self.scheduler.reschedule(task[0], fire_at)
+        self.assertEqual(len(self.scheduler), 2)
+        self.assertEqual(self.scheduler.next_deadline(), datetime(2024, 1, 1, 10, 0).timestamp())
+
+    def test_persisted_next_run_at(self):
+        """A persisted next_run_at wins over the condition."""
+        self.scheduler.load([make_task(1, 480, next_run_at=self.now + 5)], self.now)
+        self.assertEqual(self.scheduler.next_deadline(), self.now + 5)
+
+    def test_horizon(self):
+        """Tasks beyond the window are dropped until the index returns them."""
+        self.scheduler.load([make_task(1, 480), make_task(2, 600)], self.now, horizon=self.now + 60)
+        self.assertEqual(len(self.scheduler), 1)
+        (fire_at, task), = self.scheduler.pop_due(self.now)
+        self.assertEqual(self.scheduler.reschedule(task[0], fire_at),
+                         datetime(2024, 1, 2, 8, 0).timestamp())
+        self.assertEqual(len(self.scheduler), 0)
+
+    def test_reschedule_coalesces(self):
+        """Rescheduling after a late run skips occurrences that already passed."""
+        self.scheduler.load([make_task(1, 480)], self.now)
+        (fire_at, task), = self.scheduler.pop_due(self.now)
+        late = datetime(2024, 1, 2, 9, 0).timestamp()
+        self.assertEqual(self.scheduler.reschedule(task[0], fire_at, late),
+                         datetime(2024, 1, 3, 8, 0).timestamp())
+
+    def test_remove(self):
+        """Removed tasks are skipped even though their heap entry remains."""
+        self.scheduler.load([make_task(1, 480), make_task(2, 600)], self.now)
+        self.scheduler.remove(1)
+        self.assertEqual(self.scheduler.pop_due(self.now), [])
+        self.assertEqual(len(self.scheduler), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
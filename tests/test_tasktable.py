@@ -0,0 +1,71 @@
+import unittest
+from datetime import datetime
+
+from utils.tasktable import TaskTable, MAX_ID_GAP
+
+
+def make_row(task_id, next_run_at, last_run=None, priority=0):
+    return (task_id, f"Task {task_id}", "check_api_health", "interval", "5", 1, last_run,
+            "http://localhost", next_run_at, priority, None)
+
+
+class TestTaskTable(unittest.TestCase):
+    def test_rows_round_trip(self):
+        """Stored rows come back unchanged, with shared values interned."""
+        table = TaskTable()
+        rows = [make_row(1, 100.0, "2024-05-01T12:30:45.123456", priority=3), make_row(2, None)]
+        for row in rows:
+            table.store(row)
+        self.assertEqual([table.get(1), table.get(2)], rows)
+        self.assertIs(table.get(1)[2], table.get(2)[2])
+        self.assertEqual(table.unscheduled(), [rows[1]])
+        self.assertIsNone(table.get(3))
+
+    def test_due_and_rescheduling(self):
+        """Due rows come soonest first, stay due until rescheduled, and are not repeated."""
+        table = TaskTable()
+        for task_id, next_run_at in ((1, 300.5), (2, 200.0), (3, 100.25), (4, 5000.0)):
+            table.store(make_row(task_id, next_run_at))
+        self.assertEqual([row[0] for row in table.due(300.5)], [3, 2, 1])
+        self.assertEqual([row[0] for row in table.due(300.5)], [3, 2, 1])
+        table.set_next_run(3, 100.5)   # same bucket
+        table.set_next_run(2, 250.0)
+        table.set_next_run(2, 200.0)   # back again: filed twice
+        table.set_next_run(1, 6000.0)
+        self.assertEqual([row[0] for row in table.due(300.5)], [3, 2])
+        self.assertEqual(table.next_run_at(), 100.5)
+
+    def test_set_last_run(self):
+        """A recorded run replaces the stored last_run."""
+        table = TaskTable()
+        table.store(make_row(1, 100.0))
+        table.set_last_run(1, 1714566645.0)
+        table.set_last_run(2, 1714566645.0)  # not stored: ignored
+        self.assertEqual(table.get(1)[6], datetime.fromtimestamp(1714566645.0).isoformat())
+
+    def test_discard_and_slot_reuse(self):
+        """A removed task's slot is reused without its old schedule."""
+        table = TaskTable()
+        table.store(make_row(1, 100.0))
+        table.store(make_row(2, 200.0))
+        table.discard(1)
+        table.store(make_row(3, 100.0))
+        self.assertEqual((len(table), 1 in table), (2, False))
+        self.assertEqual([row[0] for row in table.due(200.0)], [3, 2])
+        table.discard(2)
+        table.discard(3)
+        self.assertEqual((table.due(200.0), table.next_run_at()), ([], None))
+
+    def test_far_off_ids(self):
+        """Ids far past the others are stored without growing the id index."""
+        table = TaskTable()
+        far = 10 * MAX_ID_GAP
+        table.store(make_row(far, 100.0))
+        table.store(make_row(5, 50.0))
+        self.assertEqual([row[0] for row in table.due(100.0)], [5, far])
+        table.discard(far)
+        self.assertNotIn(far, table)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from utils import database
+from utils.workers import TaskWorker
+
+NOW = 1000020.0  # a whole minute, where 60s intervals fire
+LEASE = 120
+# Thread pool, so the stub run_action below runs instead of real health checks
+CONFIG = {"services": {"executor": {"default_max_concurrency": 100},
+                       "actions": {"check_api_health": {"pool": "thread", "cache_ttl": 0}}}}
+
+
+def run_claimed(worker, now):
+    """Wait for the worker's runs to finish and store their results"""
+    deadline = time.monotonic() + 5
+    while worker._inflight and time.monotonic() < deadline:
+        worker._wake.wait(0.05)
+        worker._wake.clear()
+        worker.finish_runs(now)
+    worker.executor.shutdown()
+
+
+class TestLeases(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, "tasks.db")
+        database.initialize_database(self.db_path, {"tasks": [
+            {"name": f"Task {i}", "action": "check_api_health", "condition_type": "interval", "condition_value": "60"}
+            for i in range(10)
+        ]})
+        database.update_tasks_next_run(self.db_path, [(NOW - 1, task_id) for task_id in range(1, 11)])
+
+    def tearDown(self):
+        database.close_connections()
+        shutil.rmtree(self.tmp_dir)
+
+    def leases(self):
+        conn = database.get_connection(self.db_path)
+        return dict(conn.execute("SELECT id, lease_owner FROM tasks"))
+
+    def check_claims(self):
+        first = database.claim_due_tasks(self.db_path, "a", NOW, LEASE, 6)
+        second = database.claim_due_tasks(self.db_path, "b", NOW, LEASE, 6)
+        self.assertEqual((len(first), len(second)), (6, 4))
+        self.assertFalse({task[0] for task in first} & {task[0] for task in second})
+        self.assertEqual(database.claim_due_tasks(self.db_path, "c", NOW, LEASE, 6), [])
+
+        # Once the leases expire (their workers died) the tasks are claimable again
+        self.assertEqual(len(database.claim_due_tasks(self.db_path, "c", NOW + LEASE, LEASE, 20)), 10)
+
+    def test_claims_are_exclusive(self):
+        """A leased task is not handed to another worker until its lease expires."""
+        self.check_claims()
+
+    def test_claims_without_returning(self):
+        """Older SQLite libraries claim through select-then-update."""
+        with mock.patch.object(database, "SUPPORTS_RETURNING", False):
+            self.check_claims()
+
+    def test_finish_requires_the_lease(self):
+        """Only the lease holder can store a run's result."""
+        database.claim_due_tasks(self.db_path, "a", NOW, LEASE, 1)
+        self.assertEqual(database.finish_leased_tasks(self.db_path, "b", [(NOW + 60, None, 1)]), 0)
+        self.assertEqual(database.finish_leased_tasks(self.db_path, "a", [(NOW + 60, None, 1)]), 1)
+        self.assertIsNone(self.leases()[1])
+        self.assertEqual(database.get_next_run_after(self.db_path, NOW), NOW + 60)
+
+    def test_worker_runs_and_reschedules(self):
+        """A worker runs what it claims, then stores the next run and releases the lease."""
+        ran = []
+        worker = TaskWorker(self.db_path, CONFIG, owner="w",
+                            run_action=lambda action, name, target=None: ran.append(name))
+        self.assertEqual(worker.step(NOW), 10)
+        run_claimed(worker, NOW)
+        self.assertEqual(len(ran), 10)
+        self.assertEqual(set(self.leases().values()), {None})
+        self.assertEqual(database.get_next_run_after(self.db_path, NOW), NOW + 60)
+
+    def test_crashed_worker_tasks_are_taken_over(self):
+        """Tasks held by a worker that never finishes run elsewhere once the lease expires."""
+        database.claim_due_tasks(self.db_path, "crashed", NOW, 30, 3)
+        ran = []
+        for now, expected in ((NOW, 7), (NOW + 40, 3)):
+            worker = TaskWorker(self.db_path, CONFIG, owner="w",
+                                run_action=lambda action, name, target=None: ran.append(name))
+            self.assertEqual(worker.step(now), expected)
+            run_claimed(worker, now)
+        self.assertEqual(len(ran), 10)
+
+    def test_file_changed_tasks_are_reported(self):
+        """Workers warn once that they do not run file_changed tasks."""
+        database.import_tasks(self.db_path, [{"name": "On upload", "action": "check_api_health",
+                                              "condition_type": "file_changed", "condition_value": self.tmp_dir}])
+        worker = TaskWorker(self.db_path, CONFIG, owner="w", run_action=lambda action, name, target=None: None)
+        with self.assertLogs(level="WARNING") as logs:
+            worker.step(NOW)
+            worker.step(NOW + 1)
+        run_claimed(worker, NOW + 1)
+        self.assertEqual(len([line for line in logs.output if "On upload will not run" in line]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
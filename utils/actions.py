@@ -0,0 +1,149 @@
+"""Task action registry for AtlasPi
+
+An action is a function `run(task_name, target)` registered with the
+`@action` decorator, which also declares how the executor should run it:
+its pool ("thread" for I/O, "process" for CPU-heavy work, "async" for
+functions returning a Future), timeout and max concurrency, and with
+`cache_ttl` how long its result for a target may be reused. Settings
+under "services" -> "actions" in the config override the declared ones.
+
+Action modules are imported the first time one of their actions is
+needed. Built-in actions are listed in BUILTIN_ACTIONS; other modules are
+named per action in the config:
+
+    "actions": {"send_report": {"module": "plugins.report"}}
+
+An action fails by returning False or raising.
+"""
+
+import logging
+import importlib
+import threading
+from utils.common import strings
+
+# Built-in action name -> module that registers it
+BUILTIN_ACTIONS = {
+    "check_api_health": "utils.health",
+    "backup_database": "utils.backup",
+}
+
+# Registered actions by name
+_actions = {}
+
+# Action name -> import error, so a broken module is reported only once
+_failed = {}
+
+_config = None
+_db_path = None
+_shutdown_hooks = []
+_lock = threading.Lock()
+
+
+class Action:
+    """A registered action and the execution settings it declares"""
+
+    __slots__ = ("name", "run", "pool", "timeout", "max_concurrency", "cache_ttl", "settings")
+
+    def __init__(self, name, run, pool="thread", timeout=None, max_concurrency=None, cache_ttl=0):
+        self.name = name
+        self.run = run
+        self.pool = pool
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.cache_ttl = cache_ttl
+        # In the shape of a "services" -> "actions" entry, for the executor
+        self.settings = {"pool": pool, "cache_ttl": cache_ttl}
+        if timeout is not None:
+            self.settings["timeout"] = timeout
+        if max_concurrency is not None:
+            self.settings["max_concurrency"] = max_concurrency
+
+    def __repr__(self):
+        return f"Action({self.name!r}, pool={self.pool!r})"
+
+
+def action(name, pool="thread", timeout=None, max_concurrency=None, cache_ttl=0):
+    """Decorator registering `run(task_name, target)` as action `name`"""
+
+    def register(run):
+        _actions[name] = Action(name, run, pool, timeout, max_concurrency, cache_ttl)
+        return run
+
+    return register
+
+
+def on_shutdown(hook):
+    """Decorator registering `hook()` to run when the service stops or is reconfigured"""
+    with _lock:
+        _shutdown_hooks.append(hook)
+    return hook
+
+
+def configure_actions(config, db_path=None, forked=False):
+    """Use `config` (and the service's `db_path`) for action modules
+
+    Loaded action modules release their resources first, unless `forked`:
+    a forked process's copies of them belong to its parent.
+    """
+    global _config, _db_path
+    if not forked:
+        shutdown_actions()
+    _config = config
+    _db_path = db_path
+    _failed.clear()
+
+
+def get_config():
+    """The app config given to configure_actions(), for action modules"""
+    return _config
+
+
+def get_db_path():
+    """The database of the service running the actions (None if not given)"""
+    return _db_path
+
+
+def shutdown_actions():
+    """Run the shutdown hooks of the action modules loaded so far"""
+    with _lock:
+        hooks = list(_shutdown_hooks)
+    for hook in hooks:
+        try:
+            hook()
+        except Exception as e:
+            logging.error(strings.ACTION_SHUTDOWN_ERROR.format(getattr(hook, "__name__", hook), e))
+
+
+def _module_for(name):
+    configured = (_config or {}).get("services", {}).get("actions", {}).get(name, {})
+    return configured.get("module") or BUILTIN_ACTIONS.get(name)
+
+
+def get_action(name):
+    """Return the Action registered as `name`, importing its module if needed
+
+    Returns None for unknown actions and ones whose module fails to load.
+    """
+    registered = _actions.get(name)
+    if registered is not None or name in _failed:
+        return registered
+    module = _module_for(name)
+    if module is None:
+        return None
+    try:
+        importlib.import_module(module)
+    except Exception as e:
+        _failed[name] = e
+        logging.error(strings.ACTION_IMPORT_ERROR.format(name, module, e))
+        return None
+    registered = _actions.get(name)
+    if registered is None:
+        _failed[name] = None
+        logging.error(strings.ACTION_NOT_REGISTERED.format(module, name))
+    return registered
+
+
+def action_settings(name):
+    """Execution settings declared by action `name` ({} if unknown)"""
+    registered = get_action(name)
+    return registered.settings if registered is not None else {}
@@ -2,13 +2,41 @@
 
 import time
 import logging
+import functools
+import threading
 from datetime import datetime
 from utils.common import strings
-from utils.database import get_tasks, update_task_last_run
+from utils.database import (
+    update_tasks_next_run, update_task_last_run, close_thread_connections, import_tasks, deactivate_tasks,
+    LastRunBuffer, TaskCache
+)
+from utils.config import ConfigWatcher
+from utils.scheduler import TaskScheduler, first_fire_time, SCHEDULE_WINDOW_SECONDS
+from utils.dispatch import Dispatcher
+from utils.filewatch import FileWatcher
+from utils.conditions import compile_condition
+from utils.executor import TaskExecutor, get_executor_settings, POOL_ASYNC
+from utils.metrics import get_metrics, reset_metrics, start_metrics_server
+from utils.actions import get_action, action_settings, configure_actions, shutdown_actions
+from utils.history import start_history, OUTCOME_OK, OUTCOME_FAILED, OUTCOME_TIMEOUT, OUTCOME_MISSED, OUTCOME_SKIPPED
 
+# Longest single sleep. Bounding the wait keeps the status log ticking and
+# lets the loop notice wall-clock jumps (e.g. NTP sync after boot on a Pi).
+MAX_SLEEP_SECONDS = 60
 
-def run_application_loop(db_path, log_path, debug_mode=False, stop_flag=None):
-    """Main application loop that processes tasks periodically"""
+# The status line is logged at most this often, however often the loop wakes
+STATUS_LOG_SECONDS = 60
+
+
+def run_application_loop(db_path, log_path, debug_mode=False, stop_flag=None, config=None, config_path=None,
+                         watcher=None, on_ready=None, profile=None):
+    """Main application loop that sleeps until the next task is due
+
+    With `config_path` (or a ConfigWatcher as `watcher`), task edits in the
+    config are applied while running. `on_ready` is called once the first
+    tick has run. `profile` ("cprofile" or "sampling") runs the loop
+    under the profiler from utils/profiling.py.
+    """
     
     logging.info(strings.SERVICE_STARTING)
     
@@ -16,18 +44,60 @@ def run_application_loop(db_path, log_path, debug_mode=False, stop_flag=None):
         logging.info(strings.PATHS_LOG_FILE.format(log_path))
         logging.info(strings.PATHS_DATABASE.format(db_path))
     
+    if stop_flag is None:
+        stop_flag = threading.Event()
+    
+    last_runs = LastRunBuffer(db_path)
+    stats = reset_metrics()
+    metrics_server = start_metrics_server(config, stats)
+    history = start_history(db_path, config)
+    dispatcher = Dispatcher(config)
+    wake = getattr(stop_flag, "wake", None)
+    
+    def on_complete(run, ok, duration):
+        # Runs on a worker thread; the buffers and metrics are thread-safe
+        last_runs.record(run.task_id)
+        stats.observe_action(run.action, ok, duration)
+        if history is not None:
+            outcome = OUTCOME_OK if ok else (OUTCOME_TIMEOUT if run.timed_out else OUTCOME_FAILED)
+            history.record(run.task_id, outcome, duration)
+        if logging.root.isEnabledFor(logging.DEBUG):
+            logging.debug(strings.TASK_COMPLETED.format(run.name, "ok" if ok else "failed", duration))
+        if wake is not None and len(dispatcher):
+            # A slot is free: start queued runs now rather than at the next retry
+            wake()
+    
+    configure_actions(config, db_path)
+    executor = TaskExecutor(execute_task_action, config, on_complete, execute_task_action_async, action_settings)
+    profiler = None
     try:
+        if profile:
+            # Only imported when asked for: no profiling, no cost
+            from utils.profiling import start_profiler
+            profiler = start_profiler(profile, db_path, config)
+        cache = TaskCache(db_path)
+        # Flushed on this thread, so completions also reach the cached rows
+        last_runs.cache = cache
+        scheduler = TaskScheduler()
+        file_watcher = FileWatcher(config)
+        unschedulable = set()
+        scheduled = refresh_schedule(cache, scheduler, time.time(), unschedulable, file_watcher)
+        logging.info(strings.SCHEDULER_LOADED.format(scheduled))
+        if watcher is None and config_path:
+            watcher = ConfigWatcher(config_path, config)
+        
         loop_count = 0
-        while True:
-            # Check if we should stop
-            if stop_flag and stop_flag.is_set():
-                logging.info("Service stop requested")
-                break
-                
+        next_status_log = 0.0
+        changes = None
+        while not stop_flag.is_set():
             loop_count += 1
+            stats.begin_tick()
+            if profiler is not None:
+                profiler.begin_tick()
             
-            # Log status every 6 loops (1 minute) - only to log file in normal mode
-            if loop_count % 6 == 1:
+            # Log status about once a minute - only to log file in normal mode
+            if time.monotonic() >= next_status_log:
+                next_status_log = time.monotonic() + STATUS_LOG_SECONDS
                 if debug_mode:
                     logging.info(strings.RUNTIME_LOOP_STATUS.format(
                         datetime.now().strftime('%H:%M:%S'), loop_count
@@ -35,70 +105,316 @@ def run_application_loop(db_path, log_path, debug_mode=False, stop_flag=None):
                 else:
                     logging.info(f"Running cycle #{loop_count}")
             
-            # Process any scheduled tasks
-            process_scheduled_tasks(db_path)
+            # Apply config edits, or pull the next window when this one ends
+            now = time.time()
+            if changes:
+                apply_task_changes(db_path, changes, cache, scheduler, now, unschedulable, file_watcher)
+            elif now >= scheduler.horizon:
+                refresh_schedule(cache, scheduler, now, unschedulable, file_watcher)
+            process_file_changes(file_watcher, cache, scheduler, now)
+            
+            # Run whatever is due and reschedule only those tasks
+            process_scheduled_tasks(db_path, scheduler, last_runs, executor, now, cache, history, dispatcher)
+            executor.check_timeouts()
+            with stats.db_time:
+                last_runs.flush_if_due()
+            
+            stats.gauges["scheduled_tasks"] = len(scheduler)
+            stats.gauges["cached_tasks"] = len(cache)
+            stats.gauges["running_actions"] = executor.running()
+            stats.gauges["dispatch_queued"] = len(dispatcher)
+            stats.gauges["watched_paths"] = len(file_watcher)
+            results = getattr(executor, "results", None)
+            if results is not None:
+                for name, value in results.stats().items():
+                    stats.gauges["result_cache_" + name] = value
+                results.log_stats_if_due()
+            stats.end_tick()
+            if profiler is not None:
+                profiler.end_tick(stats.last_tick)
+            if logging.root.isEnabledFor(logging.DEBUG):
+                logging.debug(strings.SERVICE_LOOP.format(loop_count))
+            if on_ready is not None and loop_count == 1:
+                on_ready()
             
-            # Only log to file in normal mode
-            logging.debug(strings.SERVICE_LOOP.format(loop_count))
-
-            # TODO: Add actual task processing here
-            # For now, just simulate periodic work
-            time.sleep(10)  # Check every 10 seconds
-            # For now, just simulate periodic work
-            time.sleep(10)  # Check every 10 seconds
+            # Sleep until the next thing to do; a stop request wakes us at once
+            changes = wait_for_wakeup(
+                stop_flag, seconds_until_wakeup(scheduler, last_runs, executor, dispatcher, file_watcher), watcher)
+        
+        logging.info("Service stop requested")
+        logging.info(strings.CACHE_STATS.format(**cache.stats()))
+        if getattr(executor, "results", None) is not None:
+            executor.results.log_stats()
             
     except KeyboardInterrupt:
         logging.info("Service interrupted by Ctrl+C")
     except Exception as e:
         logging.error(strings.SERVICE_ERROR.format(e))
     finally:
+        # Let running actions finish (up to drain_seconds), then persist their
+        # bookkeeping before the thread lets go of the DB
+        executor.shutdown(timeout=get_executor_settings(config)[0]["drain_seconds"])
+        shutdown_actions()
+        if metrics_server is not None:
+            metrics_server.stop()
+        if history is not None:
+            history.close()
+        last_runs.flush()
+        close_thread_connections()
+        if profiler is not None:
+            profiler.stop()
         logging.info("AtlasPi service stopped")
 
 
-def process_scheduled_tasks(db_path):
-    """Check and execute any scheduled tasks"""
+def refresh_schedule(cache, scheduler, now, unschedulable=None, file_watcher=None):
+    """Schedule new tasks, then load the next window of due tasks
+
+    The cache reloads only rows changed since the last refresh (and reads
+    nothing when the table is unchanged). Tasks without next_run_at (new
+    or changed) get their first fire time persisted, then tasks due before
+    the window's end are loaded. Invalid conditions recorded in
+    `unschedulable` are only reported once. file_changed tasks are handed
+    to `file_watcher` instead; they are scheduled when their path changes.
+    """
+    if unschedulable is None:
+        unschedulable = set()
+    db_time = get_metrics().db_time
+    with db_time:
+        reloaded = cache.refresh()
+    if reloaded:
+        logging.info(strings.CACHE_RELOADED.format(**cache.stats()))
+    if file_watcher is not None and len(file_watcher):
+        file_watcher.sync(cache.get_task)
+    
+    updates = []
+    for task in cache.get_unscheduled_tasks():
+        # Keyed by condition too, so an edited task is tried again
+        key = (task[0], task[3], task[4])
+        if key in unschedulable:
+            continue
+        if file_watcher is not None and file_watcher.watch(task):
+            continue
+        fire_at = first_fire_time(task, now)
+        if fire_at is None:
+            unschedulable.add(key)
+        else:
+            updates.append((fire_at, task[0]))
+    if updates:
+        with db_time:
+            cache.update_tasks_next_run(updates)
+    
+    horizon = now + SCHEDULE_WINDOW_SECONDS
+    return scheduler.load(cache.get_due_tasks(horizon), now, horizon)
+
+
+def apply_task_changes(db_path, changes, cache, scheduler, now, unschedulable=None, file_watcher=None):
+    """Write a config diff to the database and reschedule just those tasks
+
+    Only the changed rows are written and reloaded into the cache; edited
+    conditions lose their next_run_at (via trigger) and get a new one, and
+    the current window is rebuilt from the cache without touching the
+    database again.
+    """
+    upserts, removed = changes
+    with get_metrics().db_time:
+        try:
+            if upserts:
+                import_tasks(db_path, upserts)
+            if removed:
+                deactivate_tasks(db_path, removed)
+        except Exception as e:
+            logging.error(strings.CONFIG_APPLY_ERROR.format(e))
+        # Our own commits do not change data_version, so skip that shortcut
+        cache.refresh(force=True)
+    return refresh_schedule(cache, scheduler, now, unschedulable, file_watcher)
+
+
+def process_file_changes(file_watcher, cache, scheduler, now):
+    """Schedule the file_changed tasks whose path changed to run now
+
+    A task that already has a run pending is left alone: that run will
+    see the change. Returns the number of tasks scheduled.
+    """
+    updates = []
+    for task_id in file_watcher.poll():
+        task = cache.get_task(task_id)
+        if task is not None and task[8] is None:
+            updates.append((now, task_id))
+    if updates:
+        with get_metrics().db_time:
+            cache.update_tasks_next_run(updates)
+        for _, task_id in updates:
+            scheduler.add(cache.get_task(task_id), now)
+    return len(updates)
+
+
+def wait_for_wakeup(stop_flag, timeout, watcher=None):
+    """Sleep up to `timeout` seconds, polling `watcher` for config edits
+
+    Returns early with the watcher's (upserts, removed) when the config
+    changed, or None once the timeout passes, a stop is requested or the
+    flag is woken (see ServiceFlag.wake).
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if watcher is not None:
+            remaining = min(remaining, watcher.seconds_until_poll())
+        remaining = max(remaining, 0)
+        wait_until = time.monotonic() + remaining
+        if stop_flag.wait(remaining):
+            return None
+        woken = time.monotonic() < wait_until
+        if watcher is not None:
+            changes = watcher.poll()
+            if changes:
+                return changes
+        if woken or time.monotonic() >= deadline:
+            return None
+
+
+def seconds_until_wakeup(scheduler, last_runs, executor, dispatcher=None, file_watcher=None):
+    """Seconds until the next task, window refresh, flush, run timeout, queued run or file scan is due"""
+    now = time.time()
+    timeout = MAX_SLEEP_SECONDS
+    for deadline in (scheduler.next_deadline(), scheduler.horizon):
+        if deadline is not None:
+            timeout = min(max(deadline - now, 0), timeout)
+    ready = dispatcher.seconds_until_ready() if dispatcher is not None else None
+    scan = file_watcher.seconds_until_scan() if file_watcher is not None else None
+    for remaining in (last_runs.seconds_until_flush(), executor.seconds_until_timeout(), ready, scan):
+        if remaining is not None:
+            timeout = min(timeout, remaining)
+    if executor.running():
+        # A run finishing mid-sleep does not wake the loop, so look again
+        # in time to flush its last_run within the flush interval
+        timeout = min(timeout, last_runs.flush_interval)
+    return timeout
+
+
+def process_scheduled_tasks(db_path, scheduler, last_runs=None, executor=None, now=None, cache=None, history=None,
+                            dispatcher=None):
+    """Execute the tasks that are due and schedule their next run
+
+    Due runs go through `dispatcher` (misfire policy, priority queue and
+    rate limits); runs it holds back stay queued for a later call. With
+    an executor, runs are handed off and their completions reach
+    `last_runs` asynchronously. Without one they run inline, and each
+    completion is buffered in `last_runs` (or written straight away).
+    New next_run_at values are written through `cache` when given.
+    Missed, skipped and inline runs are recorded in `history`. No
+    database reads happen here.
+    """
+    if now is None:
+        now = time.time()
+    if dispatcher is None:
+        dispatcher = Dispatcher()
+    stats = get_metrics()
+    
+    next_runs = []
+    shed = []
+    merged = dispatcher.merged
+    due = scheduler.pop_due(now)
+    stats.tasks_evaluated += len(due)
+    for fire_at, task in due:
+        task_id = task[0]
+        try:
+            fire_times = dispatcher.plan(task, fire_at, now, functools.partial(scheduler.occurrences, task_id))
+            if not fire_times:
+                # Too late to count (service down, device suspended)
+                stats.tasks_missed += 1
+                if history is not None:
+                    history.record(task_id, OUTCOME_MISSED)
+            for run_at in fire_times:
+                entry = dispatcher.enqueue(task, run_at)
+                if entry is not None:
+                    shed.append(entry)
+        except Exception as e:
+            logging.error(f"Error processing scheduled tasks: {e}")
+        finally:
+            # Always queue the next occurrence so one failure never drops a task
+            next_runs.append((scheduler.reschedule(task_id, fire_at, now), task_id))
+    
+    stats.tasks_merged += dispatcher.merged - merged
+    if shed:
+        stats.tasks_shed += len(shed)
+        logging.warning(strings.DISPATCH_SHED.format(len(shed), len(dispatcher)))
+        if history is not None:
+            for _, task in shed:
+                history.record(task[0], OUTCOME_SKIPPED)
+    
+    has_capacity = executor.has_capacity if executor is not None else None
+    for fire_at, task in dispatcher.take(now, has_capacity):
+        run_task(db_path, task, fire_at, last_runs, executor, history)
+    
+    # Persist the new next_run_at values in one transaction so the index
+    # never hands back a run that already happened
+    if next_runs:
+        try:
+            with stats.db_time:
+                if cache is not None:
+                    cache.update_tasks_next_run(next_runs)
+                else:
+                    update_tasks_next_run(db_path, next_runs)
+        except Exception as e:
+            logging.error(f"Error processing scheduled tasks: {e}")
+
+
+def run_task(db_path, task, fire_at, last_runs=None, executor=None, history=None):
+    """Start one dispatched run on `executor`, or run it inline without one"""
+    task_id, name, action, target = task[0], task[1], task[2], task[7]
+    stats = get_metrics()
     try:
-        tasks = get_tasks(db_path)
-        current_time = datetime.now()
-        
-        for task in tasks:
-            task_id, name, action, condition_type, condition_value, is_active, last_run = task
-            
-            if should_execute_task(current_time, condition_type, condition_value, last_run):
-                logging.info(f"Executing task: {name}")
-                execute_task_action(action, name)
-                update_task_last_run(db_path, task_id)
-                
+        logging.info(f"Executing task: {name}")
+        if executor is not None:
+            if executor.submit(task_id, name, action, fire_at, target):
+                stats.tasks_fired += 1
+            elif history is not None:
+                history.record(task_id, OUTCOME_SKIPPED)
+            return
+        stats.tasks_fired += 1
+        started = time.perf_counter()
+        ok = execute_task_action(action, name, target)
+        duration = time.perf_counter() - started
+        stats.observe_action(action, ok, duration)
+        if history is not None:
+            history.record(task_id, OUTCOME_OK if ok else OUTCOME_FAILED, duration)
+        if last_runs is not None:
+            last_runs.record(task_id)
+        else:
+            update_task_last_run(db_path, task_id)
     except Exception as e:
         logging.error(f"Error processing scheduled tasks: {e}")
 
 
 def should_execute_task(current_time, condition_type, condition_value, last_run):
     """Determine if a task should be executed based on its schedule"""
-    if condition_type == "time":
-        # Convert minutes since midnight to time check
-        current_minutes = current_time.hour * 60 + current_time.minute
-        return current_minutes == int(condition_value)
-    
-    # Add other condition types here (interval, daily, etc.)
-    return False
+    try:
+        # Compiled conditions are cached, so repeated calls do no parsing
+        return compile_condition(condition_type, condition_value).matches(current_time)
+    except (TypeError, ValueError):
+        return False
 
 
-def execute_task_action(action, task_name):
-    """Execute the specified task action"""
+def execute_task_action(action, task_name, target=None):
+    """Execute the specified task action; returns True on success"""
+    registered = get_action(action)
+    if registered is None:
+        logging.warning(f"Unknown action '{action}' for task: {task_name}")
+        return False
     try:
-        if action == "check_api_health":
-            # Placeholder for API health check
-            logging.info(f"Checking API health for task: {task_name}")
-            # TODO: Implement actual API health check
-            
-        elif action == "backup_database":
-            # Placeholder for database backup
-            logging.info(f"Backing up database for task: {task_name}")
-            # TODO: Implement database backup
-            
-        else:
-            logging.warning(f"Unknown action '{action}' for task: {task_name}")
-            
+        result = registered.run(task_name, target)
+        if registered.pool == POOL_ASYNC:
+            result = result.result()
     except Exception as e:
-        logging.error(f"Failed to execute task '{task_name}': {e}")
\ No newline at end of file
+        logging.error(f"Failed to execute task '{task_name}': {e}")
+        return False
+    return result is not False
+
+
+def execute_task_action_async(action, task_name, target=None):
+    """Start an asyncio-based action; returns a Future, or None if unsupported"""
+    registered = get_action(action)
+    if registered is None or registered.pool != POOL_ASYNC:
+        return None
+    return registered.run(task_name, target)
\ No newline at end of file
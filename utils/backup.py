@@ -0,0 +1,181 @@
+"""Database backups for AtlasPi
+
+Backups are taken online with SQLite's backup API, a batch of pages at a
+time with a short pause in between, so the scheduler keeps reading and
+writing while a backup runs. In WAL mode the copy is read from one
+snapshot: writes made meanwhile neither block nor restart it. The copy is
+then gzip-compressed in chunks and old backups are pruned by count and age.
+
+Compression is a second pass over a complete uncompressed copy, not a
+stream. The backup API writes into a database that SQLite must be able
+to seek in, lock and finish with a header update. Pages cannot be read
+out of a WAL-mode snapshot any other way without the sqlite_dbpage
+extension, which Python's sqlite3 does not ship. So a compressed backup
+briefly needs free space for the uncompressed copy as well, and its pages
+are written twice.
+"""
+
+import os
+import gzip
+import time
+import shutil
+import logging
+import sqlite3
+from utils.common import strings
+from utils.actions import action, get_config, get_db_path
+from utils.config import get_config_paths, get_service_settings
+from utils.executor import POOL_PROCESS
+
+DEFAULT_BACKUP_SETTINGS = {
+    "directory": "backups",    # relative to the database's directory
+    "pages_per_step": 1024,    # pages copied per step (4 MiB at 4 KiB pages)
+    "step_pause": 0.01,        # seconds to pause between steps
+    "compress": True,
+    "compress_level": 1,       # ~4x faster than 6 for ~5% more bytes
+    "keep": 7,                 # most backups kept (0 = no limit)
+    "max_age_days": 30,        # older backups are deleted (0 = no limit)
+}
+
+# Progress is logged each time another PROGRESS_STEP of the pages is copied
+PROGRESS_STEP = 0.1
+
+COPY_CHUNK = 1024 * 1024
+TIMESTAMP_FORMAT = "%Y%m%d-%H%M%S"
+
+
+def get_backup_settings(config):
+    """Return backup settings from the app config"""
+    return get_service_settings(config, "backup", DEFAULT_BACKUP_SETTINGS)
+
+
+def backup_directory(db_path, settings):
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), settings["directory"])
+
+
+def backup_prefix(db_path):
+    """File name prefix shared by all backups of `db_path`"""
+    return os.path.splitext(os.path.basename(db_path))[0] + "-"
+
+
+def create_backup(db_path, directory=None, settings=None, progress=None, now=None):
+    """Back up `db_path` into `directory` and return a summary dict
+
+    `progress(copied, total)` is called with page counts after each step.
+    With compression, the uncompressed copy is gzipped in a second pass
+    and then deleted (see the module docstring).
+    """
+    settings = settings or DEFAULT_BACKUP_SETTINGS
+    directory = directory or backup_directory(db_path, settings)
+    os.makedirs(directory, exist_ok=True)
+    stamp = time.strftime(TIMESTAMP_FORMAT, time.localtime(now))
+    copy_path = os.path.join(directory, f"{backup_prefix(db_path)}{stamp}.db")
+    started = time.perf_counter()
+
+    # Only complete backups ever carry their final name
+    pages = _copy_pages(db_path, copy_path + ".partial", settings, progress)
+    size = os.path.getsize(copy_path + ".partial")
+    if settings["compress"]:
+        path = copy_path + ".gz"
+        _compress(copy_path + ".partial", path + ".partial", settings["compress_level"])
+        os.remove(copy_path + ".partial")
+    else:
+        path = copy_path
+    os.replace(path + ".partial", path)
+
+    summary = {
+        "path": path,
+        "pages": pages,
+        "size": size,
+        "stored": os.path.getsize(path),
+        "seconds": time.perf_counter() - started,
+    }
+    logging.info(strings.BACKUP_DONE.format(db_path, path, summary["size"] / (1024 * 1024),
+                                            summary["stored"] / (1024 * 1024), summary["seconds"]))
+    return summary
+
+
+def _copy_pages(db_path, target_path, settings, progress):
+    # Own connections: the backup may run for minutes on a pool process
+    source = sqlite3.connect(db_path, isolation_level=None)
+    target = sqlite3.connect(target_path)
+    copied = [0]
+    next_report = [PROGRESS_STEP]
+
+    def on_step(status, remaining, total):
+        copied[0] = total - remaining
+        if progress is not None:
+            progress(copied[0], total)
+        if remaining and copied[0] >= next_report[0] * total:
+            logging.info(strings.BACKUP_PROGRESS.format(db_path, copied[0] * 100 / total, copied[0], total))
+            while next_report[0] * total <= copied[0]:
+                next_report[0] += PROGRESS_STEP
+        if remaining and settings["step_pause"]:
+            time.sleep(settings["step_pause"])
+
+    try:
+        # In WAL mode, read every step from one snapshot. Otherwise a commit
+        # by the scheduler between steps would restart the copy, and under
+        # steady writes it would never finish.
+        snapshot = source.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        if snapshot:
+            source.execute("BEGIN")
+            source.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+        source.backup(target, pages=settings["pages_per_step"], progress=on_step)
+        if snapshot:
+            source.execute("COMMIT")
+    except BaseException:
+        target.close()
+        if os.path.exists(target_path):
+            os.remove(target_path)
+        raise
+    finally:
+        source.close()
+    target.close()
+    return copied[0]
+
+
+def _compress(path, compressed_path, level):
+    with open(path, "rb") as source, gzip.open(compressed_path, "wb", compresslevel=level) as target:
+        shutil.copyfileobj(source, target, COPY_CHUNK)
+
+
+def rotate_backups(directory, prefix, keep=0, max_age_days=0, now=None):
+    """Delete backups past the newest `keep` or older than `max_age_days`
+
+    Returns the deleted paths. Partial files are left alone.
+    """
+    if now is None:
+        now = time.time()
+    try:
+        names = [name for name in os.listdir(directory)
+                 if name.startswith(prefix) and name.endswith((".db", ".db.gz"))]
+    except FileNotFoundError:
+        return []
+    # Timestamps in the names sort oldest to newest
+    names.sort(reverse=True)
+    removed = []
+    for index, name in enumerate(names):
+        path = os.path.join(directory, name)
+        too_many = keep and index >= keep
+        too_old = max_age_days and now - os.path.getmtime(path) > max_age_days * 86400
+        if too_many or too_old:
+            os.remove(path)
+            removed.append(path)
+    if removed:
+        logging.info(strings.BACKUP_ROTATED.format(len(removed), directory))
+    return removed
+
+
+@action("backup_database", pool=POOL_PROCESS, timeout=600, max_concurrency=1)
+def backup_database(task_name, target=None):
+    """backup_database action; `target` overrides the backup directory
+
+    Backs up the database of the service running it, or the default one.
+    """
+    logging.info(f"Backing up database for task: {task_name}")
+    settings = get_backup_settings(get_config())
+    db_path = get_db_path() or get_config_paths()['db_path']
+    directory = target or backup_directory(db_path, settings)
+    create_backup(db_path, directory, settings)
+    rotate_backups(directory, backup_prefix(db_path), settings["keep"], settings["max_age_days"])
+    return True
@@ -15,8 +15,11 @@ MENU_SERVICE_RUNNING = "Service status: RUNNING"
 MENU_SERVICE_STOPPED = "Service status: STOPPED"
 MENU_START_SERVICE = f"Start {APP_NAME} service"
 MENU_STOP_SERVICE = f"Stop {APP_NAME} service"
-MENU_VIEW_LOGS = "View live logs (tail -f)"
+MENU_VIEW_LOGS = "View live logs"
 MENU_CLEAR_FILES = "Clear database & logs"
+MENU_SHOW_STATS = "Show stats"
+MENU_SEARCH_LOGS = "Search logs by time"
+MENU_PROFILING = "Toggle profiling (now: {})"
 MENU_EXIT = "Exit"
 
 # Menu interaction messages
@@ -24,9 +27,13 @@ LOG_FILE_NOT_FOUND = "Log file not found: {}"
 RUN_SERVICE_FOR_LOGS = f"Run {APP_NAME} service first to generate logs."
 PRESS_ENTER_CONTINUE = "Press enter to continue..."
 VIEWING_LIVE_LOGS = "Viewing live logs: {}"
+LOG_SEARCH_SINCE_PROMPT = "From (e.g. 02:00 or 2024-01-01 02:00): "
+LOG_SEARCH_UNTIL_PROMPT = "To (e.g. 02:15): "
+LOG_SEARCH_BAD_TIME = "Invalid time: {}"
+LOG_SEARCH_RESULTS = "{} matching lines."
+LOG_FILTER_PROMPT = "Filter (a level such as 'warning' and/or text, blank for all): "
 PRESS_CTRL_C_RETURN = "Press Ctrl+C to return to menu"
 RETURNING_TO_MENU = "Returning to menu..."
-TAIL_NOT_FOUND = "Error: 'tail' command not found. Using basic file reading..."
 ERROR_READING_LOG = "Error reading log file: {}"
 CLEARING_DEBUG_FILES = "Clearing debug files..."
 REMOVED_FILE = "Removed {}"
@@ -37,7 +44,9 @@ STARTING_SERVICE_BG = f"Starting {APP_NAME} service in background..."
 SERVICE_STARTED = "Service started successfully"
 STOPPING_SERVICE = f"Stopping {APP_NAME} service..."
 SERVICE_STOPPED = "Service stopped successfully"
+SERVICE_STOP_SLOW = "Service is still stopping; waiting for running tasks and pending updates"
 SERVICE_NOT_RUNNING = "Service is not running"
+PROFILING_TOGGLED = "Profiling: {}"
 SHUTTING_DOWN = "Shutting down..."
 EXITING = "Exiting..."
 INVALID_CHOICE = "Invalid choice. Please enter 1-{}."
@@ -54,19 +63,120 @@ DB_INITIALIZING = "Database not found. Initializing at {}..."
 DB_TABLE_CREATED = "Created tasks table."
 DB_INITIALIZED = "Database initialized successfully."
 DB_EXISTS = "Database already exists. Skipping initialization."
-DB_TASKS_FOUND = "Found {} tasks in the configuration."
-DB_TASKS_NONE = "No tasks found in configuration. Database created with empty tasks table."
-DB_TASK_INSERTING = "Inserting task: {}"
-DB_TASK_SUCCESS = "Successfully seeded task: {}"
-DB_TASK_ERROR = "Failed to insert task: {}. Error: {}"
+DB_TASKS_NONE = "No tasks section in configuration. Leaving stored tasks unchanged."
+DB_TASK_ERROR = "Failed to import task: {}. Error: {}"
+DB_TASKS_IMPORTED = ("Imported {total} tasks: {inserted} new, {updated} updated, {unchanged} unchanged, "
+                     "{removed} removed, {skipped} skipped")
+DB_DUPLICATES_RENAMED = "Deactivated {} tasks with duplicate names and renamed them to \"<name> #<id>\""
+DB_COLUMN_ADDED = "Upgraded tasks table: added column {}"
+DB_MIGRATED = "Database schema upgraded to version {}"
+DB_FLUSHED = "Flushed {} task run updates"
+DB_FLUSH_ERROR = "Failed to flush {} task run updates: {}"
 
 # Configuration messages
 CONFIG_LOADING = "Loading configuration from {}"
 CONFIG_NOT_FOUND = "Configuration file not found: {}, proceeding without tasks"
+CONFIG_TASK_FILE = "Reading tasks from {}"
+CONFIG_TASK_LINE_ERROR = "Skipping invalid task in {} line {}: {}"
+CONFIG_RELOADED = "Configuration changed: {} tasks added or updated, {} removed"
+CONFIG_RELOAD_ERROR = "Ignoring unreadable configuration {}: {}"
+CONFIG_APPLY_ERROR = "Failed to apply configuration changes: {}"
 
 # File path messages
 PATHS_LOG_FILE = "Logs are being written to: {}"
 PATHS_DATABASE = "Database location: {}"
 
 # Runtime messages
-RUNTIME_LOOP_STATUS = f"[{{}}] {APP_NAME} running. #{{}}"
\ No newline at end of file
+RUNTIME_LOOP_STATUS = f"[{{}}] {APP_NAME} running. #{{}}"
+
+# Scheduler messages
+SCHEDULER_LOADED = "Scheduled {} active tasks"
+SCHEDULER_BAD_CONDITION = "Task {} will not run: {}"
+CACHE_RELOADED = "Task cache reloaded: {rows_reloaded} rows read so far, {tasks} active tasks (hits {hits}, misses {misses})"
+CACHE_STATS = "Task cache stats: {tasks} active tasks, hits {hits}, misses {misses}, rows reloaded {rows_reloaded}"
+SCHEDULER_MISSED_RUN = "Skipping missed run of task {} ({:.0f}s late)"
+
+# Dispatch messages
+DISPATCH_COALESCED_RUN = "Running missed task {} once ({:.0f}s late)"
+DISPATCH_CATCH_UP = "Catching up task {}: {} runs ({:.0f}s late)"
+DISPATCH_SHED = "Dispatch queue full: shed {} runs ({} waiting)"
+DISPATCH_MERGED = "Task {} is still waiting ({} runs queued): merged its next run into it"
+
+# File watch messages
+FILE_WATCH_CHANGED = "Watched path changed: {} ({} tasks)"
+
+TASK_COMPLETED = "Task {} finished ({}) in {:.3f}s"
+
+# Executor messages
+EXECUTOR_CONCURRENCY_LIMIT = "Skipping task {}: action '{}' already at its limit of {} concurrent runs"
+EXECUTOR_SUBMIT_ERROR = "Failed to submit task {}: {}"
+EXECUTOR_TASK_ERROR = "Task {} raised an error: {}"
+EXECUTOR_CALLBACK_ERROR = "Error recording completion of task {}: {}"
+EXECUTOR_TIMEOUT = "Task {} timed out after {:.1f}s"
+EXECUTOR_SHUTDOWN_PENDING = "{} task runs still running at shutdown"
+
+# Profiling messages
+PROFILE_STARTED = "Profiling the service thread ({}), writing to {}"
+PROFILE_WRITTEN = "Profile written to {} ({})"
+PROFILE_MEMORY_GROWTH = "Memory growth: {}"
+PROFILE_SLOW_TICK = "Slow tick: {:.1f} ms, details in {}"
+PROFILE_SLOW_TICK_HEADER = "Slow tick: {:.1f} ms (threshold {} ms)"
+PROFILE_SLOW_TICK_BREAKDOWN = "Tasks evaluated {}, fired {}, database time {:.1f} ms"
+PROFILE_SLOW_TICK_SAMPLES = "{} stack samples past the threshold, every {:.0f} ms"
+PROFILE_WORKERS_UNSUPPORTED = "Profiling covers the single scheduler thread; it is off in worker mode"
+
+# Result cache messages
+RESULT_CACHE_STATS = ("Result cache: {hits} hits, {coalesced} coalesced, {misses} misses ({hit_rate:.0%} served "
+                      "without a new run), {evictions} evicted, {entries} entries")
+
+# Backup messages
+BACKUP_PROGRESS = "Backing up {}: {:.0f}% ({} of {} pages)"
+BACKUP_DONE = "Backed up {} to {}: {:.1f} MiB stored as {:.1f} MiB in {:.1f}s"
+BACKUP_ROTATED = "Deleted {} old backups from {}"
+
+# Action registry messages
+ACTION_IMPORT_ERROR = "Could not load action '{}' from module {}: {}"
+ACTION_NOT_REGISTERED = "Module {} does not register action '{}'"
+ACTION_SHUTDOWN_ERROR = "Error shutting down action module ({}): {}"
+
+# Worker messages
+WORKERS_STARTING = "Starting {} worker processes on {}"
+WORKER_STARTED = "Worker {} started"
+WORKER_STOPPED = "Worker {} stopped"
+WORKER_EXITED = "Worker process {} exited unexpectedly (exit code {})"
+WORKER_STOP_TIMEOUT = "Worker process {} did not stop in time; killing it"
+WORKER_DB_ERROR = "Worker {} database error: {}"
+WORKER_FILE_CHANGED = "Task {} will not run: worker mode does not watch files for file_changed tasks"
+
+# Daemon messages
+DAEMON_SIGNAL_STOP = "{} received; draining running tasks before stopping"
+DAEMON_SIGNAL_RELOAD = "SIGHUP received; reloading the config"
+DAEMON_STARTUP_PROFILE = "Startup took {:.1f} ms: {}"
+
+# Health check messages
+HEALTH_NO_TARGET = "Task {} has no target URL to check"
+HEALTH_OK = "Health check for task {} passed: {} -> {} in {:.3f}s"
+HEALTH_FAILED = "Health check for task {} failed: {} -> {}"
+
+# Logging
+LOG_FILE_FALLBACK = "Cannot write log file {}: {}. Logging to {} instead."
+
+# Metrics
+METRICS_SERVING = "Serving metrics at http://{}:{}/metrics"
+METRICS_SERVER_ERROR = "Could not start metrics endpoint on {}:{}: {}"
+STATS_HEADER = "Service stats"
+STATS_UPTIME = "Uptime:          {:.0f}s"
+STATS_TICKS = "Ticks:           {} (mean {:.2f} ms, p50 {:.2f} ms, p95 {:.2f} ms, p99 {:.2f} ms)"
+STATS_DB_TIME = "DB time/tick:    {:.2f} ms"
+STATS_TASKS = "Tasks:           {} evaluated, {} fired, {} missed, {} shed, {} merged"
+STATS_LAST_TICK = "Last tick:       {:.2f} ms, {} evaluated, {} fired, {:.2f} ms DB"
+STATS_GAUGE = "{:<16} {}"
+STATS_ACTIONS_HEADER = "Actions:"
+STATS_ACTION = "  {:<20} {} runs, {} failed, mean {:.1f} ms, p95 {:.1f} ms"
+STATS_HISTORY_HEADER = "Last 24 hours:"
+STATS_HISTORY_TASK = "  {:<30} {} runs, {} ok, {} missed, mean {:.1f} ms, p95 {:.1f} ms"
+
+# Execution history
+HISTORY_FLUSH_ERROR = "Failed to write {} task run records: {}"
+HISTORY_COMPACT_ERROR = "Failed to compact task run history: {}"
+HISTORY_COMPACTED = "Compacted {} task runs into {} hourly rollups"
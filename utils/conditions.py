@@ -0,0 +1,315 @@
+"""Compiled task conditions for AtlasPi
+
+A task's condition_type/condition_value pair is parsed once into a
+condition object that answers "when does this next fire after T?" without
+any string work. Supported types:
+
+- time:     minutes since midnight, e.g. 480 for 08:00
+- daily:    a wall-clock time, "HH:MM" or "HH:MM:SS"
+- interval: a period in seconds or with a unit ("90", "30s", "5m", "2h", "1d"),
+            aligned to multiples of the period since the epoch
+- cron:     a five-field cron expression ("*/5 9-17 * * mon-fri") or a
+            macro such as @hourly / @daily / @weekly / @monthly / @yearly
+- file_changed: a file or directory path; fires when it changes, as seen
+            by the shared watchers in utils/filewatch.py. Only the
+            single-process service watches files: in worker mode these
+            tasks never run, and each worker warns once per task.
+"""
+
+import os
+import functools
+from datetime import datetime, timedelta
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+INTERVAL_UNITS = {"s": 1, "m": 60, "h": 60 * 60, "d": SECONDS_PER_DAY}
+
+CRON_MACROS = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+
+MONTH_NAMES = {name: number for number, name in enumerate(
+    ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"), 1)}
+DAY_NAMES = {name: number for number, name in enumerate(
+    ("sun", "mon", "tue", "wed", "thu", "fri", "sat"))}
+
+# Give up on cron expressions that can never match (e.g. "0 0 30 2 *")
+CRON_MAX_DAY_STEPS = 366 * 8
+
+
+class Condition:
+    """Base class for compiled conditions"""
+
+    __slots__ = ()
+    condition_type = None
+
+    def next_fire_time(self, after):
+        """Return the first fire time (epoch seconds) strictly after `after`, or None"""
+        raise NotImplementedError
+
+    def matches(self, current_time):
+        """True if a fire time falls within the minute of `current_time`"""
+        minute_start = current_time.replace(second=0, microsecond=0).timestamp()
+        fire_at = self.next_fire_time(minute_start - 0.000001)
+        return fire_at is not None and fire_at < minute_start + 60
+
+
+class TimeOfDayCondition(Condition):
+    """Fires once a day at a fixed wall-clock offset from midnight
+
+    Serves both "time" (minutes) and "daily" ("HH:MM[:SS]") conditions.
+    """
+
+    __slots__ = ("seconds", "condition_type")
+
+    def __init__(self, seconds, condition_type="daily"):
+        self.seconds = seconds % SECONDS_PER_DAY
+        self.condition_type = condition_type
+
+    def next_fire_time(self, after):
+        after_dt = datetime.fromtimestamp(after)
+        midnight = after_dt.replace(hour=0, minute=0, second=0, microsecond=0)
+        candidate = midnight + timedelta(seconds=self.seconds)
+        if candidate.timestamp() <= after:
+            candidate = midnight + timedelta(days=1, seconds=self.seconds)
+        return candidate.timestamp()
+
+    def __repr__(self):
+        return f"TimeOfDayCondition({self.seconds}, {self.condition_type!r})"
+
+
+class IntervalCondition(Condition):
+    """Fires every `seconds`, aligned to multiples of the period since the epoch"""
+
+    __slots__ = ("seconds",)
+    condition_type = "interval"
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def next_fire_time(self, after):
+        return (after // self.seconds + 1) * self.seconds
+
+    def __repr__(self):
+        return f"IntervalCondition({self.seconds})"
+
+
+class CronCondition(Condition):
+    """Five-field cron expression compiled to per-field bitsets"""
+
+    __slots__ = ("minutes", "hours", "days", "months", "weekdays", "day_or")
+    condition_type = "cron"
+
+    def __init__(self, minutes, hours, days, months, weekdays, day_or):
+        self.minutes = minutes
+        self.hours = hours
+        self.days = days
+        self.months = months
+        self.weekdays = weekdays
+        # Classic cron: when both day fields are restricted, either may match
+        self.day_or = day_or
+
+    def day_matches(self, dt):
+        day_ok = self.days >> dt.day & 1
+        weekday_ok = self.weekdays >> ((dt.weekday() + 1) % 7) & 1
+        if self.day_or:
+            return bool(day_ok or weekday_ok)
+        return bool(day_ok and weekday_ok)
+
+    def next_fire_time(self, after):
+        dt = datetime.fromtimestamp(after).replace(second=0, microsecond=0) + timedelta(minutes=1)
+
+        for _ in range(CRON_MAX_DAY_STEPS):
+            month = next_bit(self.months, dt.month)
+            if month is None:
+                dt = datetime(dt.year + 1, lowest_bit(self.months), 1)
+                continue
+            if month != dt.month:
+                dt = datetime(dt.year, month, 1)
+
+            if not self.day_matches(dt):
+                dt = dt.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+
+            hour = next_bit(self.hours, dt.hour)
+            if hour is None:
+                dt = dt.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if hour != dt.hour:
+                dt = dt.replace(hour=hour, minute=0)
+
+            minute = next_bit(self.minutes, dt.minute)
+            if minute is None:
+                dt = dt.replace(minute=0) + timedelta(hours=1)
+                continue
+
+            fire_at = dt.replace(minute=minute).timestamp()
+            if fire_at > after:
+                return fire_at
+            # Wall-clock time skipped or repeated by a DST change
+            dt = dt.replace(minute=minute) + timedelta(minutes=1)
+        return None
+
+    def matches(self, current_time):
+        return bool(
+            self.minutes >> current_time.minute & 1
+            and self.hours >> current_time.hour & 1
+            and self.months >> current_time.month & 1
+            and self.day_matches(current_time)
+        )
+
+    def __repr__(self):
+        return (f"CronCondition(minutes={self.minutes:#x}, hours={self.hours:#x}, days={self.days:#x}, "
+                f"months={self.months:#x}, weekdays={self.weekdays:#x})")
+
+
+class FileChangedCondition(Condition):
+    """Fires when a file, or anything under a directory, changes
+
+    It has no fire times of its own: the service watches `path` and
+    schedules the task when a change is seen.
+    """
+
+    __slots__ = ("path",)
+    condition_type = "file_changed"
+
+    def __init__(self, path):
+        self.path = path
+
+    def next_fire_time(self, after):
+        return None
+
+    def matches(self, current_time):
+        return False
+
+    def __repr__(self):
+        return f"FileChangedCondition({self.path!r})"
+
+
+def next_bit(mask, start):
+    """Lowest set bit position >= start, or None"""
+    shifted = mask >> start
+    if not shifted:
+        return None
+    return start + (shifted & -shifted).bit_length() - 1
+
+
+def lowest_bit(mask):
+    """Lowest set bit position of a non-zero mask"""
+    return (mask & -mask).bit_length() - 1
+
+
+def parse_cron_field(field, low, high, names=None):
+    """Parse one cron field into a bitset of allowed values"""
+    mask = 0
+    for item in field.split(","):
+        value_range, slash, step = item.partition("/")
+        step = int(step) if step else 1
+        if step < 1:
+            raise ValueError(f"invalid cron step: {item}")
+
+        if value_range == "*":
+            start, end = low, high
+        else:
+            start_text, dash, end_text = value_range.partition("-")
+            start = parse_cron_value(start_text, names)
+            # "a/n" means "from a to the end of the range every n"
+            end = parse_cron_value(end_text, names) if dash else (high if slash else start)
+
+        if not (low <= start <= high and low <= end <= high and start <= end):
+            raise ValueError(f"cron value out of range {low}-{high}: {item}")
+        for value in range(start, end + 1, step):
+            mask |= 1 << value
+    return mask
+
+
+def parse_cron_value(text, names):
+    text = text.strip().lower()
+    if names and text in names:
+        return names[text]
+    return int(text)
+
+
+def compile_cron(expression):
+    """Compile a cron expression or macro into a CronCondition"""
+    expression = CRON_MACROS.get(expression.strip().lower(), expression)
+    fields = expression.split()
+    if len(fields) != 5:
+        raise ValueError(f"cron expression needs 5 fields: {expression!r}")
+    minute, hour, day, month, weekday = fields
+
+    weekdays = parse_cron_field(weekday, 0, 7, DAY_NAMES)
+    if weekdays >> 7 & 1:
+        weekdays = (weekdays | 1) & 0x7F  # 7 is another name for Sunday
+
+    return CronCondition(
+        parse_cron_field(minute, 0, 59),
+        parse_cron_field(hour, 0, 23),
+        parse_cron_field(day, 1, 31),
+        parse_cron_field(month, 1, 12, MONTH_NAMES),
+        weekdays,
+        day_or=not day.startswith("*") and not weekday.startswith("*"),
+    )
+
+
+def parse_interval(value):
+    """Parse an interval such as 90, "30s", "5m" or "2h" into seconds"""
+    text = str(value).strip().lower()
+    multiplier = 1
+    if text and text[-1] in INTERVAL_UNITS:
+        multiplier = INTERVAL_UNITS[text[-1]]
+        text = text[:-1]
+    seconds = float(text) * multiplier
+    if seconds < 1:
+        raise ValueError(f"interval must be at least 1 second: {value!r}")
+    return int(seconds) if seconds.is_integer() else seconds
+
+
+def parse_clock_time(value):
+    """Parse "HH:MM" or "HH:MM:SS" into seconds since midnight"""
+    parts = [int(part) for part in str(value).strip().split(":")]
+    if len(parts) == 2:
+        parts.append(0)
+    if len(parts) != 3:
+        raise ValueError(f"invalid time of day: {value!r}")
+    hours, minutes, seconds = parts
+    if not (0 <= hours < 24 and 0 <= minutes < 60 and 0 <= seconds < 60):
+        raise ValueError(f"invalid time of day: {value!r}")
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def normalize_path(value):
+    """Absolute, normalized form of a watched path, so equal paths are shared"""
+    text = str(value).strip()
+    if not text:
+        raise ValueError("file_changed needs a path")
+    return os.path.normpath(os.path.abspath(os.path.expanduser(text)))
+
+
+@functools.lru_cache(maxsize=4096)
+def _compile(condition_type, condition_value):
+    if condition_type == "time":
+        return TimeOfDayCondition(int(condition_value) * 60, "time")
+    if condition_type == "daily":
+        return TimeOfDayCondition(parse_clock_time(condition_value), "daily")
+    if condition_type == "interval":
+        return IntervalCondition(parse_interval(condition_value))
+    if condition_type == "cron":
+        return compile_cron(condition_value)
+    if condition_type == "file_changed":
+        return FileChangedCondition(normalize_path(condition_value))
+    raise ValueError(f"unknown condition type: {condition_type!r}")
+
+
+def compile_condition(condition_type, condition_value):
+    """Compile a condition; identical conditions share one (immutable) object
+
+    Raises ValueError for unknown types or malformed values.
+    """
+    return _compile(condition_type, str(condition_value))
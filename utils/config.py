@@ -2,9 +2,14 @@
 
 import os
 import json
+import time
 import logging
 from utils.common import strings
 
+# How often the running service checks the config for edits. Each check is
+# a stat() per file; the JSON is only re-read when mtime or size changed.
+CONFIG_POLL_SECONDS = 5.0
+
 
 def load_config(config_path):
     """Load configuration from JSON file"""
@@ -24,4 +29,158 @@ def get_config_paths():
         'db_path': os.path.join(current_dir, "tasks.db"),
         'config_path': os.path.join(current_dir, "config", "default_config.json"),
         'log_path': os.path.join(current_dir, "atlaspi.log")
-    }
\ No newline at end of file
+    }
+
+
+def get_service_settings(config, name, defaults):
+    """Settings of "services" -> `name` in the app config, over `defaults`
+
+    Each service keeps its defaults next to its code; they fill in any key
+    the config leaves out, or the whole section when it is missing.
+    """
+    settings = dict(defaults)
+    settings.update((config or {}).get("services", {}).get(name, {}))
+    return settings
+
+
+def iter_task_file(path):
+    """Stream task dicts from a JSON-lines file, one task per line
+
+    Blank lines and lines starting with "#" are skipped; malformed lines
+    are logged and skipped so one bad line never aborts an import.
+    """
+    with open(path, "r") as file:
+        for line_number, line in enumerate(file, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                logging.error(strings.CONFIG_TASK_LINE_ERROR.format(path, line_number, e))
+
+
+def iter_config_tasks(config):
+    """Yield the config's inline tasks followed by those in its task files"""
+    for task in config.get("tasks") or ():
+        yield task
+    for path in config.get("task_files") or ():
+        if not os.path.isabs(path):
+            path = os.path.join(os.getcwd(), path)
+        logging.info(strings.CONFIG_TASK_FILE.format(path))
+        yield from iter_task_file(path)
+
+
+def task_key(task):
+    """Comparable form of a task definition (condition values as strings)"""
+    return (
+        task.get("action"),
+        task.get("condition_type"),
+        str(task.get("condition_value")),
+        task.get("target"),
+        bool(task.get("is_active", True)),
+        task.get("priority", 0),
+        task.get("misfire_policy"),
+    )
+
+
+def index_tasks(config):
+    """Map task name -> task_key for every task the config defines"""
+    index = {}
+    for task in iter_config_tasks(config):
+        if isinstance(task, dict) and "name" in task:
+            index[str(task["name"])] = task_key(task)
+    return index
+
+
+def diff_tasks(old_index, new_config):
+    """Compare a config against a previous index_tasks() result
+
+    Returns (new_index, upserts, removed): task dicts that are new or
+    changed, and names that are no longer defined.
+    """
+    new_index = {}
+    upserts = []
+    for task in iter_config_tasks(new_config):
+        if not isinstance(task, dict) or "name" not in task:
+            upserts.append(task)  # reported by the import
+            continue
+        name = str(task["name"])
+        key = task_key(task)
+        new_index[name] = key
+        if old_index.get(name) != key:
+            upserts.append(task)
+    removed = [name for name in old_index if name not in new_index]
+    return new_index, upserts, removed
+
+
+class ConfigWatcher:
+    """Polls the config (and its task files) for edits
+
+    `poll()` stats the files at most every `interval` seconds and, when a
+    signature (mtime, size) changed, re-reads the config and returns the
+    task changes as (upserts, removed) against the last seen version.
+    """
+
+    def __init__(self, config_path, config=None, interval=CONFIG_POLL_SECONDS):
+        self.config_path = config_path
+        self.config = config or {}
+        self.interval = interval
+        self.tasks = index_tasks(self.config) if "tasks" in self.config else None
+        # Unknown until the first poll, so edits made before startup are seen
+        self._signature = None
+        self._next_poll = 0.0
+
+    def _file_signature(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _signature_of(self, config):
+        paths = [self.config_path] + list(config.get("task_files") or ())
+        return tuple(self._file_signature(path) for path in paths)
+
+    def seconds_until_poll(self, now=None):
+        """Seconds until the next poll is due"""
+        if now is None:
+            now = time.monotonic()
+        return max(self._next_poll - now, 0)
+
+    def request_reload(self):
+        """Re-read the config at the next poll, changed or not"""
+        self._signature = None
+        self._next_poll = 0.0
+
+    def poll(self, now=None):
+        """Return (upserts, removed) if the tasks changed since last time, else None"""
+        if now is None:
+            now = time.monotonic()
+        if now < self._next_poll:
+            return None
+        self._next_poll = now + self.interval
+
+        signature = self._signature_of(self.config)
+        if signature == self._signature:
+            return None
+        self._signature = signature
+
+        try:
+            with open(self.config_path, "r") as file:
+                config = json.load(file)
+            self._signature = self._signature_of(config)
+            if "tasks" not in config:
+                self.config = config
+                return None
+            new_index, upserts, removed = diff_tasks(self.tasks or {}, config)
+        except (OSError, ValueError) as e:
+            # Keep running on the last good config; a later save is picked up
+            logging.error(strings.CONFIG_RELOAD_ERROR.format(self.config_path, e))
+            return None
+        self.config = config
+        self.tasks = new_index
+        if not upserts and not removed:
+            return None
+        logging.info(strings.CONFIG_RELOADED.format(len(upserts), len(removed)))
+        return upserts, removed
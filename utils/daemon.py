@@ -0,0 +1,150 @@
+"""Headless service mode for AtlasPi
+
+`setup.py --daemon` runs the service without the menu, for systemd and
+other supervisors. Only the modules the scheduler needs are imported.
+SIGTERM (or SIGINT) stops it: running actions get `drain_seconds` to
+finish and buffered database writes are flushed. SIGHUP re-reads the
+config and task files straight away.
+"""
+
+import time
+import signal
+import logging
+import threading
+from utils.common import strings
+from utils.config import load_config, ConfigWatcher
+from utils.logging_config import setup_logging
+from utils.database import initialize_database, close_connections
+from utils.app import run_application_loop
+
+
+class ServiceFlag:
+    """stop_flag for the service that a config reload can also wake
+
+    Works like threading.Event for stopping. `wake()` ends the current
+    wait early without stopping, so the loop polls its config watcher.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._stop = False
+        self._woken = False
+
+    def is_set(self):
+        return self._stop
+
+    def set(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+
+    def clear(self):
+        with self._cond:
+            self._stop = False
+
+    def wake(self):
+        with self._cond:
+            self._woken = True
+            self._cond.notify_all()
+
+    def wait(self, timeout=None):
+        with self._cond:
+            if not (self._stop or self._woken):
+                self._cond.wait(timeout)
+            self._woken = False
+            return self._stop
+
+
+class StartupTimer:
+    """Times the startup phases, from `started` (a perf_counter value)"""
+
+    def __init__(self, started=None):
+        self.started = started if started is not None else time.perf_counter()
+        self._last = self.started
+        self.phases = []
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, (now - self._last) * 1000))
+        self._last = now
+
+    def total_ms(self):
+        return (self._last - self.started) * 1000
+
+    def report(self):
+        """Mark the first tick and log how long each phase took"""
+        self.mark("first tick")
+        phases = ", ".join(f"{phase} {ms:.1f} ms" for phase, ms in self.phases)
+        logging.info(strings.DAEMON_STARTUP_PROFILE.format(self.total_ms(), phases))
+
+
+def install_signal_handlers(stop_flag, watcher):
+    """Stop on SIGTERM/SIGINT and reload on SIGHUP; returns the old handlers"""
+
+    def stop(signum, frame):
+        logging.info(strings.DAEMON_SIGNAL_STOP.format(signal.Signals(signum).name))
+        stop_flag.set()
+
+    def reload(signum, frame):
+        logging.info(strings.DAEMON_SIGNAL_RELOAD)
+        watcher.request_reload()
+        stop_flag.wake()
+
+    handlers = {signal.SIGTERM: stop, signal.SIGINT: stop}
+    if hasattr(signal, "SIGHUP"):  # not on Windows
+        handlers[signal.SIGHUP] = reload
+    return {signum: signal.signal(signum, handler) for signum, handler in handlers.items()}
+
+
+def run_daemon(paths, debug_mode=False, workers=None, profile_startup=False, started=None, profile=None):
+    """Run the service without the menu until SIGTERM or SIGINT
+
+    Must be called from the main thread, which waits for signals while
+    the service runs on its own thread. `workers` overrides the config's
+    worker process count. With `profile_startup`, the time from `started`
+    to the first scheduler tick is logged phase by phase. `profile`
+    selects a profiling mode for the scheduler thread.
+    """
+    timer = StartupTimer(started) if profile_startup else None
+    if timer:
+        timer.mark("imports")
+
+    config = load_config(paths['config_path'])
+    if workers:
+        config.setdefault('services', {}).setdefault('workers', {})['processes'] = workers
+    setup_logging(paths['log_path'], debug_mode=debug_mode, config=config)
+    if timer:
+        timer.mark("config")
+    initialize_database(paths['db_path'], config)
+    if timer:
+        timer.mark("database")
+
+    stop_flag = ServiceFlag()
+    watcher = ConfigWatcher(paths['config_path'], config)
+    run_service = run_application_loop
+    options = {"watcher": watcher, "on_ready": timer.report if timer else None, "profile": profile}
+    if config.get('services', {}).get('workers', {}).get('processes'):
+        # Only worker mode needs multiprocessing
+        from utils.workers import run_worker_pool
+        run_service = run_worker_pool
+        if options.pop("profile"):
+            logging.warning(strings.PROFILE_WORKERS_UNSUPPORTED)
+
+    logging.info(strings.APP_STARTING)
+    previous = install_signal_handlers(stop_flag, watcher)
+    service = threading.Thread(
+        target=run_service, name="atlas-service",
+        args=(paths['db_path'], paths['log_path'], debug_mode, stop_flag, config),
+        kwargs=options,
+    )
+    try:
+        service.start()
+        # Signal handlers run on this thread while it waits
+        service.join()
+    finally:
+        stop_flag.set()
+        if service.is_alive():
+            service.join()
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+        close_connections()
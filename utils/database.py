@@ -3,14 +3,145 @@
 import os
 import sqlite3
 import logging
+import time
+import threading
+from datetime import datetime
 from utils.common import strings
+from utils.config import iter_config_tasks
+from utils.scheduler import MISFIRE_POLICIES
+from utils.tasktable import TaskTable
+
+# Connection tuning. WAL lets the menu read while the scheduler writes, but
+# needs every connection on one host (its index is in shared memory), so
+# the database must not be shared over a network filesystem. NORMAL sync
+# is durable across application crashes (only an OS crash can lose the
+# last transactions). A negative cache_size is measured in KiB.
+BUSY_TIMEOUT_SECONDS = 5.0
+CACHED_STATEMENTS = 256
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-8000",
+    "PRAGMA temp_store=MEMORY",
+)
+
+# Column order of task rows returned by get_tasks and friends
+TASK_COLUMNS = ("id, name, action, condition_type, condition_value, is_active, last_run, target, next_run_at, "
+                "priority, misfire_policy")
+
+# Task imports are upserted in batches of this many rows
+IMPORT_BATCH_SIZE = 1000
+
+# What import_tasks does with tasks missing from the imported set
+REMOVE_MISSING_DEACTIVATE = "deactivate"
+REMOVE_MISSING_DELETE = "delete"
+
+# Where a task was defined: the config (synced on every start, so tasks
+# dropped from it are removed) or a one-off `--import-tasks` file
+TASK_SOURCE_CONFIG = "config"
+TASK_SOURCE_IMPORT = "import"
+
+# UPDATE ... RETURNING (used to claim tasks) needs SQLite 3.35+; older
+# libraries claim with a select and update in one transaction instead
+SUPPORTS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# Tasks fetched per statement when claiming without RETURNING
+CLAIM_FETCH_CHUNK = 500
+
+# Upper bound on how long buffered last_run updates wait before a flush.
+# A crash loses at most this window of bookkeeping, never task schedules.
+LAST_RUN_FLUSH_SECONDS = 5.0
+LAST_RUN_MAX_PENDING = 1000
+
+# One long-lived connection per (thread, database). The registry lets any
+# thread close every connection, e.g. before the database file is removed.
+_local = threading.local()
+_registry_lock = threading.Lock()
+_registry = []
+_generation = 0
+
+
+def get_connection(db_path):
+    """Return the calling thread's persistent connection to db_path"""
+    connections = getattr(_local, "connections", None)
+    if connections is None or _local.generation != _generation:
+        # First use on this thread, or close_connections() ran since
+        connections = _local.connections = {}
+        _local.generation = _generation
+
+    conn = connections.get(db_path)
+    if conn is None:
+        conn = _open_connection(db_path)
+        connections[db_path] = conn
+        with _registry_lock:
+            _registry.append((db_path, conn))
+    return conn
+
+
+def _open_connection(db_path):
+    """Open and tune a new SQLite connection"""
+    # check_same_thread is off only so close_connections() can close it from
+    # another thread; each connection is otherwise used by its owner thread.
+    conn = sqlite3.connect(
+        db_path,
+        timeout=BUSY_TIMEOUT_SECONDS,
+        cached_statements=CACHED_STATEMENTS,
+        check_same_thread=False,
+    )
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def close_thread_connections():
+    """Close the calling thread's connections (call when a worker thread exits)"""
+    connections = getattr(_local, "connections", None)
+    if not connections:
+        return
+    with _registry_lock:
+        _registry[:] = [entry for entry in _registry if entry[1] not in connections.values()]
+    for conn in connections.values():
+        conn.close()
+    connections.clear()
+
+
+def close_connections():
+    """Close every pooled connection; threads reconnect lazily on next use"""
+    global _generation
+    with _registry_lock:
+        closing = list(_registry)
+        _registry[:] = []
+        _generation += 1
+    for _, conn in closing:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+
+def _reset_after_fork():
+    """Forget inherited connections; SQLite handles must not cross a fork"""
+    global _local, _registry_lock, _registry, _generation
+    _local = threading.local()
+    _registry_lock = threading.Lock()
+    _registry = []
+    _generation += 1
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def database_files(db_path):
+    """Return the database file plus its WAL/shared-memory side files"""
+    return [db_path, db_path + "-wal", db_path + "-shm"]
 
 
 def initialize_database(db_path, config):
-    """Initialize SQLite database and seed with tasks if needed"""
+    """Initialize SQLite database, upgrade its schema and sync configured tasks"""
     if not os.path.exists(db_path):
         logging.info(strings.DB_INITIALIZING.format(db_path))
-        conn = sqlite3.connect(db_path)
+        conn = get_connection(db_path)
         cursor = conn.cursor()
 
         # Create the tasks table
@@ -26,68 +157,656 @@ def initialize_database(db_path, config):
         )
         """)
         logging.info(strings.DB_TABLE_CREATED)
-
-        # Seed the database with tasks from config
-        seed_tasks(cursor, config)
-
         conn.commit()
-        conn.close()
+        migrate_schema(conn)
         logging.info(strings.DB_INITIALIZED)
     else:
         logging.info(strings.DB_EXISTS)
-        # Check if database has tasks, reseed if empty
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM tasks")
-        task_count = cursor.fetchone()[0]
-        
-        if task_count == 0:
-            logging.info("Database is empty, seeding with tasks...")
-            seed_tasks(cursor, config)
-            conn.commit()
-        
-        conn.close()
+        migrate_schema(get_connection(db_path))
 
+    # Config edits reach existing databases too, not just empty ones
+    seed_tasks(db_path, config)
 
-def seed_tasks(cursor, config):
-    """Seed database with tasks from configuration"""
-    if "tasks" in config and config["tasks"]:
-        tasks = config["tasks"]
-        logging.info(strings.DB_TASKS_FOUND.format(len(tasks)))
-        
-        # Iterate through tasks and insert them into the database
-        for task in tasks:
-            try:
-                logging.info(strings.DB_TASK_INSERTING.format(task['name']))
-                cursor.execute("""
-                INSERT INTO tasks (name, action, condition_type, condition_value)
-                VALUES (?, ?, ?, ?)
-                """, (task["name"], task["action"], task["condition_type"], task["condition_value"]))
-                logging.info(strings.DB_TASK_SUCCESS.format(task['name']))
-            except Exception as e:
-                logging.error(strings.DB_TASK_ERROR.format(task['name'], e))
-    else:
+
+def _add_column(conn, column, definition):
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(tasks)")}
+    if column not in columns:
+        conn.execute(f"ALTER TABLE tasks ADD COLUMN {column} {definition}")
+        logging.info(strings.DB_COLUMN_ADDED.format(column))
+
+
+def _migrate_add_target(conn):
+    _add_column(conn, "target", "TEXT DEFAULT NULL")
+
+
+def _migrate_add_next_run_at(conn):
+    # Epoch seconds of the next fire time; NULL means "not scheduled yet".
+    # The partial index keeps due-task lookups proportional to what is due.
+    _add_column(conn, "next_run_at", "REAL DEFAULT NULL")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_tasks_next_run_at ON tasks (next_run_at) WHERE is_active = 1"
+    )
+    # Any edit to when a task runs (including by hand) sends it back to the
+    # scheduler for a fresh next_run_at
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS tasks_reschedule_on_change
+    AFTER UPDATE OF condition_type, condition_value, is_active ON tasks
+    BEGIN
+        UPDATE tasks SET next_run_at = NULL WHERE id = NEW.id;
+    END
+    """)
+
+
+# Trigger body giving a task row a new revision
+REVISION_STAMP = """
+    UPDATE task_revision SET value = value + 1;
+    UPDATE tasks SET revision = (SELECT value FROM task_revision) WHERE id = NEW.id;
+"""
+
+
+def _migrate_add_revisions(conn):
+    # Every change to a task's definition stamps it with a new revision from
+    # a global counter, and deletions leave a tombstone, so caches can reload
+    # just the rows that changed. Scheduler bookkeeping (last_run,
+    # next_run_at) is deliberately not tracked.
+    _add_column(conn, "revision", "INTEGER NOT NULL DEFAULT 0")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_revision ON tasks (revision)")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS task_revision (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        value INTEGER NOT NULL
+    )
+    """)
+    conn.execute("INSERT OR IGNORE INTO task_revision (id, value) VALUES (0, 0)")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS task_deletions (
+        id INTEGER PRIMARY KEY,
+        revision INTEGER NOT NULL
+    )
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS tasks_revision_on_insert AFTER INSERT ON tasks
+    BEGIN {REVISION_STAMP} END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS tasks_revision_on_update
+    AFTER UPDATE OF name, action, condition_type, condition_value, is_active, target ON tasks
+    BEGIN {REVISION_STAMP} END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS tasks_revision_on_delete AFTER DELETE ON tasks
+    BEGIN
+        UPDATE task_revision SET value = value + 1;
+        INSERT OR REPLACE INTO task_deletions (id, revision)
+        VALUES (OLD.id, (SELECT value FROM task_revision));
+    END
+    """)
+
+
+def _migrate_unique_task_names(conn):
+    # Names identify tasks for upserts. Older databases could hold the same
+    # name twice; the oldest row of each keeps it, and the others are kept
+    # deactivated under "<name> #<id>" so nothing is lost.
+    renamed = conn.execute(
+        "UPDATE tasks SET name = name || ' #' || id, is_active = 0 "
+        "WHERE id NOT IN (SELECT MIN(id) FROM tasks GROUP BY name)"
+    ).rowcount
+    if renamed:
+        logging.warning(strings.DB_DUPLICATES_RENAMED.format(renamed))
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_tasks_name ON tasks (name)")
+
+
+def _migrate_add_history(conn):
+    # Execution history (see utils/history.py). Raw runs are small integer
+    # rows appended in id order; compaction folds them into per-hour and
+    # later per-day rollups, keyed for per-task range scans.
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS task_runs (
+        id INTEGER PRIMARY KEY,
+        task_id INTEGER NOT NULL,
+        ended INTEGER NOT NULL,
+        duration_ms INTEGER NOT NULL,
+        outcome INTEGER NOT NULL
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS task_run_rollups (
+        period INTEGER NOT NULL,
+        task_id INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        ok INTEGER NOT NULL,
+        failed INTEGER NOT NULL,
+        timed_out INTEGER NOT NULL,
+        missed INTEGER NOT NULL,
+        skipped INTEGER NOT NULL,
+        total_ms INTEGER NOT NULL,
+        max_ms INTEGER NOT NULL,
+        histogram BLOB NOT NULL,
+        PRIMARY KEY (period, task_id, bucket)
+    ) WITHOUT ROWID
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS history_state (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    ) WITHOUT ROWID
+    """)
+
+
+def _migrate_add_leases(conn):
+    # Worker processes lease the due tasks they run (see utils/workers.py).
+    # Lease updates touch neither the reschedule nor the revision triggers.
+    _add_column(conn, "lease_owner", "TEXT DEFAULT NULL")
+    _add_column(conn, "lease_expires", "REAL DEFAULT NULL")
+    # Only leased rows are indexed, so renewing and releasing stay cheap
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_tasks_lease_owner ON tasks (lease_owner) WHERE lease_owner IS NOT NULL"
+    )
+
+
+def _migrate_add_dispatch(conn):
+    # Dispatch order and misfire handling (see utils/dispatch.py). NULL
+    # misfire_policy uses the configured default. Both are part of the
+    # task definition, so edits stamp a new revision for the caches.
+    _add_column(conn, "priority", "INTEGER NOT NULL DEFAULT 0")
+    _add_column(conn, "misfire_policy", "TEXT DEFAULT NULL")
+    conn.execute("DROP TRIGGER IF EXISTS tasks_revision_on_update")
+    conn.execute(f"""
+    CREATE TRIGGER tasks_revision_on_update
+    AFTER UPDATE OF name, action, condition_type, condition_value, is_active, target, priority, misfire_policy
+    ON tasks
+    BEGIN {REVISION_STAMP} END
+    """)
+
+
+def _migrate_add_task_source(conn):
+    # Config syncs only remove tasks the config owns. Rows that predate
+    # this column cannot be told apart and count as config tasks.
+    _add_column(conn, "source", f"TEXT NOT NULL DEFAULT '{TASK_SOURCE_CONFIG}'")
+
+
+# Schema migrations in order. PRAGMA user_version records how many have
+# been applied, so existing databases are upgraded in place on startup.
+SCHEMA_MIGRATIONS = (
+    _migrate_add_target,
+    _migrate_add_next_run_at,
+    _migrate_add_revisions,
+    _migrate_unique_task_names,
+    _migrate_add_history,
+    _migrate_add_leases,
+    _migrate_add_dispatch,
+    _migrate_add_task_source,
+)
+
+
+def migrate_schema(conn):
+    """Apply any schema migrations this database has not seen yet"""
+    # BEGIN IMMEDIATE serialises concurrent upgrades of the same file
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, migration in enumerate(SCHEMA_MIGRATIONS[version:], version + 1):
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+            logging.info(strings.DB_MIGRATED.format(number))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def seed_tasks(db_path, config):
+    """Sync the tasks listed in the configuration into the database
+
+    Only runs when the config has a "tasks" key, so a missing or unreadable
+    config never deactivates anything. Tasks from any "task_files"
+    (JSON-lines) are streamed in after the inline ones.
+    """
+    if "tasks" not in config:
         logging.info(strings.DB_TASKS_NONE)
+        return None
+    return import_tasks(db_path, iter_config_tasks(config), remove_missing=REMOVE_MISSING_DEACTIVATE)
+
+
+def import_tasks(db_path, tasks, remove_missing=None, batch_size=IMPORT_BATCH_SIZE, source=TASK_SOURCE_CONFIG):
+    """Upsert task definitions by name in a single transaction
+
+    `tasks` may be any iterable of dicts (for example a streamed JSON-lines
+    file); it is consumed in batches so it never has to fit in memory.
+    Unchanged rows are left untouched, so caches and schedules stay valid.
+    Imported tasks are stamped with `source`, and tasks from the same
+    source that are absent from the input are deactivated or deleted
+    according to `remove_missing` (None keeps them). Returns a summary dict.
+    """
+    conn = get_connection(db_path)
+    summary = {"total": 0, "inserted": 0, "updated": 0, "unchanged": 0, "removed": 0, "skipped": 0}
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        before = conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+        if remove_missing:
+            # Seen names live in a temp table rather than a Python set
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS import_seen (name TEXT PRIMARY KEY)")
+            conn.execute("DELETE FROM temp.import_seen")
+
+        changed = 0
+        batch = []
+        for task in tasks:
+            row = _task_row(task)
+            if row is None:
+                summary["skipped"] += 1
+                continue
+            batch.append(row + (source,))
+            if len(batch) >= batch_size:
+                changed += _upsert_batch(conn, batch, remove_missing)
+                summary["total"] += len(batch)
+                batch = []
+        if batch:
+            changed += _upsert_batch(conn, batch, remove_missing)
+            summary["total"] += len(batch)
+
+        summary["inserted"] = conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0] - before
+        summary["updated"] = changed - summary["inserted"]
+        summary["unchanged"] = summary["total"] - changed
+
+        if remove_missing == REMOVE_MISSING_DELETE:
+            summary["removed"] = conn.execute(
+                "DELETE FROM tasks WHERE source = ? AND name NOT IN (SELECT name FROM temp.import_seen)",
+                (source,)
+            ).rowcount
+        elif remove_missing == REMOVE_MISSING_DEACTIVATE:
+            summary["removed"] = conn.execute(
+                "UPDATE tasks SET is_active = 0 "
+                "WHERE is_active = 1 AND source = ? AND name NOT IN (SELECT name FROM temp.import_seen)",
+                (source,)
+            ).rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    logging.info(strings.DB_TASKS_IMPORTED.format(**summary))
+    return summary
+
+
+def _task_row(task):
+    """Validate a task dict and turn it into upsert parameters"""
+    try:
+        misfire_policy = task.get("misfire_policy")
+        if misfire_policy is not None and misfire_policy not in MISFIRE_POLICIES:
+            raise ValueError(f"'misfire_policy' must be one of {', '.join(MISFIRE_POLICIES)}")
+        return (
+            str(task["name"]),
+            str(task["action"]),
+            str(task["condition_type"]),
+            str(task["condition_value"]),
+            task.get("target"),
+            1 if task.get("is_active", True) else 0,
+            int(task.get("priority", 0)),
+            misfire_policy,
+        )
+    except (KeyError, TypeError, AttributeError) as e:
+        name = task.get("name", "?") if isinstance(task, dict) else "?"
+        logging.error(strings.DB_TASK_ERROR.format(name, f"missing or invalid field {e}"))
+        return None
+    except ValueError as e:
+        logging.error(strings.DB_TASK_ERROR.format(task.get("name", "?"), e))
+        return None
+
+
+def _upsert_batch(conn, batch, remove_missing):
+    """Upsert one batch; returns how many rows were inserted or changed"""
+    # The WHERE clause skips identical rows so their revision stays put.
+    # The last source to define a task owns it.
+    cursor = conn.executemany("""
+        INSERT INTO tasks (name, action, condition_type, condition_value, target, is_active, priority, misfire_policy,
+                           source)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (name) DO UPDATE SET
+            action = excluded.action,
+            condition_type = excluded.condition_type,
+            condition_value = excluded.condition_value,
+            target = excluded.target,
+            is_active = excluded.is_active,
+            priority = excluded.priority,
+            misfire_policy = excluded.misfire_policy,
+            source = excluded.source
+        WHERE tasks.action IS NOT excluded.action
+            OR tasks.condition_type IS NOT excluded.condition_type
+            OR tasks.condition_value IS NOT excluded.condition_value
+            OR tasks.target IS NOT excluded.target
+            OR tasks.is_active IS NOT excluded.is_active
+            OR tasks.priority IS NOT excluded.priority
+            OR tasks.misfire_policy IS NOT excluded.misfire_policy
+            OR tasks.source IS NOT excluded.source
+    """, batch)
+    if remove_missing:
+        conn.executemany(
+            "INSERT OR IGNORE INTO temp.import_seen (name) VALUES (?)", ((row[0],) for row in batch)
+        )
+    return cursor.rowcount
+
+
+def deactivate_tasks(db_path, names):
+    """Deactivate the named tasks; returns how many were active"""
+    conn = get_connection(db_path)
+    with conn:
+        return conn.executemany(
+            "UPDATE tasks SET is_active = 0 WHERE name = ? AND is_active = 1", ((name,) for name in names)
+        ).rowcount
 
 
 def get_tasks(db_path):
     """Retrieve all active tasks from database"""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM tasks WHERE is_active = 1")
-    tasks = cursor.fetchall()
-    conn.close()
+    conn = get_connection(db_path)
+    return conn.execute(f"SELECT {TASK_COLUMNS} FROM tasks WHERE is_active = 1").fetchall()
+
+
+def get_due_tasks(db_path, until):
+    """Retrieve active tasks whose next_run_at is at or before `until`"""
+    conn = get_connection(db_path)
+    return conn.execute(
+        f"SELECT {TASK_COLUMNS} FROM tasks WHERE is_active = 1 AND next_run_at <= ? ORDER BY next_run_at",
+        (until,)
+    ).fetchall()
+
+
+def get_unscheduled_tasks(db_path):
+    """Retrieve active tasks that have no next_run_at yet (new or changed)"""
+    conn = get_connection(db_path)
+    return conn.execute(
+        f"SELECT {TASK_COLUMNS} FROM tasks WHERE is_active = 1 AND next_run_at IS NULL"
+    ).fetchall()
+
+
+def get_next_run_at(db_path):
+    """Return the earliest next_run_at of any active task, or None"""
+    conn = get_connection(db_path)
+    return conn.execute(
+        "SELECT MIN(next_run_at) FROM tasks WHERE is_active = 1 AND next_run_at IS NOT NULL"
+    ).fetchone()[0]
+
+
+def get_next_run_after(db_path, now):
+    """Return the earliest next_run_at still in the future, or None"""
+    conn = get_connection(db_path)
+    return conn.execute(
+        "SELECT MIN(next_run_at) FROM tasks WHERE is_active = 1 AND next_run_at > ?", (now,)
+    ).fetchone()[0]
+
+
+def claim_due_tasks(db_path, owner, now, lease_seconds, limit):
+    """Lease up to `limit` due tasks to `owner` and return their rows
+
+    A task can be claimed when it is active, due and not leased, or when
+    its lease has expired (its worker crashed or hung). Claims are made
+    in one write transaction, so two workers never hold the same task.
+    Higher priorities are claimed first.
+    """
+    conn = get_connection(db_path)
+    expires = now + lease_seconds
+    due = ("SELECT id FROM tasks WHERE is_active = 1 AND next_run_at <= ? "
+           "AND (lease_expires IS NULL OR lease_expires <= ?) ORDER BY priority DESC, next_run_at LIMIT ?")
+    if SUPPORTS_RETURNING:
+        with conn:
+            return conn.execute(
+                f"UPDATE tasks SET lease_owner = ?, lease_expires = ? WHERE id IN ({due}) RETURNING {TASK_COLUMNS}",
+                (owner, expires, now, now, limit)
+            ).fetchall()
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        task_ids = [row[0] for row in conn.execute(due, (now, now, limit))]
+        conn.executemany("UPDATE tasks SET lease_owner = ?, lease_expires = ? WHERE id = ?",
+                         ((owner, expires, task_id) for task_id in task_ids))
+        tasks = []
+        for start in range(0, len(task_ids), CLAIM_FETCH_CHUNK):
+            chunk = task_ids[start:start + CLAIM_FETCH_CHUNK]
+            tasks.extend(conn.execute(
+                f"SELECT {TASK_COLUMNS} FROM tasks WHERE id IN ({','.join('?' * len(chunk))})", chunk
+            ))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
     return tasks
 
 
+def finish_leased_tasks(db_path, owner, updates):
+    """Store (next_run_at, last_run, task_id) for runs `owner` finished and release their leases
+
+    A None last_run (missed or skipped runs) keeps the previous value.
+    Tasks whose lease has passed to another worker are left alone.
+    Returns the number of tasks updated.
+    """
+    conn = get_connection(db_path)
+    with conn:
+        return conn.executemany(
+            "UPDATE tasks SET next_run_at = ?, last_run = COALESCE(?, last_run), "
+            "lease_owner = NULL, lease_expires = NULL WHERE id = ? AND lease_owner = ?",
+            ((next_run_at, last_run, task_id, owner) for next_run_at, last_run, task_id in updates)
+        ).rowcount
+
+
+def renew_leases(db_path, owner, expires):
+    """Extend every lease `owner` holds to `expires`"""
+    conn = get_connection(db_path)
+    with conn:
+        return conn.execute("UPDATE tasks SET lease_expires = ? WHERE lease_owner = ?", (expires, owner)).rowcount
+
+
+def release_leases(db_path, owner):
+    """Give up `owner`'s leases so other workers can run those tasks now"""
+    conn = get_connection(db_path)
+    with conn:
+        return conn.execute(
+            "UPDATE tasks SET lease_owner = NULL, lease_expires = NULL WHERE lease_owner = ?", (owner,)
+        ).rowcount
+
+
+def update_tasks_next_run(db_path, updates):
+    """Write many (next_run_at, task_id) pairs in a single transaction"""
+    conn = get_connection(db_path)
+    with conn:
+        conn.executemany("UPDATE tasks SET next_run_at = ? WHERE id = ?", updates)
+
+
 def update_task_last_run(db_path, task_id):
     """Update the last_run timestamp for a task"""
-    from datetime import datetime
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute(
-        "UPDATE tasks SET last_run = ? WHERE id = ?", 
-        (datetime.now().isoformat(), task_id)
-    )
-    conn.commit()
-    conn.close()
\ No newline at end of file
+    conn = get_connection(db_path)
+    with conn:
+        conn.execute(
+            "UPDATE tasks SET last_run = ? WHERE id = ?", 
+            (datetime.now().isoformat(), task_id)
+        )
+
+
+def update_tasks_last_run(db_path, updates):
+    """Write many (last_run, task_id) pairs in a single transaction"""
+    conn = get_connection(db_path)
+    with conn:
+        conn.executemany("UPDATE tasks SET last_run = ? WHERE id = ?", updates)
+
+
+class LastRunBuffer:
+    """Collects task completions and flushes them as one batched write
+
+    Safe to call from worker threads. Repeated runs of the same task within
+    one window collapse into a single row update. With a `cache`, flushes
+    also update its rows, so they must run on the thread that owns it.
+    """
+
+    def __init__(self, db_path, flush_interval=LAST_RUN_FLUSH_SECONDS, max_pending=LAST_RUN_MAX_PENDING,
+                 cache=None):
+        self.db_path = db_path
+        self.cache = cache
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._oldest = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def record(self, task_id, when=None):
+        """Buffer a completion; the timestamp defaults to now"""
+        if when is None:
+            when = datetime.now()
+        with self._lock:
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            self._pending[task_id] = when.isoformat()
+
+    def seconds_until_flush(self):
+        """Seconds until the buffer must be flushed, or None when empty"""
+        oldest = self._oldest
+        if oldest is None:
+            return None
+        if len(self._pending) >= self.max_pending:
+            return 0.0
+        return max(0.0, oldest + self.flush_interval - time.monotonic())
+
+    def flush_if_due(self):
+        """Flush when the window has elapsed or the buffer is full"""
+        remaining = self.seconds_until_flush()
+        if remaining is not None and remaining <= 0:
+            return self.flush()
+        return 0
+
+    def flush(self):
+        """Write every buffered completion in one transaction"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._oldest = None
+        if not pending:
+            return 0
+        updates = [(when, task_id) for task_id, when in pending.items()]
+        try:
+            if self.cache is not None:
+                self.cache.update_tasks_last_run(updates)
+            else:
+                update_tasks_last_run(self.db_path, updates)
+        except sqlite3.Error as e:
+            # Put the batch back (newer completions win) and retry next window
+            with self._lock:
+                pending.update(self._pending)
+                self._pending = pending
+                if self._oldest is None:
+                    self._oldest = time.monotonic()
+            logging.error(strings.DB_FLUSH_ERROR.format(len(pending), e))
+            return 0
+        if logging.root.isEnabledFor(logging.DEBUG):
+            logging.debug(strings.DB_FLUSHED.format(len(pending)))
+        return len(pending)
+
+
+class TaskCache:
+    """In-memory copy of the active tasks, refreshed incrementally
+
+    `refresh()` first asks SQLite whether any other connection committed
+    since the last look (PRAGMA data_version, which reads no pages). Only
+    when something changed does it compare the task revision counter and
+    reload the rows stamped after the last one seen. The tasks are kept in
+    a columnar TaskTable, which serves due-task lookups from buckets over
+    next_run_at and builds row tuples only for the tasks returned, and
+    next_run_at and last_run writes go to both the database and the cache.
+
+    Owned by one thread (the service loop), like its connection.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._tasks = TaskTable()
+        self._data_version = None
+        self._revision = -1
+        self.hits = 0
+        self.misses = 0
+        self.rows_reloaded = 0
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def stats(self):
+        """Counters for logs and metrics"""
+        return {
+            "tasks": len(self._tasks),
+            "hits": self.hits,
+            "misses": self.misses,
+            "rows_reloaded": self.rows_reloaded,
+        }
+
+    def refresh(self, force=False):
+        """Bring the cache up to date; returns the number of rows reloaded"""
+        conn = get_connection(self.db_path)
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if not force and data_version == self._data_version:
+            self.hits += 1
+            return 0
+        self._data_version = data_version
+
+        revision = conn.execute("SELECT value FROM task_revision").fetchone()[0]
+        if revision == self._revision:
+            # Only bookkeeping columns changed elsewhere
+            self.hits += 1
+            return 0
+        self.misses += 1
+
+        if self._revision < 0:
+            # Streamed, so a full load never holds every row tuple at once
+            rows = conn.execute(f"SELECT {TASK_COLUMNS} FROM tasks WHERE is_active = 1")
+            self._tasks = TaskTable()
+        else:
+            rows = conn.execute(
+                f"SELECT {TASK_COLUMNS} FROM tasks WHERE revision > ?", (self._revision,)
+            ).fetchall()
+            for (task_id,) in conn.execute(
+                "SELECT id FROM task_deletions WHERE revision > ?", (self._revision,)
+            ):
+                self._tasks.discard(task_id)
+
+        count = 0
+        for row in rows:
+            count += 1
+            if row[5]:
+                self._tasks.store(row)
+            else:
+                self._tasks.discard(row[0])
+        self._revision = revision
+        self.rows_reloaded += count
+        return count
+
+    def get_task(self, task_id):
+        return self._tasks.get(task_id)
+
+    def get_tasks(self):
+        """All cached active tasks"""
+        return self._tasks.rows()
+
+    def get_unscheduled_tasks(self):
+        """Cached active tasks without a next_run_at"""
+        return self._tasks.unscheduled()
+
+    def get_due_tasks(self, until):
+        """Cached active tasks with next_run_at <= until, soonest first"""
+        return self._tasks.due(until)
+
+    def get_next_run_at(self):
+        """Earliest next_run_at among cached tasks, or None"""
+        return self._tasks.next_run_at()
+
+    def update_tasks_next_run(self, updates):
+        """Write (next_run_at, task_id) pairs to the database and the cache"""
+        update_tasks_next_run(self.db_path, updates)
+        for next_run_at, task_id in updates:
+            self._tasks.set_next_run(task_id, next_run_at)
+
+    def update_tasks_last_run(self, updates):
+        """Write (last_run, task_id) pairs to the database and the cache
+
+        last_run is bookkeeping and does not bump the task revision, so
+        `refresh()` would not reload it.
+        """
+        update_tasks_last_run(self.db_path, updates)
+        for when, task_id in updates:
+            self._tasks.set_last_run(task_id, datetime.fromisoformat(when).timestamp())
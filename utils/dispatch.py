@@ -0,0 +1,241 @@
+"""Dispatch stage between the scheduler and the executor for AtlasPi
+
+Due runs first pass their task's misfire policy, then wait in a bounded
+priority queue until their action has a rate-limit token and a free
+concurrency slot. Higher priorities go first; within a priority, runs go
+in the order they came due. When the queue is full the lowest-priority,
+newest runs are shed, so under overload the backlog stays bounded and
+important tasks keep running.
+"""
+
+import logging
+from collections import deque
+from utils.common import strings
+from utils.config import get_service_settings
+from utils.executor import get_executor_settings
+from utils.scheduler import MISFIRE_SKIP, MISFIRE_COALESCE, MISFIRE_CATCH_UP, MISFIRE_GRACE_SECONDS
+
+DEFAULT_DISPATCH_SETTINGS = {
+    "max_queue": 10000,            # runs waiting for a token or a slot
+    "misfire_policy": MISFIRE_SKIP,  # for tasks that do not set their own
+    "misfire_grace_seconds": MISFIRE_GRACE_SECONDS,  # later counts as a misfire
+    "catch_up_limit": 5,           # most runs per misfire with "catch_up"
+}
+
+# Slack for float error when tokens are refilled in small steps
+TOKEN_EPSILON = 1e-9
+
+# How long to wait before retrying runs held back only by concurrency
+# limits, when nothing wakes the loop as a run finishes
+CAPACITY_RETRY_SECONDS = 0.5
+
+
+def get_dispatch_settings(config):
+    """Return dispatch settings from the app config"""
+    return get_service_settings(config, "dispatch", DEFAULT_DISPATCH_SETTINGS)
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst` of them"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(rate, 1))
+        self.tokens = self.burst
+        self.updated = None
+
+    def _refill(self, now):
+        if self.updated is not None and now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, now):
+        """Use up a token if one is available"""
+        self._refill(now)
+        if self.tokens >= 1 - TOKEN_EPSILON:
+            self.tokens = max(self.tokens - 1, 0.0)
+            return True
+        return False
+
+    def seconds_until_token(self, now):
+        self._refill(now)
+        if self.tokens >= 1 - TOKEN_EPSILON:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else None
+
+
+class RateLimiter:
+    """Token buckets for the actions with a "rate" (runs per second) setting
+
+        "actions": {"check_api_health": {"rate": 20, "burst": 50}}
+    """
+
+    def __init__(self, config=None):
+        self._buckets = {}
+        for action, settings in get_executor_settings(config)[1].items():
+            if settings.get("rate") is not None:
+                self._buckets[action] = TokenBucket(settings["rate"], settings.get("burst"))
+
+    def __bool__(self):
+        return bool(self._buckets)
+
+    def take(self, action, now):
+        bucket = self._buckets.get(action)
+        return bucket is None or bucket.take(now)
+
+    def seconds_until_token(self, action, now):
+        bucket = self._buckets.get(action)
+        return 0.0 if bucket is None else bucket.seconds_until_token(now)
+
+
+def misfire_policy(task, settings):
+    """A task's misfire policy, falling back to the configured default"""
+    return task[10] or settings["misfire_policy"]
+
+
+class Dispatcher:
+    """Bounded priority queue of due runs, released by rate and capacity
+
+    `plan()` applies the misfire policy to a due occurrence, `enqueue()`
+    queues a run and `take()` releases the runs that may start now.
+    Owned by the service loop thread.
+    """
+
+    def __init__(self, config=None):
+        self.settings = get_dispatch_settings(config)
+        self.rates = RateLimiter(config)
+        self._levels = {}       # priority -> deque of (fire_at, task)
+        self._queued = {}       # task_id -> runs waiting
+        self._size = 0
+        self._retry = None      # seconds until held-back runs may go
+        self.shed = 0
+        self.merged = 0
+
+    def __len__(self):
+        return self._size
+
+    def plan(self, task, fire_at, now, occurrences=None):
+        """Fire times to run for an occurrence due at `fire_at`
+
+        On-time runs (within misfire_grace_seconds) always run. Late ones
+        are dropped ("skip"), run once ("coalesce") or replayed together
+        with the occurrences missed since, up to catch_up_limit runs
+        ("catch_up"). `occurrences(after, until, limit)` lists the fire
+        times in between. An empty list means the run was missed.
+        """
+        lateness = now - fire_at
+        if lateness <= self.settings["misfire_grace_seconds"]:
+            return [fire_at]
+        policy = misfire_policy(task, self.settings)
+        if policy == MISFIRE_COALESCE:
+            logging.info(strings.DISPATCH_COALESCED_RUN.format(task[1], lateness))
+            return [fire_at]
+        if policy == MISFIRE_CATCH_UP:
+            limit = self.settings["catch_up_limit"]
+            fire_times = [fire_at]
+            if occurrences is not None and limit > 1:
+                fire_times.extend(occurrences(fire_at, now, limit - 1))
+            logging.info(strings.DISPATCH_CATCH_UP.format(task[1], len(fire_times), lateness))
+            return fire_times
+        logging.info(strings.SCHEDULER_MISSED_RUN.format(task[1], lateness))
+        return []
+
+    def enqueue(self, task, fire_at):
+        """Queue a run; returns the (fire_at, task) shed to make room, if any
+
+        A task already waiting is not queued again unless its policy is
+        "catch_up" (then up to catch_up_limit runs); the waiting run stands
+        for the new one, which is merged into it and counted in `merged`,
+        not shed.
+        """
+        task_id, priority = task[0], task[9]
+        waiting = self._queued.get(task_id, 0)
+        if waiting and (misfire_policy(task, self.settings) != MISFIRE_CATCH_UP
+                        or waiting >= self.settings["catch_up_limit"]):
+            self.merged += 1
+            logging.debug(strings.DISPATCH_MERGED.format(task[1], waiting))
+            return None
+
+        shed = None
+        if self._size >= self.settings["max_queue"]:
+            lowest = min(self._levels)
+            if priority <= lowest:
+                return self._shed_entry((fire_at, task))
+            shed = self._remove_newest(lowest)
+
+        level = self._levels.get(priority)
+        if level is None:
+            level = self._levels[priority] = deque()
+        level.append((fire_at, task))
+        self._queued[task_id] = waiting + 1
+        self._size += 1
+        return shed
+
+    def take(self, now, has_capacity=None):
+        """Yield the queued (fire_at, task) runs that may start now
+
+        A run starts when its action has a rate-limit token and, if
+        `has_capacity(action)` is given, a free slot. Runs held back stay
+        queued in order; others of the same action are not re-checked.
+        """
+        self._retry = None
+        blocked = set()
+        for priority in sorted(self._levels, reverse=True):
+            level = self._levels[priority]
+            held = deque()
+            try:
+                while level:
+                    fire_at, task = level.popleft()
+                    action = task[2]
+                    if action in blocked:
+                        held.append((fire_at, task))
+                        continue
+                    if has_capacity is not None and not has_capacity(action):
+                        blocked.add(action)
+                        self._hold_for(CAPACITY_RETRY_SECONDS)
+                        held.append((fire_at, task))
+                        continue
+                    if not self.rates.take(action, now):
+                        blocked.add(action)
+                        self._hold_for(self.rates.seconds_until_token(action, now))
+                        held.append((fire_at, task))
+                        continue
+                    self._forget(task[0])
+                    yield fire_at, task
+            finally:
+                # Also when the caller stops early: nothing queued is lost
+                held.extend(level)
+                if held:
+                    self._levels[priority] = held
+                else:
+                    del self._levels[priority]
+
+    def seconds_until_ready(self):
+        """Seconds until held-back runs may start, or None if none are waiting"""
+        return self._retry if self._size else None
+
+    def _hold_for(self, seconds):
+        if seconds is not None and (self._retry is None or seconds < self._retry):
+            self._retry = seconds
+
+    def _remove_newest(self, priority):
+        level = self._levels[priority]
+        entry = level.pop()
+        if not level:
+            del self._levels[priority]
+        self._forget(entry[1][0])
+        return self._shed_entry(entry)
+
+    def _forget(self, task_id):
+        self._size -= 1
+        waiting = self._queued[task_id] - 1
+        if waiting:
+            self._queued[task_id] = waiting
+        else:
+            del self._queued[task_id]
+
+    def _shed_entry(self, entry):
+        self.shed += 1
+        return entry
@@ -0,0 +1,279 @@
+"""Concurrent task execution for AtlasPi"""
+
+import time
+import signal
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
+from utils.common import strings
+from utils.config import get_service_settings
+from utils.results import create_result_cache, normalize_target
+
+DEFAULT_EXECUTOR_SETTINGS = {
+    "thread_workers": 8,
+    "process_workers": 2,
+    "default_timeout": 60,
+    "default_max_concurrency": 4,
+    "drain_seconds": 3,
+}
+
+POOL_THREAD = "thread"
+POOL_PROCESS = "process"
+POOL_ASYNC = "async"
+
+
+def get_executor_settings(config):
+    """Return (executor settings, per-action settings) from the app config"""
+    actions = (config or {}).get("services", {}).get("actions", {})
+    return get_service_settings(config, "executor", DEFAULT_EXECUTOR_SETTINGS), actions
+
+
+def ignore_stop_signals():
+    """Leave stopping to the parent process
+
+    Signals sent to the whole process group (systemd's stop, Ctrl+C) would
+    otherwise run the handlers a forked child inherited from the daemon.
+    """
+    for name in ("SIGINT", "SIGTERM", "SIGHUP"):
+        if hasattr(signal, name):  # SIGHUP is not on Windows
+            signal.signal(getattr(signal, name), signal.SIG_IGN)
+
+
+def _init_process(config, db_path, log_queue, log_level):
+    # The parent drains the pool and shuts it down when it stops
+    ignore_stop_signals()
+    # Forked children inherit the parent's queue handler, but nothing
+    # drains that queue in the child: send records to the parent's relay
+    from utils.logging_config import setup_worker_logging
+    setup_worker_logging(log_queue, log_level)
+    # Pool processes resolve action modules from the same config; copies of
+    # the parent's loaded modules are left for the parent to shut down
+    from utils.actions import configure_actions
+    configure_actions(config, db_path, forked=True)
+
+
+class TaskRun:
+    """Bookkeeping for one submitted task execution"""
+
+    __slots__ = ("task_id", "name", "action", "fire_at", "started", "deadline", "timed_out", "holds_slot")
+
+    def __init__(self, task_id, name, action, fire_at, timeout, holds_slot=True):
+        self.task_id = task_id
+        self.name = name
+        self.action = action
+        self.fire_at = fire_at
+        self.started = time.monotonic()
+        self.deadline = self.started + timeout if timeout else None
+        self.timed_out = False
+        # Runs served by the result cache take no concurrency slot
+        self.holds_slot = holds_slot
+
+
+class TaskExecutor:
+    """Runs task actions on bounded thread/process pools without blocking
+
+    I/O-bound actions use the thread pool and CPU-heavy ones the process
+    pool (chosen per action via its "pool" setting). Actions with an
+    asyncio implementation can use the "async" pool, where
+    `run_action_async` returns a Future without tying up a thread (it
+    returns None for actions it cannot run). Each action also has a
+    max concurrency; a run that would exceed it is skipped rather than
+    queued, so the scheduler never waits on execution. `on_complete` is
+    called as on_complete(run, ok, duration) from a worker thread.
+    `describe_action(action)` returns the settings an action declares
+    itself; the config's per-action settings override them. Actions with
+    a "cache_ttl" share results through `results` (a ResultCache).
+    """
+
+    def __init__(self, run_action, config=None, on_complete=None, run_action_async=None, describe_action=None):
+        self.run_action = run_action
+        self.run_action_async = run_action_async
+        self.on_complete = on_complete
+        self.describe_action = describe_action
+        self.config = config
+        self.settings, self.action_settings = get_executor_settings(config)
+        self.results = create_result_cache(config)
+        self._resolved = {}
+        self._thread_pool = None
+        self._process_pool = None
+        self._log_relay = None
+        self._lock = threading.Lock()
+        self._running = {}
+        self._active = {}
+        self._closed = False
+
+    def _settings_for(self, action):
+        resolved = self._resolved.get(action)
+        if resolved is None:
+            action_settings = {}
+            if self.describe_action is not None:
+                action_settings.update(self.describe_action(action))
+            action_settings.update(self.action_settings.get(action, {}))
+            resolved = self._resolved[action] = (
+                action_settings.get("pool", POOL_THREAD),
+                action_settings.get("max_concurrency", self.settings["default_max_concurrency"]),
+                action_settings.get("timeout", self.settings["default_timeout"]),
+                action_settings.get("cache_ttl", 0) if self.results is not None else 0,
+            )
+        return resolved
+
+    def _pool(self, kind):
+        # Pools are created on first use; most configs never need processes,
+        # so multiprocessing is not even imported until one does
+        if kind == POOL_PROCESS:
+            if self._process_pool is None:
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+                from utils.actions import get_db_path
+                from utils.logging_config import start_log_relay
+                context = multiprocessing.get_context()
+                log_queue, self._log_relay = start_log_relay(context)
+                self._process_pool = ProcessPoolExecutor(
+                    max_workers=self.settings["process_workers"], mp_context=context, initializer=_init_process,
+                    initargs=(self.config, get_db_path(), log_queue, logging.getLogger().level))
+            return self._process_pool
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(
+                max_workers=self.settings["thread_workers"], thread_name_prefix="atlas-task"
+            )
+        return self._thread_pool
+
+    def has_capacity(self, action):
+        """Whether a run of `action` would be accepted right now"""
+        max_concurrency = self._settings_for(action)[1]
+        with self._lock:
+            return not self._closed and self._active.get(action, 0) < max_concurrency
+
+    def submit(self, task_id, name, action, fire_at=None, target=None):
+        """Queue a task run; returns False if it was skipped"""
+        pool_kind, max_concurrency, timeout, cache_ttl = self._settings_for(action)
+        if self._closed:
+            return False
+
+        key = None
+        if cache_ttl:
+            key = (action, normalize_target(target))
+            future = self.results.lookup(key)
+            if future is not None:
+                return self._track(future, TaskRun(task_id, name, action, fire_at, timeout, holds_slot=False))
+
+        with self._lock:
+            if self._closed:
+                return False
+            if self._active.get(action, 0) >= max_concurrency:
+                logging.warning(strings.EXECUTOR_CONCURRENCY_LIMIT.format(name, action, max_concurrency))
+                return False
+            self._active[action] = self._active.get(action, 0) + 1
+
+        run = TaskRun(task_id, name, action, fire_at, timeout)
+        try:
+            if key is not None:
+                future = self.results.start(key, cache_ttl, lambda: self._dispatch(pool_kind, action, name, target))
+            else:
+                future = self._dispatch(pool_kind, action, name, target)
+        except Exception as e:
+            with self._lock:
+                self._active[action] -= 1
+            logging.error(strings.EXECUTOR_SUBMIT_ERROR.format(name, e))
+            return False
+        return self._track(future, run)
+
+    def _dispatch(self, pool_kind, action, name, target):
+        future = None
+        if pool_kind == POOL_ASYNC and self.run_action_async is not None:
+            future = self.run_action_async(action, name, target)
+        if future is None:
+            if pool_kind == POOL_ASYNC:
+                pool_kind = POOL_THREAD
+            future = self._pool(pool_kind).submit(self.run_action, action, name, target)
+        return future
+
+    def _track(self, future, run):
+        with self._lock:
+            self._running[future] = run
+        future.add_done_callback(self._finished)
+        return True
+
+    def _finished(self, future):
+        with self._lock:
+            run = self._running.pop(future, None)
+            if run is None:
+                return
+            if run.holds_slot:
+                self._active[run.action] -= 1
+
+        if run.timed_out or future.cancelled():
+            # Timed-out runs were already reported; cancelled ones never ran
+            return
+
+        if future.exception() is not None:
+            logging.error(strings.EXECUTOR_TASK_ERROR.format(run.name, future.exception()))
+            ok = False
+        else:
+            ok = future.result() is not False
+        self._complete(run, ok)
+
+    def _complete(self, run, ok):
+        if self.on_complete is None:
+            return
+        try:
+            self.on_complete(run, ok, time.monotonic() - run.started)
+        except Exception as e:
+            logging.error(strings.EXECUTOR_CALLBACK_ERROR.format(run.name, e))
+
+    def check_timeouts(self):
+        """Report runs past their deadline as failed; returns the count"""
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            for future, run in self._running.items():
+                if not run.timed_out and run.deadline is not None and run.deadline <= now:
+                    run.timed_out = True
+                    expired.append((future, run))
+
+        # Async runs and queued runs are cancelled. Running threads cannot be
+        # killed, so their slot is only freed once the action really returns;
+        # either way the run is recorded as failed right away.
+        for future, run in expired:
+            future.cancel()
+            logging.error(strings.EXECUTOR_TIMEOUT.format(run.name, now - run.started))
+            self._complete(run, False)
+        return len(expired)
+
+    def seconds_until_timeout(self):
+        """Seconds until the next run deadline, or None if nothing is running"""
+        with self._lock:
+            deadlines = [run.deadline for run in self._running.values()
+                         if run.deadline is not None and not run.timed_out]
+        if not deadlines:
+            return None
+        return max(0.0, min(deadlines) - time.monotonic())
+
+    def running(self):
+        """Number of submitted runs that have not finished"""
+        with self._lock:
+            return len(self._running)
+
+    def shutdown(self, timeout=None):
+        """Stop accepting work, cancel queued runs and wait for running ones"""
+        with self._lock:
+            self._closed = True
+            futures = list(self._running)
+
+        for future in futures:
+            future.cancel()
+        pending = [future for future in futures if not future.cancelled()]
+        not_done = ()
+        if pending:
+            done, not_done = wait_futures(pending, timeout=timeout)
+            if not_done:
+                logging.warning(strings.EXECUTOR_SHUTDOWN_PENDING.format(len(not_done)))
+
+        if self._thread_pool is not None:
+            self._thread_pool.shutdown(wait=False)
+        if self._process_pool is not None:
+            # Idle pool processes exit at once; waiting for them flushes
+            # their last records to the relay before it stops
+            self._process_pool.shutdown(wait=not not_done)
+            self._log_relay.stop()
@@ -0,0 +1,222 @@
+"""Shared file watchers for file_changed tasks
+
+Tasks watching the same path share one watch, so the cost of polling
+grows with the number of distinct paths, not tasks. A watch keeps a stat
+signature of its path: for a file, its (mtime, size, inode); for a
+directory, a digest of those of every entry in the tree, read one
+directory at a time with os.scandir. A task fires when the signature
+changes, and on its first scan when the path changed after the task's
+last run (e.g. while the service was stopped).
+
+Scan intervals adapt per path. A path that just changed is scanned again
+after `min_interval_seconds`, an idle one backs off up to
+`max_interval_seconds`, and a tree that takes long to scan is polled no
+more often than keeps scanning under `max_scan_share` of the time.
+"""
+
+import os
+import stat
+import time
+import heapq
+import logging
+from utils.common import strings
+from utils.config import get_service_settings
+from utils.conditions import FileChangedCondition, compile_condition
+from utils.scheduler import parse_last_run
+
+DEFAULT_FILE_WATCH_SETTINGS = {
+    "min_interval_seconds": 1.0,   # scan period right after a change
+    "max_interval_seconds": 10.0,  # idle paths back off up to this
+    "max_scan_share": 0.02,        # longest share of time spent scanning one path
+}
+
+# Signature digests add up entry hashes, so entry order does not matter
+DIGEST_MASK = (1 << 64) - 1
+
+UNSCANNED = object()
+
+
+def get_file_watch_settings(config):
+    """Return file watch settings from the app config"""
+    return get_service_settings(config, "file_watch", DEFAULT_FILE_WATCH_SETTINGS)
+
+
+def scan_signature(path):
+    """Stat signature of a file or directory tree, or None if it is missing
+
+    Returns (entries, digest, newest mtime in ns). Symlinks inside a tree
+    are not followed.
+    """
+    try:
+        info = os.stat(path)
+    except OSError:
+        return None
+    if not stat.S_ISDIR(info.st_mode):
+        return (1, hash((info.st_mtime_ns, info.st_size, info.st_ino)) & DIGEST_MASK, info.st_mtime_ns)
+
+    count = 0
+    digest = 0
+    newest = info.st_mtime_ns
+    pending = [path]
+    while pending:
+        try:
+            entries = os.scandir(pending.pop())
+        except OSError:
+            continue  # removed or unreadable; counted as missing entries
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    info = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue  # removed while scanning; the next scan sees it
+                count += 1
+                digest = (digest + hash((entry.path, info.st_mtime_ns, info.st_size, entry.inode()))) & DIGEST_MASK
+                if info.st_mtime_ns > newest:
+                    newest = info.st_mtime_ns
+    return (count, digest, newest)
+
+
+class PathWatch:
+    """One watched path and the tasks waiting on it"""
+
+    __slots__ = ("path", "tasks", "signature", "interval", "next_scan", "unchecked")
+
+    def __init__(self, path, interval):
+        self.path = path
+        self.tasks = {}          # task id -> last run (epoch) until first checked
+        self.signature = UNSCANNED
+        self.interval = interval
+        self.next_scan = 0.0
+        self.unchecked = 0       # tasks whose last run is still to be compared
+
+
+class FileWatcher:
+    """Watches the paths of file_changed tasks, one watch per distinct path
+
+    Owned by the service loop thread. Times are time.monotonic() values.
+    """
+
+    def __init__(self, config=None):
+        self.settings = get_file_watch_settings(config)
+        self._watches = {}
+        self._paths = {}   # task id -> watched path
+        self._heap = []    # (next_scan, path); stale entries are skipped
+        self.scans = 0
+        self.changes = 0
+
+    def __len__(self):
+        return len(self._watches)
+
+    def watch(self, task):
+        """Watch a task row's path if it is a file_changed task; returns True if it is"""
+        try:
+            condition = compile_condition(task[3], task[4])
+        except (TypeError, ValueError):
+            return False
+        if not isinstance(condition, FileChangedCondition):
+            return False
+        task_id, path = task[0], condition.path
+        if self._paths.get(task_id) == path:
+            return True
+        self.unwatch(task_id)
+        watch = self._watches.get(path)
+        if watch is None:
+            watch = self._watches[path] = PathWatch(path, self.settings["min_interval_seconds"])
+            self._push(watch, 0.0)
+        last_run = parse_last_run(task[6])
+        watch.tasks[task_id] = last_run
+        if last_run is not None:
+            watch.unchecked += 1
+            if watch.signature is not UNSCANNED:
+                self._push(watch, 0.0)  # compare it on the next poll
+        self._paths[task_id] = path
+        return True
+
+    def unwatch(self, task_id):
+        path = self._paths.pop(task_id, None)
+        if path is None:
+            return
+        watch = self._watches[path]
+        if watch.tasks.pop(task_id, None) is not None:
+            watch.unchecked -= 1
+        if not watch.tasks:
+            del self._watches[path]
+
+    def sync(self, get_task):
+        """Drop or move watches of tasks that were removed or edited
+
+        `get_task` returns a task's current row, or None once it is gone.
+        """
+        for task_id in list(self._paths):
+            task = get_task(task_id)
+            if task is None or not self.watch(task):
+                self.unwatch(task_id)
+
+    def poll(self, now=None):
+        """Scan the paths that are due; returns the ids of tasks to fire"""
+        if now is None:
+            now = time.monotonic()
+        fired = []
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            next_scan, path = heapq.heappop(heap)
+            watch = self._watches.get(path)
+            if watch is None or watch.next_scan != next_scan:
+                continue  # stale entry
+            started = time.perf_counter()
+            signature = scan_signature(path)
+            elapsed = time.perf_counter() - started
+            self.scans += 1
+            changed = watch.signature is not UNSCANNED and signature != watch.signature
+            watch.signature = signature
+            if changed:
+                self.changes += 1
+                fired.extend(watch.tasks)
+                logging.info(strings.FILE_WATCH_CHANGED.format(path, len(watch.tasks)))
+            elif watch.unchecked:
+                fired.extend(self._changed_since_last_run(watch))
+            if watch.unchecked:
+                watch.tasks = dict.fromkeys(watch.tasks)
+                watch.unchecked = 0
+            self._adapt(watch, changed, elapsed, now)
+        return fired
+
+    def seconds_until_scan(self, now=None):
+        """Seconds until the next path is due a scan, or None"""
+        if now is None:
+            now = time.monotonic()
+        heap = self._heap
+        while heap:
+            next_scan, path = heap[0]
+            watch = self._watches.get(path)
+            if watch is not None and watch.next_scan == next_scan:
+                return max(next_scan - now, 0.0)
+            heapq.heappop(heap)
+        return None
+
+    def stats(self):
+        """Counters for logs and metrics"""
+        return {"paths": len(self._watches), "tasks": len(self._paths), "scans": self.scans,
+                "changes": self.changes}
+
+    def _changed_since_last_run(self, watch):
+        # Tasks whose path changed after their last run, before it was watched
+        if watch.signature is None:
+            return []
+        newest = watch.signature[2] / 1e9
+        return [task_id for task_id, last_run in watch.tasks.items() if last_run is not None and newest > last_run]
+
+    def _adapt(self, watch, changed, elapsed, now):
+        settings = self.settings
+        if changed:
+            watch.interval = settings["min_interval_seconds"]
+        else:
+            watch.interval = min(watch.interval * 2, settings["max_interval_seconds"])
+        # Large trees: keep scanning within its share of the time
+        self._push(watch, now + max(watch.interval, elapsed / settings["max_scan_share"]))
+
+    def _push(self, watch, next_scan):
+        watch.next_scan = next_scan
+        heapq.heappush(self._heap, (next_scan, watch.path))
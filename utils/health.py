@@ -0,0 +1,324 @@
+"""Asynchronous HTTP health checks for AtlasPi"""
+
+import io
+import os
+import ssl
+import time
+import asyncio
+import logging
+import threading
+import http.client
+from urllib.parse import urlsplit
+from utils.common import strings
+from utils.config import get_service_settings
+from utils.actions import action, on_shutdown, get_config
+from utils.executor import POOL_ASYNC
+
+DEFAULT_HEALTH_SETTINGS = {
+    "concurrency": 200,
+    "request_timeout": 5.0,
+    "max_idle_per_host": 8,
+}
+
+USER_AGENT = "AtlasPi-HealthCheck"
+READ_CHUNK = 64 * 1024
+
+
+class HealthResult:
+    """Outcome of one health check"""
+
+    __slots__ = ("url", "ok", "status", "latency", "error")
+
+    def __init__(self, url, ok, status=None, latency=0.0, error=None):
+        self.url = url
+        self.ok = ok
+        self.status = status
+        self.latency = latency
+        self.error = error
+
+    def __repr__(self):
+        return f"HealthResult({self.url!r}, ok={self.ok}, status={self.status}, latency={self.latency:.3f})"
+
+
+class HealthCheckEngine:
+    """Runs HTTP health checks on a private asyncio loop
+
+    Connections are kept alive and reused per (scheme, host, port), checks
+    fan out up to `concurrency` at a time, and every request is bounded by
+    its own timeout. The loop lives on a daemon thread so synchronous
+    callers (the executor, the menu) can share one engine.
+    """
+
+    def __init__(self, concurrency=200, request_timeout=5.0, max_idle_per_host=8):
+        self.concurrency = concurrency
+        self.request_timeout = request_timeout
+        self.max_idle_per_host = max_idle_per_host
+        self._idle = {}
+        self._semaphore = None
+        self._ssl_context = None
+        self._loop = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.connections_opened = 0
+
+    # -- lifecycle -----------------------------------------------------
+
+    def start(self):
+        """Start the event loop thread (idempotent)"""
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run_loop():
+                asyncio.set_event_loop(self._loop)
+                self._loop.call_soon(ready.set)
+                self._loop.run_forever()
+
+            self._thread = threading.Thread(target=run_loop, name="atlas-health", daemon=True)
+            self._thread.start()
+            ready.wait()
+
+    def close(self):
+        """Close pooled connections and stop the loop thread"""
+        with self._start_lock:
+            if self._thread is None:
+                return
+            try:
+                asyncio.run_coroutine_threadsafe(self._close_idle(), self._loop).result(self.request_timeout)
+            except Exception:
+                pass
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=self.request_timeout)
+            self._loop.close()
+            self._thread = None
+            self._loop = None
+            self._semaphore = None
+
+    def submit(self, coro):
+        """Schedule a coroutine on the engine loop; returns a concurrent Future"""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def check_sync(self, url, timeout=None):
+        """Blocking wrapper around check() for synchronous callers"""
+        timeout = timeout or self.request_timeout
+        return self.submit(self.check(url, timeout)).result(timeout + 1)
+
+    # -- checks --------------------------------------------------------
+
+    async def check_many(self, urls, timeout=None):
+        """Check many URLs concurrently (bounded by the concurrency cap)"""
+        return await asyncio.gather(*(self.check(url, timeout) for url in urls))
+
+    async def check(self, url, timeout=None):
+        """Check one URL; 2xx/3xx responses count as healthy"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        timeout = timeout or self.request_timeout
+
+        async with self._semaphore:
+            started = time.monotonic()
+            try:
+                status = await asyncio.wait_for(self._fetch(url), timeout)
+            except asyncio.TimeoutError:
+                return HealthResult(url, False, latency=time.monotonic() - started,
+                                    error=f"timed out after {timeout}s")
+            except (OSError, ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                    http.client.HTTPException) as e:
+                return HealthResult(url, False, latency=time.monotonic() - started, error=str(e) or repr(e))
+            return HealthResult(url, 200 <= status < 400, status, time.monotonic() - started)
+
+    async def _fetch(self, url):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"unsupported URL: {url}")
+        default_port = 443 if parts.scheme == "https" else 80
+        key = (parts.scheme, parts.hostname, parts.port or default_port)
+        host_header = parts.netloc.rsplit("@", 1)[-1]
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+
+        # A pooled connection may have been closed by the server while idle;
+        # in that case move on to the next one, ending with a fresh connection.
+        while True:
+            reused, reader, writer = await self._acquire(key)
+            try:
+                status, keep_alive = await self._exchange(reader, writer, host_header, path)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                # Timeouts cancel us mid-response; the stream is unusable
+                writer.close()
+                raise
+            if keep_alive:
+                self._release(key, reader, writer)
+            else:
+                writer.close()
+            return status
+
+    async def _acquire(self, key):
+        idle = self._idle.get(key)
+        while idle:
+            reader, writer = idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return True, reader, writer
+            writer.close()
+
+        scheme, host, port = key
+        ssl_context = None
+        if scheme == "https":
+            if self._ssl_context is None:
+                self._ssl_context = ssl.create_default_context()
+            ssl_context = self._ssl_context
+        reader, writer = await asyncio.open_connection(host, port, ssl=ssl_context)
+        self.connections_opened += 1
+        return False, reader, writer
+
+    def _release(self, key, reader, writer):
+        idle = self._idle.setdefault(key, [])
+        if len(idle) < self.max_idle_per_host:
+            idle.append((reader, writer))
+        else:
+            writer.close()
+
+    async def _close_idle(self):
+        for idle in self._idle.values():
+            for _, writer in idle:
+                writer.close()
+        self._idle.clear()
+
+    async def _exchange(self, reader, writer, host_header, path):
+        """Send a GET and read the full response; returns (status, keep_alive)"""
+        writer.write(
+            f"GET {path} HTTP/1.1\r\n"
+            f"Host: {host_header}\r\n"
+            f"User-Agent: {USER_AGENT}\r\n"
+            "Accept: */*\r\n"
+            "Connection: keep-alive\r\n\r\n".encode("latin-1")
+        )
+        await writer.drain()
+
+        head = await reader.readuntil(b"\r\n\r\n")
+        status_line, _, header_block = head.partition(b"\r\n")
+        version, status, _ = (status_line.decode("latin-1").split(None, 2) + [""])[:3]
+        if not version.startswith("HTTP/") or not status.isdigit():
+            raise http.client.BadStatusLine(status_line.decode("latin-1"))
+        status = int(status)
+        headers = http.client.parse_headers(io.BytesIO(header_block))
+
+        connection = headers.get("Connection", "").lower()
+        keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+
+        if status < 200 or status in (204, 304):
+            return status, keep_alive
+        if "chunked" in headers.get("Transfer-Encoding", "").lower():
+            await self._discard_chunked(reader)
+        elif headers.get("Content-Length") is not None:
+            await self._discard(reader, int(headers["Content-Length"]))
+        else:
+            # Body runs until the server closes the connection
+            while await reader.read(READ_CHUNK):
+                pass
+            keep_alive = False
+        return status, keep_alive
+
+    async def _discard(self, reader, length):
+        while length > 0:
+            chunk = await reader.readexactly(min(length, READ_CHUNK))
+            length -= len(chunk)
+
+    async def _discard_chunked(self, reader):
+        while True:
+            size_line = await reader.readuntil(b"\r\n")
+            size = int(size_line.split(b";", 1)[0].strip(), 16)
+            if size == 0:
+                # Skip optional trailers up to the terminating blank line
+                while await reader.readuntil(b"\r\n") != b"\r\n":
+                    pass
+                return
+            await self._discard(reader, size + 2)
+
+
+# Shared engine used by the check_api_health action
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_health_settings(config):
+    """Return health-check settings from the app config"""
+    return get_service_settings(config, "health_check", DEFAULT_HEALTH_SETTINGS)
+
+
+def _build_engine(settings):
+    return HealthCheckEngine(
+        concurrency=settings["concurrency"],
+        request_timeout=settings["request_timeout"],
+        max_idle_per_host=settings["max_idle_per_host"],
+    )
+
+
+def configure_engine(config):
+    """(Re)create the shared engine from the app config"""
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.close()
+        _engine = _build_engine(get_health_settings(config))
+        return _engine
+
+
+def get_engine(config=None):
+    """Return the shared engine, creating one from `config` if needed"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = _build_engine(get_health_settings(config))
+        return _engine
+
+
+def _forget_engine_after_fork():
+    """Drop an engine inherited over a fork; its loop thread did not come along"""
+    global _engine, _engine_lock
+    _engine = None
+    _engine_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_engine_after_fork)
+
+
+@on_shutdown
+def shutdown_engine():
+    """Close the shared engine's connections and loop thread"""
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.close()
+            _engine = None
+
+
+async def check_api_health(task_name, target):
+    """Health-check action coroutine; returns True when the target is healthy"""
+    if not target:
+        logging.warning(strings.HEALTH_NO_TARGET.format(task_name))
+        return False
+    result = await get_engine().check(target)
+    if result.ok:
+        logging.info(strings.HEALTH_OK.format(task_name, target, result.status, result.latency))
+    else:
+        logging.warning(strings.HEALTH_FAILED.format(task_name, target, result.error or result.status))
+    return result.ok
+
+
+# Tasks checking the same URL within 10 seconds share one check
+@action("check_api_health", pool=POOL_ASYNC, timeout=30, max_concurrency=1000, cache_ttl=10)
+def run_check_api_health(task_name, target):
+    """check_api_health action: starts a check on the shared engine, returns a Future"""
+    logging.info(f"Checking API health for task: {task_name}")
+    return get_engine(get_config()).submit(check_api_health(task_name, target))
@@ -0,0 +1,413 @@
+"""Execution history for AtlasPi
+
+Every run outcome (including missed and skipped runs) is appended to
+`task_runs` as a row of small integers. Recording only appends to an
+in-memory list; a background thread inserts the list in one transaction
+every few seconds and periodically compacts the raw rows into per-hour
+rollups (counts plus a duration histogram), which are later folded into
+per-day rollups. Queries read the rollups plus the few raw rows not yet
+compacted, so their cost depends on the number of tasks and hours asked
+about, not on how many runs there were.
+"""
+
+import time
+import array
+import bisect
+import operator
+import logging
+import sqlite3
+import threading
+from utils.common import strings
+from utils.config import get_service_settings
+from utils.database import get_connection, close_thread_connections
+from utils.metrics import Histogram, ACTION_BUCKETS
+
+DEFAULT_HISTORY_SETTINGS = {
+    "enabled": True,
+    "flush_seconds": 5.0,      # how long recorded runs wait before being written
+    "batch_size": 1000,        # write early once this many runs are waiting
+    "compact_seconds": 300,    # how often raw runs are folded into rollups
+    "raw_hours": 48,           # raw runs are kept this long after compaction
+    "hourly_days": 14,         # hourly rollups older than this become daily ones
+    "daily_days": 365,         # daily rollups older than this are deleted
+}
+
+OUTCOME_OK = 0
+OUTCOME_FAILED = 1
+OUTCOME_TIMEOUT = 2
+OUTCOME_MISSED = 3
+OUTCOME_SKIPPED = 4
+
+HOUR = 3600
+DAY = 86400
+
+# Rollup duration histogram upper bounds, in milliseconds
+DURATION_BUCKETS_MS = tuple(int(bound * 1000) for bound in ACTION_BUCKETS)
+
+# Runs kept in memory while the database cannot be written
+MAX_PENDING_RUNS = 100000
+
+# Most raw runs compacted or deleted in one transaction
+COMPACT_BATCH_SIZE = 50000
+
+_HISTOGRAM_TYPE = "I"
+
+
+class RunStats:
+    """Outcome counts and a duration histogram for a set of runs"""
+
+    __slots__ = ("ok", "failed", "timed_out", "missed", "skipped", "total_ms", "max_ms", "histogram")
+
+    def __init__(self):
+        self.ok = self.failed = self.timed_out = self.missed = self.skipped = 0
+        self.total_ms = self.max_ms = 0
+        self.histogram = [0] * (len(DURATION_BUCKETS_MS) + 1)
+
+    @property
+    def runs(self):
+        """Runs that actually executed"""
+        return self.ok + self.failed + self.timed_out
+
+    def add(self, outcome, duration_ms):
+        if outcome == OUTCOME_MISSED:
+            self.missed += 1
+            return
+        if outcome == OUTCOME_SKIPPED:
+            self.skipped += 1
+            return
+        if outcome == OUTCOME_OK:
+            self.ok += 1
+        elif outcome == OUTCOME_TIMEOUT:
+            self.timed_out += 1
+        else:
+            self.failed += 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        self.histogram[bisect.bisect_left(DURATION_BUCKETS_MS, duration_ms)] += 1
+
+    def merge_row(self, row):
+        """Add a rollup row: (ok, failed, timed_out, missed, skipped, total_ms, max_ms, histogram)"""
+        self.ok += row[0]
+        self.failed += row[1]
+        self.timed_out += row[2]
+        self.missed += row[3]
+        self.skipped += row[4]
+        self.total_ms += row[5]
+        self.max_ms = max(self.max_ms, row[6])
+        counts = memoryview(row[7]).cast(_HISTOGRAM_TYPE)
+        if len(counts) == len(self.histogram):
+            # Rollups written with other bucket bounds only lose their histogram
+            self.histogram = list(map(operator.add, self.histogram, counts))
+
+    def to_row(self):
+        return (self.ok, self.failed, self.timed_out, self.missed, self.skipped, self.total_ms, self.max_ms,
+                array.array(_HISTOGRAM_TYPE, self.histogram).tobytes())
+
+    def success_rate(self):
+        """Fraction of executed runs that succeeded, or None if none ran"""
+        return self.ok / self.runs if self.runs else None
+
+    def mean_ms(self):
+        return self.total_ms / self.runs if self.runs else 0.0
+
+    def quantile_ms(self, fraction):
+        """Estimate a duration quantile from the histogram"""
+        histogram = Histogram(DURATION_BUCKETS_MS)
+        histogram.counts = list(self.histogram)
+        histogram.count = sum(self.histogram)
+        return min(histogram.quantile(fraction), self.max_ms)
+
+
+def get_history_settings(config):
+    """Return history settings from the app config"""
+    return get_service_settings(config, "history", DEFAULT_HISTORY_SETTINGS)
+
+
+def write_runs(db_path, runs):
+    """Insert (task_id, ended, duration_ms, outcome) rows in one transaction"""
+    conn = get_connection(db_path)
+    with conn:
+        conn.executemany("INSERT INTO task_runs (task_id, ended, duration_ms, outcome) VALUES (?, ?, ?, ?)", runs)
+
+
+def _get_state(conn, name):
+    row = conn.execute("SELECT value FROM history_state WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else 0
+
+
+def _set_state(conn, name, value):
+    conn.execute("INSERT OR REPLACE INTO history_state (name, value) VALUES (?, ?)", (name, value))
+
+
+def _merge_rollups(conn, period, rollups):
+    """Add {(task_id, bucket): RunStats} into the stored rollups of `period`"""
+    rows = []
+    for (task_id, bucket), stats in rollups.items():
+        existing = conn.execute(
+            "SELECT ok, failed, timed_out, missed, skipped, total_ms, max_ms, histogram FROM task_run_rollups "
+            "WHERE period = ? AND task_id = ? AND bucket = ?", (period, task_id, bucket)
+        ).fetchone()
+        if existing is not None:
+            stats.merge_row(existing)
+        rows.append((period, task_id, bucket) + stats.to_row())
+    conn.executemany("INSERT OR REPLACE INTO task_run_rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+
+def _first_run_at_or_after(conn, cutoff, last_id):
+    """Id of the first raw run that ended at or after `cutoff`, up to last_id + 1
+
+    Runs are appended in completion order, so `ended` grows with the id
+    and a binary search over ids replaces an index on `ended`.
+    """
+    lo = conn.execute("SELECT MIN(id) FROM task_runs").fetchone()[0]
+    if lo is None:
+        return 0
+    hi = last_id + 1
+    while lo < hi:
+        mid = (lo + hi) // 2
+        row = conn.execute("SELECT id, ended FROM task_runs WHERE id >= ? ORDER BY id LIMIT 1", (mid,)).fetchone()
+        if row is None or row[0] > last_id or row[1] >= cutoff:
+            hi = mid
+        else:
+            lo = row[0] + 1
+    return lo
+
+
+def compact_history(db_path, settings=None, now=None):
+    """Fold new raw runs into hourly rollups and apply retention
+
+    Hourly rollups older than `hourly_days` are folded into daily ones
+    (once per day), daily rollups past `daily_days` are dropped and raw
+    runs past `raw_hours` are deleted. Work is split into transactions of
+    at most COMPACT_BATCH_SIZE runs so the scheduler's own writes never
+    wait long for the lock. Returns the number of runs folded.
+    """
+    settings = settings or DEFAULT_HISTORY_SETTINGS
+    if now is None:
+        now = time.time()
+    conn = get_connection(db_path)
+
+    folded = rollups = 0
+    while True:
+        count, touched = _in_transaction(conn, _fold_raw_runs, conn)
+        folded += count
+        rollups += touched
+        if count < COMPACT_BATCH_SIZE:
+            break
+    _in_transaction(conn, _fold_hourly_rollups, conn, settings, now)
+    while _in_transaction(conn, _delete_raw_runs, conn, int(now - settings["raw_hours"] * HOUR)):
+        pass
+
+    if folded and logging.root.isEnabledFor(logging.DEBUG):
+        logging.debug(strings.HISTORY_COMPACTED.format(folded, rollups))
+    return folded
+
+
+def _in_transaction(conn, function, *args):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        result = function(*args)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return result
+
+
+def _fold_raw_runs(conn):
+    """Fold the next batch of raw runs into hourly rollups"""
+    compacted_id = _get_state(conn, "compacted_id")
+    hourly = {}
+    last_id = compacted_id
+    count = 0
+    for run_id, task_id, ended, duration_ms, outcome in conn.execute(
+        "SELECT id, task_id, ended, duration_ms, outcome FROM task_runs WHERE id > ? ORDER BY id LIMIT ?",
+        (compacted_id, COMPACT_BATCH_SIZE)
+    ):
+        key = (task_id, ended - ended % HOUR)
+        stats = hourly.get(key)
+        if stats is None:
+            stats = hourly[key] = RunStats()
+        stats.add(outcome, duration_ms)
+        last_id = run_id
+        count += 1
+    if hourly:
+        _merge_rollups(conn, HOUR, hourly)
+        _set_state(conn, "compacted_id", last_id)
+    return count, len(hourly)
+
+
+def _fold_hourly_rollups(conn, settings, now):
+    """Turn old hourly rollups into daily ones and drop expired days"""
+    # Day boundaries move once a day, so this scan runs once a day
+    hourly_cutoff = int(now - settings["hourly_days"] * DAY)
+    hourly_cutoff -= hourly_cutoff % DAY
+    if hourly_cutoff <= _get_state(conn, "hourly_cutoff"):
+        return
+    daily = {}
+    for row in conn.execute(
+        "SELECT task_id, bucket, ok, failed, timed_out, missed, skipped, total_ms, max_ms, histogram "
+        "FROM task_run_rollups WHERE period = ? AND bucket < ?", (HOUR, hourly_cutoff)
+    ):
+        key = (row[0], row[1] - row[1] % DAY)
+        stats = daily.get(key)
+        if stats is None:
+            stats = daily[key] = RunStats()
+        stats.merge_row(row[2:])
+    _merge_rollups(conn, DAY, daily)
+    conn.execute("DELETE FROM task_run_rollups WHERE period = ? AND bucket < ?", (HOUR, hourly_cutoff))
+    conn.execute("DELETE FROM task_run_rollups WHERE period = ? AND bucket < ?",
+                 (DAY, int(now - settings["daily_days"] * DAY)))
+    _set_state(conn, "hourly_cutoff", hourly_cutoff)
+
+
+def _delete_raw_runs(conn, cutoff):
+    """Delete a batch of compacted raw runs that ended before `cutoff`; returns the count"""
+    # Raw runs are only dropped once they are in the rollups
+    first_kept = _first_run_at_or_after(conn, cutoff, _get_state(conn, "compacted_id"))
+    if not first_kept:
+        return 0
+    return conn.execute("DELETE FROM task_runs WHERE id < ? AND id < (SELECT MIN(id) FROM task_runs) + ?",
+                        (first_kept, COMPACT_BATCH_SIZE)).rowcount
+
+
+def task_stats(db_path, since, until=None, task_id=None):
+    """Return {task_id: RunStats} for runs that ended in [since, until)
+
+    Compacted runs are counted by their rollup, so `since` and `until`
+    are effectively rounded out to hour boundaries (day boundaries for
+    data older than `hourly_days`).
+    """
+    if until is None:
+        until = time.time() + 1
+    conn = get_connection(db_path)
+    results = {}
+
+    def stats_for(run_task_id):
+        stats = results.get(run_task_id)
+        if stats is None:
+            stats = results[run_task_id] = RunStats()
+        return stats
+
+    task_filter = "" if task_id is None else " AND task_id = ?"
+    task_args = () if task_id is None else (task_id,)
+    # One read transaction, so a concurrent compaction is seen whole or not at all
+    conn.execute("BEGIN")
+    try:
+        for period in (HOUR, DAY):
+            for row in conn.execute(
+                "SELECT task_id, ok, failed, timed_out, missed, skipped, total_ms, max_ms, histogram "
+                "FROM task_run_rollups WHERE period = ?" + task_filter + " AND bucket > ? AND bucket < ?",
+                (period,) + task_args + (int(since) - period, until)
+            ):
+                stats_for(row[0]).merge_row(row[1:])
+        compacted_id = _get_state(conn, "compacted_id")
+        for run_task_id, duration_ms, outcome in conn.execute(
+            "SELECT task_id, duration_ms, outcome FROM task_runs WHERE id > ?" + task_filter +
+            " AND ended >= ? AND ended < ?", (compacted_id,) + task_args + (since, until)
+        ):
+            stats_for(run_task_id).add(outcome, duration_ms)
+    finally:
+        conn.commit()
+    return results
+
+
+def history_report(db_path, since, until=None, limit=None):
+    """Return [(task name, RunStats)], tasks with the most failures first"""
+    stats = task_stats(db_path, since, until)
+    names = dict(get_connection(db_path).execute("SELECT id, name FROM tasks"))
+    report = sorted(((names.get(task_id, f"#{task_id}"), run_stats) for task_id, run_stats in stats.items()),
+                    key=lambda item: (-(item[1].failed + item[1].timed_out + item[1].missed), item[0]))
+    return report[:limit] if limit else report
+
+
+class HistoryRecorder:
+    """Buffers run outcomes and writes them from a background thread
+
+    record() only appends to a list under a short lock, so it is cheap to
+    call from the scheduler and from worker threads. The writer thread
+    inserts each batch in one transaction and runs compaction every
+    `compact_seconds`, so history never adds database work to a tick.
+    """
+
+    def __init__(self, db_path, settings=None):
+        self.db_path = db_path
+        self.settings = settings or dict(DEFAULT_HISTORY_SETTINGS)
+        self._pending = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._next_compaction = 0.0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def record(self, task_id, outcome, duration=0.0, ended=None):
+        """Buffer one run; `duration` is in seconds, `ended` defaults to now"""
+        if ended is None:
+            ended = time.time()
+        with self._lock:
+            self._pending.append((task_id, int(ended), int(duration * 1000), outcome))
+            full = len(self._pending) >= self.settings["batch_size"]
+        if full:
+            self._wake.set()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="atlas-history", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                self._wake.wait(self.settings["flush_seconds"])
+                self._wake.clear()
+                self.flush()
+                if time.monotonic() >= self._next_compaction:
+                    self.compact()
+            self.flush()
+        finally:
+            close_thread_connections()
+
+    def flush(self):
+        """Write every buffered run in one transaction; returns the count"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return 0
+        try:
+            write_runs(self.db_path, pending)
+        except sqlite3.Error as e:
+            # Keep the batch for the next attempt, within bounds
+            with self._lock:
+                self._pending = (pending + self._pending)[-MAX_PENDING_RUNS:]
+            logging.error(strings.HISTORY_FLUSH_ERROR.format(len(pending), e))
+            return 0
+        return len(pending)
+
+    def compact(self):
+        self._next_compaction = time.monotonic() + self.settings["compact_seconds"]
+        try:
+            return compact_history(self.db_path, self.settings)
+        except sqlite3.Error as e:
+            logging.error(strings.HISTORY_COMPACT_ERROR.format(e))
+            return 0
+
+    def close(self, timeout=None):
+        """Stop the writer after a final flush"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        else:
+            self.flush()
+
+
+def start_history(db_path, config):
+    """Start a HistoryRecorder unless the config disables history"""
+    settings = get_history_settings(config)
+    if not settings["enabled"]:
+        return None
+    return HistoryRecorder(db_path, settings).start()
@@ -1,31 +1,190 @@
 """Logging configuration for AtlasPi"""
 
+import json
+import queue
+import atexit
 import logging
+import logging.handlers
+from datetime import datetime
+from utils.common import strings
 
+# Used for keys missing from the config's "logging" section
+DEFAULT_LOGGING_SETTINGS = {
+    "log_level": "info",
+    "log_file": None,
+    "format": "text",          # "text" or "json" (one JSON object per line)
+    "rotation": "size",        # "size", "time" or "none"
+    "max_bytes": 5 * 1024 * 1024,
+    "backup_count": 5,
+    "when": "midnight",        # for time rotation, see TimedRotatingFileHandler
+}
 
-def setup_logging(log_path, debug_mode=False):
-    """Configure dual logging (file + console) for the application"""
-    
-    # Create formatters
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
 
-    # File handler - always logs everything
-    file_handler = logging.FileHandler(log_path, mode='a')
+# The listener that owns the real handlers, and the file it writes to
+_listener = None
+_log_path = None
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Formats each record as one JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def get_logging_settings(config):
+    """Return logging settings from the app config"""
+    settings = dict(DEFAULT_LOGGING_SETTINGS)
+    settings.update((config or {}).get("logging", {}))
+    return settings
+
+
+def parse_level(name, default=logging.INFO):
+    """Turn a level name such as "info" into a logging level"""
+    level = logging.getLevelName(str(name).upper())
+    return level if isinstance(level, int) else default
+
+
+def resolve_log_path(log_path, config=None, debug_mode=False):
+    """The log file to use: the config's log_file, or `log_path`
+
+    Debug runs keep the local log that the debug menu views and clears.
+    """
+    if debug_mode:
+        return log_path
+    return get_logging_settings(config)["log_file"] or log_path
+
+
+def _file_handler(path, settings):
+    rotation = settings["rotation"]
+    if rotation == "size":
+        return logging.handlers.RotatingFileHandler(
+            path, maxBytes=settings["max_bytes"], backupCount=settings["backup_count"], encoding="utf-8"
+        )
+    if rotation == "time":
+        return logging.handlers.TimedRotatingFileHandler(
+            path, when=settings["when"], backupCount=settings["backup_count"], encoding="utf-8"
+        )
+    return logging.FileHandler(path, mode='a', encoding="utf-8")
+
+
+def setup_logging(log_path, debug_mode=False, config=None):
+    """Configure dual logging (file + console) for the application
+
+    Callers only put records on a queue; a background listener formats
+    them and does the file and console I/O, so slow storage never stalls
+    the scheduler. Returns the path of the log file in use.
+    """
+    global _listener, _log_path
+    shutdown_logging()
+    settings = get_logging_settings(config)
+
+    if settings["format"] == "json":
+        formatter = JsonLinesFormatter()
+    else:
+        formatter = logging.Formatter(TEXT_FORMAT)
+
+    # File handler - always logs everything the root level lets through
+    path = resolve_log_path(log_path, config, debug_mode)
+    fallback_error = None
+    try:
+        file_handler = _file_handler(path, settings)
+    except OSError as e:
+        # e.g. /var/log is not writable for this user
+        fallback_error = (path, e)
+        path = log_path
+        file_handler = _file_handler(path, settings)
     file_handler.setFormatter(formatter)
     file_handler.setLevel(logging.DEBUG)
 
     # Console handler - different levels based on debug mode
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(logging.Formatter('%(message)s' if not debug_mode else '%(levelname)s: %(message)s'))
-    
+
     if debug_mode:
         console_handler.setLevel(logging.DEBUG)  # Show everything in debug mode
         root_level = logging.DEBUG
     else:
         console_handler.setLevel(logging.WARNING)  # Only show warnings/errors in normal mode
-        root_level = logging.INFO
+        root_level = parse_level(settings["log_level"])
+
+    # Configure root logger. Disabled levels are rejected by the root
+    # logger before a record is even created.
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(root_level)
+
+    # Process information is not in any format; skip collecting it
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+    _log_path = path
+
+    if fallback_error is not None:
+        logging.warning(strings.LOG_FILE_FALLBACK.format(*fallback_error, path))
+    logging.info("Starting the AtlasPi setup script.")
+    return path
+
+
+def shutdown_logging():
+    """Flush queued records and close the log handlers"""
+    global _listener
+    if _listener is None:
+        return
+    listener, _listener = _listener, None
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+
+
+class _RelayHandler(logging.Handler):
+    """Hands records from worker processes to this process's loggers"""
+
+    def emit(self, record):
+        logging.getLogger(record.name).handle(record)
+
+
+def start_log_relay(context):
+    """Return (queue, listener) relaying worker process records into this process
+
+    `context` is the multiprocessing context the workers are started from;
+    workers pass the queue to setup_worker_logging().
+    """
+    log_queue = context.Queue()
+    relay = logging.handlers.QueueListener(log_queue, _RelayHandler())
+    relay.start()
+    return log_queue, relay
+
+
+def setup_worker_logging(log_queue, level):
+    """Send this worker process's records to the parent's relay queue"""
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+
+def get_log_path():
+    """Path of the log file setup_logging chose (None before setup)"""
+    return _log_path
+
 
-    # Configure root logger
-    logging.basicConfig(level=root_level, handlers=[file_handler, console_handler])
-    
-    logging.info("Starting the AtlasPi setup script.")
\ No newline at end of file
+# Make sure queued records reach the file when the process exits
+atexit.register(shutdown_logging)
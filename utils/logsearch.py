@@ -0,0 +1,255 @@
+"""Time-indexed search over AtlasPi log files
+
+Log lines start with a sortable timestamp ("2024-01-01 02:00:00,123 - ..."
+or {"time": "2024-01-01T02:00:00.123", ...} for JSON lines), so a time
+range maps to one contiguous byte range. A sparse side index records the
+timestamp of the first entry after every INDEX_STRIDE bytes; a query
+bisects that index, binary-searches the remaining window of the mmapped
+file and then streams only the matching lines. Building or extending
+the index touches one line per stride, never the whole file.
+"""
+
+import os
+import glob
+import mmap
+import bisect
+from datetime import datetime
+from utils.logtail import LineFilter, decode_line
+
+INDEX_STRIDE = 256 * 1024
+INDEX_SUFFIX = ".idx"
+INDEX_MAGIC = "atlaspi-log-index 1"
+
+# Below this window size a linear scan beats more bisection steps
+LINEAR_SCAN_BYTES = 4096
+
+KEY_LENGTH = len("2024-01-01 02:00:00")
+_JSON_TIME = b'"time": "'
+
+
+def line_key(line):
+    """Sortable timestamp key (bytes) of a log line, or None for continuation lines"""
+    if line.startswith(b"{"):
+        start = line.find(_JSON_TIME)
+        if start < 0:
+            return None
+        key = line[start + len(_JSON_TIME):start + len(_JSON_TIME) + KEY_LENGTH].replace(b"T", b" ")
+    else:
+        key = line[:KEY_LENGTH]
+    if len(key) == KEY_LENGTH and key[4:5] == b"-" and key[10:11] == b" " and key[13:14] == b":":
+        return key
+    return None
+
+
+def parse_time_bound(text, is_end=False, today=None):
+    """Turn "02:15", "2024-01-01 02:15" or an ISO time into an index key
+
+    Times without a date are taken as today. A missing seconds field means
+    the whole minute, so "02:00".."02:15" includes 02:15:59.
+    """
+    original = text
+    text = text.strip().replace("T", " ")
+    if today is None:
+        today = datetime.now().date()
+    if len(text) <= len("02:15:00"):
+        text = f"{today.isoformat()} {text}"
+    date_part, _, time_part = text.partition(" ")
+    parts = time_part.split(":") if time_part else ["00", "00"]
+    if len(parts) == 2:
+        parts.append("59" if is_end else "00")
+    try:
+        hours, minutes, seconds = (int(float(part)) for part in parts[:3])
+        value = datetime.fromisoformat(date_part).replace(hour=hours, minute=minutes, second=seconds)
+    except ValueError:
+        raise ValueError(repr(original)) from None
+    return value.strftime("%Y-%m-%d %H:%M:%S").encode("ascii")
+
+
+def next_entry(mm, start, limit):
+    """First (offset, key) of a timestamped line starting in [start, limit)"""
+    if start > 0 and mm[start - 1:start] != b"\n":
+        newline = mm.find(b"\n", start, limit)
+        if newline < 0:
+            return None, None
+        start = newline + 1
+    while start < limit:
+        end = mm.find(b"\n", start)
+        if end < 0:
+            return None, None  # line still being written
+        key = line_key(mm[start:start + KEY_LENGTH + 64])
+        if key is not None:
+            return start, key
+        start = end + 1
+    return None, None
+
+
+class LogIndex:
+    """Sparse timestamp -> byte offset index for one log file
+
+    With `index_path` the index is kept in a side file and only extended
+    over data appended since the last query; it is rebuilt when the log
+    was rotated or truncated.
+    """
+
+    def __init__(self, index_path=None, stride=INDEX_STRIDE):
+        self.index_path = index_path
+        self.stride = stride
+        self.identity = None
+        self.next_boundary = 0
+        self.keys = []
+        self.offsets = []
+
+    def load(self):
+        if self.index_path is None:
+            return
+        try:
+            with open(self.index_path, "r", encoding="ascii") as file:
+                header = file.readline().split()
+                if " ".join(header[:2]) != INDEX_MAGIC or int(header[5]) != self.stride:
+                    return
+                identity = (int(header[2]), header[3])
+                next_boundary = int(header[4])
+                keys, offsets = [], []
+                for line in file:
+                    offset, _, key = line.rstrip("\n").partition(" ")
+                    offsets.append(int(offset))
+                    keys.append(key.encode("ascii"))
+        except (OSError, ValueError, IndexError):
+            return
+        self.identity, self.next_boundary, self.keys, self.offsets = identity, next_boundary, keys, offsets
+
+    def save(self):
+        if self.index_path is None:
+            return
+        inode, first_key = self.identity
+        temp_path = self.index_path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="ascii") as file:
+                file.write(f"{INDEX_MAGIC} {inode} {first_key} {self.next_boundary} {self.stride}\n")
+                file.writelines(f"{offset} {key.decode('ascii')}\n" for key, offset in zip(self.keys, self.offsets))
+            os.replace(temp_path, self.index_path)
+        except OSError:
+            pass  # a read-only log directory just means no persisted index
+
+    def update(self, mm, size, inode):
+        """Bring the index up to date with the mapped file; returns True if it changed"""
+        _, first_key = next_entry(mm, 0, min(size, self.stride))
+        identity = (inode, (first_key or b"-").decode("ascii").replace(" ", "T"))
+        if self.identity is None:
+            self.load()
+        if self.identity != identity or (self.offsets and self.offsets[-1] >= size):
+            # Rotated, truncated or new: start over
+            self.identity, self.next_boundary, self.keys, self.offsets = identity, 0, [], []
+
+        changed = False
+        boundary = self.next_boundary
+        while boundary < size:
+            offset, key = next_entry(mm, boundary, min(boundary + self.stride, size))
+            if offset is None and boundary + self.stride > size:
+                break  # the last stride is still being written; revisit later
+            if offset is not None and (not self.offsets or offset > self.offsets[-1]):
+                self.offsets.append(offset)
+                self.keys.append(key)
+            boundary += self.stride
+            changed = True
+        self.next_boundary = boundary
+        return changed
+
+    def window(self, key, size):
+        """Byte range [lo, hi] that holds the first entry at or after `key`"""
+        position = bisect.bisect_left(self.keys, key)
+        lo = self.offsets[position - 1] if position > 0 else 0
+        hi = self.offsets[position] if position < len(self.offsets) else size
+        return lo, hi
+
+
+def seek_time(mm, key, lo, hi):
+    """Offset of the first entry with a timestamp >= key, searching [lo, hi]
+
+    `lo` must be a line start before the answer and `hi` an entry start
+    (or the end of the data) known to be at or after it.
+    """
+    answer = limit = hi
+    while limit - lo > LINEAR_SCAN_BYTES:
+        mid = (lo + limit) // 2
+        offset, found = next_entry(mm, mid, limit)
+        if offset is None:
+            limit = mid  # no entry starts in the upper half
+        elif found >= key:
+            answer = limit = offset
+        else:
+            lo = offset
+    offset = lo
+    while offset < limit:
+        found_offset, found = next_entry(mm, offset, limit)
+        if found_offset is None:
+            break
+        if found >= key:
+            return found_offset
+        offset = mm.find(b"\n", found_offset) + 1
+    return answer
+
+
+def search_file(path, start_key, end_key, line_filter=None, index=None):
+    """Yield lines of one log file with timestamps in [start_key, end_key]"""
+    try:
+        file = open(path, "rb")
+    except FileNotFoundError:
+        return
+    with file:
+        stat = os.fstat(file.fileno())
+        if stat.st_size == 0:
+            return
+        mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            size = len(mm)
+            if index is None:
+                index = LogIndex()
+            if index.update(mm, size, stat.st_ino):
+                index.save()
+            if index.keys and index.keys[0] > end_key:
+                return
+            lo, hi = index.window(start_key, size)
+            offset = seek_time(mm, start_key, lo, hi)
+
+            if line_filter is not None:
+                line_filter.current_level = None
+            while offset < size:
+                end = mm.find(b"\n", offset)
+                if end < 0:
+                    break  # incomplete last line
+                raw = mm[offset:end]
+                offset = end + 1
+                key = line_key(raw)
+                if key is not None and key > end_key:
+                    break
+                line = decode_line(raw)
+                if line_filter is None or line_filter.accept(line):
+                    yield line
+        finally:
+            mm.close()
+
+
+def log_files(path):
+    """The log and its rotated backups, oldest first"""
+    backups = [candidate for candidate in glob.glob(glob.escape(path) + ".*")
+               if not candidate.endswith((INDEX_SUFFIX, INDEX_SUFFIX + ".tmp"))]
+    backups.sort(key=lambda candidate: os.path.getmtime(candidate))
+    return backups + [path]
+
+
+def search_logs(path, since, until, query=None, include_rotated=True):
+    """Yield log lines between two times ("02:00", "2024-01-01 02:15", ...)
+
+    `query` filters by level and/or text as in the live log view, e.g.
+    "error" or "warning timeout". The live log keeps a persisted index in
+    a side file; rotated backups are indexed on the fly.
+    """
+    start_key = parse_time_bound(since)
+    end_key = parse_time_bound(until, is_end=True)
+    line_filter = LineFilter.parse(query)
+    files = log_files(path) if include_rotated else [path]
+    for file_path in files:
+        index = LogIndex(path + INDEX_SUFFIX) if file_path == path else None
+        for line in search_file(file_path, start_key, end_key, line_filter, index):
+            yield line
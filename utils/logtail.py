@@ -0,0 +1,248 @@
+"""Native log tail and follower for AtlasPi
+
+Replaces the `tail -f` subprocess. The last lines are found by reading
+the file backwards in blocks, so the cost depends on how much is shown,
+not on the size of the log. Following polls for appended data with a
+backoff while the log is quiet, and reopens the file when it is rotated
+or truncated. Lines can be filtered by minimum level and by substring.
+"""
+
+import os
+import re
+import time
+
+TAIL_BLOCK_SIZE = 64 * 1024
+READ_CHUNK = 64 * 1024
+
+# Follow polling backs off from the first value to the second while idle
+FOLLOW_POLL_SECONDS = 0.1
+FOLLOW_MAX_POLL_SECONDS = 1.0
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40, "CRITICAL": 50}
+LEVEL_ALIASES = {"WARN": "WARNING", "ERR": "ERROR", "FATAL": "CRITICAL"}
+
+_JSON_LEVEL = re.compile(r'"level":\s*"(\w+)"')
+
+
+def line_level(line):
+    """Level name of a log line, or None for continuation lines (tracebacks)"""
+    if line.startswith("{"):
+        match = _JSON_LEVEL.search(line)
+        level = match.group(1) if match else None
+    else:
+        # "2024-01-01 08:00:00,123 - INFO - message"
+        parts = line.split(" - ", 2)
+        level = parts[1] if len(parts) == 3 else None
+    return level if level in LEVELS else None
+
+
+def parse_level_name(text):
+    """Normalise a level name ("warn", "Error") or return None if unknown"""
+    name = text.strip().upper()
+    name = LEVEL_ALIASES.get(name, name)
+    return name if name in LEVELS else None
+
+
+class LineFilter:
+    """Minimum-level and substring filter for log lines
+
+    Continuation lines (such as traceback lines) take the level of the
+    entry they belong to.
+    """
+
+    def __init__(self, level=None, text=None, ignore_case=True):
+        self.min_level = LEVELS[parse_level_name(level)] if level else None
+        self.ignore_case = ignore_case
+        self.text = text.lower() if text and ignore_case else text
+        self.current_level = None
+
+    @classmethod
+    def parse(cls, query):
+        """Build a filter from "level text", e.g. "error timeout" or "connection refused"
+
+        A leading word naming a level sets the minimum level; the rest is
+        matched as a substring. Returns None for an empty query.
+        """
+        query = (query or "").strip()
+        if not query:
+            return None
+        first, _, rest = query.partition(" ")
+        if parse_level_name(first):
+            return cls(first, rest.strip() or None)
+        return cls(None, query)
+
+    def level_ok(self, level):
+        if self.min_level is None:
+            return True
+        return level is not None and LEVELS[level] >= self.min_level
+
+    def text_ok(self, line):
+        if not self.text:
+            return True
+        return self.text in (line.lower() if self.ignore_case else line)
+
+    def accept(self, line):
+        """Check the next line in file order"""
+        level = line_level(line)
+        if level is None:
+            level = self.current_level
+        else:
+            self.current_level = level
+        return self.level_ok(level) and self.text_ok(line)
+
+
+def iter_lines_backward(file, end, block_size=TAIL_BLOCK_SIZE):
+    """Yield the lines of a binary file before offset `end`, last line first"""
+    position = end
+    remainder = b""
+    while position > 0:
+        size = min(block_size, position)
+        position -= size
+        file.seek(position)
+        block = file.read(size) + remainder
+        lines = block.split(b"\n")
+        if position + size == end and lines[-1] == b"":
+            lines.pop()  # the file's final newline ends a line, not starts one
+        # The first piece may be the tail of a line that started earlier
+        remainder = lines.pop(0) if lines else b""
+        for line in reversed(lines):
+            yield decode_line(line)
+    if remainder:
+        yield decode_line(remainder)
+
+
+def decode_line(raw):
+    return raw.rstrip(b"\r").decode("utf-8", errors="replace")
+
+
+def tail_lines(file, end, count, line_filter=None, block_size=TAIL_BLOCK_SIZE):
+    """Return up to `count` lines ending at offset `end` that pass the filter"""
+    if count <= 0:
+        return []
+    matched = []
+    pending = []  # continuation lines waiting for their entry's first line
+    for line in iter_lines_backward(file, end, block_size):
+        if line_filter is None:
+            matched.append(line)
+        else:
+            level = line_level(line)
+            if level is None:
+                pending.append(line)
+                continue
+            if line_filter.current_level is None:
+                # The newest entry decides how following continuation lines are treated
+                line_filter.current_level = level
+            if line_filter.level_ok(level):
+                matched.extend(entry_line for entry_line in pending if line_filter.text_ok(entry_line))
+                if line_filter.text_ok(line):
+                    matched.append(line)
+            pending = []
+        if len(matched) >= count:
+            break
+    else:
+        # Lines before the first entry in the file have no known level
+        if line_filter is not None and line_filter.min_level is None:
+            matched.extend(line for line in pending if line_filter.text_ok(line))
+    matched = matched[:count]
+    matched.reverse()
+    return matched
+
+
+class LogFollower:
+    """Shows the end of a log file and then the lines appended to it"""
+
+    def __init__(self, path, line_filter=None, poll_interval=FOLLOW_POLL_SECONDS,
+                 max_poll_interval=FOLLOW_MAX_POLL_SECONDS):
+        self.path = path
+        self.line_filter = line_filter
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self._file = None
+        self._partial = b""
+
+    def _open(self, at_end):
+        self.close()
+        self._file = open(self.path, "rb")
+        self._partial = b""
+        if at_end:
+            self._file.seek(0, os.SEEK_END)
+
+    def tail(self, count):
+        """Return the last `count` complete lines and start following after them"""
+        self._open(at_end=True)
+        end = self._file.tell()
+        # Start after the last newline so a line still being written is
+        # shown whole once it is finished
+        if end:
+            self._file.seek(max(0, end - TAIL_BLOCK_SIZE))
+            block = self._file.read(end - self._file.tell())
+            newline = block.rfind(b"\n")
+            end = end - len(block) + newline + 1 if newline >= 0 else end - len(block)
+        lines = tail_lines(self._file, end, count, self.line_filter)
+        self._file.seek(end)
+        return lines
+
+    def read_new(self):
+        """Return complete lines appended since the last call
+
+        Handles rotation (the path now names a new file) by finishing the
+        old file first, and truncation by starting again from the top.
+        """
+        if self._file is None:
+            try:
+                self._open(at_end=False)
+            except FileNotFoundError:
+                return []
+
+        lines = self._drain()
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return lines  # rotated away; the new file has not appeared yet
+        current = os.fstat(self._file.fileno())
+        if (stat.st_ino, stat.st_dev) != (current.st_ino, current.st_dev):
+            self._open(at_end=False)
+            lines.extend(self._drain())
+        elif stat.st_size < self._file.tell():
+            self._file.seek(0)
+            self._partial = b""
+            lines.extend(self._drain())
+        return lines
+
+    def _drain(self):
+        chunks = [self._partial]
+        while True:
+            chunk = self._file.read(READ_CHUNK)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        data = b"".join(chunks)
+        if not data:
+            return []
+        pieces = data.split(b"\n")
+        self._partial = pieces.pop()
+        lines = [decode_line(piece) for piece in pieces]
+        if self.line_filter is not None:
+            lines = [line for line in lines if self.line_filter.accept(line)]
+        return lines
+
+    def follow(self, stop_event=None):
+        """Yield new lines as they are written until `stop_event` is set"""
+        delay = self.poll_interval
+        while stop_event is None or not stop_event.is_set():
+            lines = self.read_new()
+            if lines:
+                delay = self.poll_interval
+                for line in lines:
+                    yield line
+                continue
+            if stop_event is not None:
+                stop_event.wait(delay)
+            else:
+                time.sleep(delay)
+            delay = min(delay * 2, self.max_poll_interval)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
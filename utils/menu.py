@@ -2,14 +2,20 @@
 
 import os
 import sys
-import subprocess
 import logging
 import threading
 import time
+import sqlite3
 from utils.config import get_config_paths
 from utils.config import load_config
-from utils.database import initialize_database
+from utils.database import initialize_database, close_connections, database_files
 from utils.app import run_application_loop
+from utils.workers import run_worker_pool, get_worker_settings
+from utils.metrics import get_metrics
+from utils.history import history_report
+from utils.logging_config import get_log_path
+from utils.logtail import LineFilter, LogFollower
+from utils.logsearch import search_logs, INDEX_SUFFIX
 from utils.common import strings
 
 # Global service state
@@ -17,6 +23,16 @@ service_thread = None
 service_running = False
 stop_service_flag = threading.Event()
 
+# Profiling mode for the service thread (None = off), see utils/profiling.py
+profile_mode = None
+
+# Lines of history shown before following the log
+LOG_TAIL_LINES = 50
+
+# Execution history shown by "Show stats": the window and the most tasks listed
+HISTORY_REPORT_SECONDS = 24 * 3600
+HISTORY_REPORT_TASKS = 20
+
 
 def show_menu(debug_mode=False):
     """Display the main menu options"""
@@ -26,9 +42,12 @@ def show_menu(debug_mode=False):
         print(strings.MENU_SERVICE_RUNNING)
         print(f"1. {strings.MENU_STOP_SERVICE}")
         print(f"2. {strings.MENU_VIEW_LOGS}")
-        print(f"3. {strings.MENU_EXIT}")
+        print(f"3. {strings.MENU_SHOW_STATS}")
+        print(f"4. {strings.MENU_EXIT}")
         if debug_mode:
-            print(f"4. {strings.MENU_CLEAR_FILES}")
+            print(f"5. {strings.MENU_CLEAR_FILES}")
+            print(f"6. {strings.MENU_SEARCH_LOGS}")
+            print(f"7. {strings.MENU_PROFILING.format(profile_mode or 'off')}")
     else:
         print(strings.MENU_SERVICE_STOPPED)
         print(f"1. {strings.MENU_START_SERVICE}")
@@ -36,6 +55,8 @@ def show_menu(debug_mode=False):
         if debug_mode:
             print(f"3. {strings.MENU_VIEW_LOGS}")
             print(f"4. {strings.MENU_CLEAR_FILES}")
+            print(f"5. {strings.MENU_SEARCH_LOGS}")
+            print(f"6. {strings.MENU_PROFILING.format(profile_mode or 'off')}")
     
     print("="*50)
 
@@ -44,9 +65,9 @@ def get_user_choice(debug_mode=False):
     global service_running
     
     if service_running:
-        max_option = 4 if debug_mode else 3
+        max_option = 7 if debug_mode else 4
     else:
-        max_option = 4 if debug_mode else 2
+        max_option = 6 if debug_mode else 2
     
     while True:
         try:
@@ -61,9 +82,9 @@ def get_user_choice(debug_mode=False):
 
 
 def view_live_logs():
-    """View live logs with tail -f, allow return to menu"""
+    """Show the end of the log and follow it, allow return to menu"""
     paths = get_config_paths()
-    log_file = paths['log_path']
+    log_file = get_log_path() or paths['log_path']
     
     if not os.path.exists(log_file):
         print(f"\n{strings.LOG_FILE_NOT_FOUND.format(log_file)}")
@@ -71,54 +92,97 @@ def view_live_logs():
         input(strings.PRESS_ENTER_CONTINUE)
         return
     
+    try:
+        line_filter = LineFilter.parse(input(strings.LOG_FILTER_PROMPT))
+    except (KeyboardInterrupt, EOFError):
+        return
+    
     print(f"\n{strings.VIEWING_LIVE_LOGS.format(log_file)}")
     print(f"{strings.PRESS_CTRL_C_RETURN}\n")
     
+    follower = LogFollower(log_file, line_filter)
     try:
-        # Use subprocess to run tail -f
-        process = subprocess.Popen(
-            ['tail', '-f', log_file],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            bufsize=1,
-            universal_newlines=True
-        )
-        
-        # Read and display output until interrupted
-        while True:
-            output = process.stdout.readline()
-            if output:
-                print(output.rstrip())
-            elif process.poll() is not None:
-                break
-                
+        for line in follower.tail(LOG_TAIL_LINES):
+            print(line)
+        for line in follower.follow():
+            print(line)
     except KeyboardInterrupt:
         print(f"\n\n{strings.RETURNING_TO_MENU}")
-        if process:
-            process.terminate()
-            process.wait()
-    except FileNotFoundError:
-        print(strings.TAIL_NOT_FOUND)
-        # Fallback for systems without tail command
-        try:
-            with open(log_file, 'r') as f:
-                # Go to end and read backward
-                f.seek(0, 2)  # Go to end
-                file_size = f.tell()
-                f.seek(max(0, file_size - 1000))  # Read last 1000 chars
-                content = f.read()
-                print(content)
-                input(strings.PRESS_ENTER_CONTINUE)
-        except Exception as e:
-            print(strings.ERROR_READING_LOG.format(e))
-            input(strings.PRESS_ENTER_CONTINUE)
+    except OSError as e:
+        print(strings.ERROR_READING_LOG.format(e))
+        input(strings.PRESS_ENTER_CONTINUE)
+    finally:
+        follower.close()
+
+
+def search_log_range():
+    """Print the log lines between two times, optionally filtered"""
+    paths = get_config_paths()
+    log_file = get_log_path() or paths['log_path']
+    
+    try:
+        since = input(strings.LOG_SEARCH_SINCE_PROMPT)
+        until = input(strings.LOG_SEARCH_UNTIL_PROMPT)
+        query = input(strings.LOG_FILTER_PROMPT)
+    except (KeyboardInterrupt, EOFError):
+        return
+    
+    count = 0
+    try:
+        for line in search_logs(log_file, since, until, query):
+            print(line)
+            count += 1
+    except ValueError as e:
+        print(strings.LOG_SEARCH_BAD_TIME.format(e))
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print(strings.ERROR_READING_LOG.format(e))
+    print(strings.LOG_SEARCH_RESULTS.format(count))
+    input(strings.PRESS_ENTER_CONTINUE)
+
+
+def show_stats():
+    """Print the running service's metrics"""
+    stats = get_metrics().snapshot()
+    print(f"\n{strings.STATS_HEADER}")
+    print(strings.STATS_UPTIME.format(stats["uptime"]))
+    print(strings.STATS_TICKS.format(stats["ticks"], stats["tick_mean"] * 1000, stats["tick_p50"] * 1000,
+                                     stats["tick_p95"] * 1000, stats["tick_p99"] * 1000))
+    print(strings.STATS_DB_TIME.format(stats["db_mean"] * 1000))
+    print(strings.STATS_TASKS.format(stats["evaluated"], stats["fired"], stats["missed"], stats["shed"],
+                                    stats["merged"]))
+    last_tick = stats["last_tick"]
+    if last_tick:
+        print(strings.STATS_LAST_TICK.format(last_tick["duration"] * 1000, last_tick["evaluated"],
+                                             last_tick["fired"], last_tick["db_seconds"] * 1000))
+    for name, value in sorted(stats["gauges"].items()):
+        print(strings.STATS_GAUGE.format(name.replace("_", " ").capitalize() + ":", value))
+    if stats["actions"]:
+        print(strings.STATS_ACTIONS_HEADER)
+        for action, action_stats in stats["actions"].items():
+            print(strings.STATS_ACTION.format(action, action_stats["runs"], action_stats["failures"],
+                                              action_stats["mean"] * 1000, action_stats["p95"] * 1000))
+    try:
+        report = history_report(get_config_paths()['db_path'], time.time() - HISTORY_REPORT_SECONDS,
+                                limit=HISTORY_REPORT_TASKS)
+    except sqlite3.Error:
+        report = []  # no history in this database yet
+    if report:
+        print(strings.STATS_HISTORY_HEADER)
+        for name, run_stats in report:
+            print(strings.STATS_HISTORY_TASK.format(name[:30], run_stats.runs, run_stats.ok, run_stats.missed,
+                                                    run_stats.mean_ms(), run_stats.quantile_ms(0.95)))
+    input(strings.PRESS_ENTER_CONTINUE)
 
 
 def clear_debug_files():
     """Clear database and log files"""
     paths = get_config_paths()
-    files_to_remove = [paths['db_path'], paths['log_path']]
+    files_to_remove = database_files(paths['db_path']) + [paths['log_path'], paths['log_path'] + INDEX_SUFFIX]
+    
+    # Release pooled connections so the files can be removed cleanly
+    close_connections()
     
     print(f"\n{strings.CLEARING_DEBUG_FILES}")
     removed_count = 0
@@ -131,14 +195,22 @@ def clear_debug_files():
                 removed_count += 1
             except Exception as e:
                 print(strings.FAILED_TO_REMOVE.format(os.path.basename(file_path), e))
-        else:
+        elif file_path in (paths['db_path'], paths['log_path']):
+            # WAL and log index side files only exist some of the time
             print(strings.FILE_NOT_FOUND.format(os.path.basename(file_path)))
     
     print(f"\n{strings.CLEARED_FILES_COUNT.format(removed_count)}")
     input(strings.PRESS_ENTER_CONTINUE)
 
 
-def start_service_background(db_path, log_path, debug_mode=False):
+def toggle_profiling():
+    """Switch profiling of the service thread on (cProfile) or off"""
+    global profile_mode
+    profile_mode = None if profile_mode else "cprofile"
+    print(strings.PROFILING_TOGGLED.format(profile_mode or "off"))
+
+
+def start_service_background(db_path, log_path, debug_mode=False, config=None, config_path=None):
     """Start the AtlasPi service in a background thread"""
     global service_running, stop_service_flag
     
@@ -147,7 +219,13 @@ def start_service_background(db_path, log_path, debug_mode=False):
         try:
             service_running = True
             logging.info(strings.APP_STARTING)
-            run_application_loop(db_path, log_path, debug_mode, stop_service_flag)
+            if get_worker_settings(config)["processes"]:
+                if profile_mode:
+                    logging.warning(strings.PROFILE_WORKERS_UNSUPPORTED)
+                run_worker_pool(db_path, log_path, debug_mode, stop_service_flag, config, config_path)
+            else:
+                run_application_loop(db_path, log_path, debug_mode, stop_service_flag, config, config_path,
+                                     profile=profile_mode)
         except Exception as e:
             logging.error(f"Service error: {e}")
         finally:
@@ -160,13 +238,20 @@ def start_service_background(db_path, log_path, debug_mode=False):
 
 
 def stop_service_background():
-    """Stop the background AtlasPi service"""
+    """Stop the background AtlasPi service and wait for its thread to exit"""
     global service_thread, service_running, stop_service_flag
     
     if service_running and service_thread:
         print(f"\n{strings.STOPPING_SERVICE}")
         stop_service_flag.set()
+        # The loop drains running actions and flushes buffered task runs on
+        # its way out. Wait for all of it: a restart clears the stop flag,
+        # which would leave the old loop running next to the new one.
         service_thread.join(timeout=5)
+        if service_thread.is_alive():
+            logging.warning(strings.SERVICE_STOP_SLOW)
+            print(strings.SERVICE_STOP_SLOW)
+            service_thread.join()
         service_running = False
         print(strings.SERVICE_STOPPED)
         time.sleep(1)
@@ -174,9 +259,10 @@ def stop_service_background():
         print(strings.SERVICE_NOT_RUNNING)
 
 
-def run_interactive_menu(debug_mode=False):
-    """Run the interactive menu system"""
-    global service_thread, service_running
+def run_interactive_menu(debug_mode=False, profile=None):
+    """Run the interactive menu system; `profile` starts with profiling on"""
+    global service_thread, service_running, profile_mode
+    profile_mode = profile
     
     # Initialize paths and config here since we're not exiting to setup.py
     paths = get_config_paths()
@@ -195,8 +281,11 @@ def run_interactive_menu(debug_mode=False):
                 # Service is stopped
                 if choice == 1:  # Start service
                     print(f"\n{strings.STARTING_SERVICE_BG}")
+                    # Re-read so edits made while stopped are picked up too
+                    config = load_config(paths['config_path'])
                     initialize_database(paths['db_path'], config)
-                    service_thread = start_service_background(paths['db_path'], paths['log_path'], debug_mode)
+                    service_thread = start_service_background(paths['db_path'], paths['log_path'], debug_mode,
+                                                              config, paths['config_path'])
                     time.sleep(1)  # Give service time to start
                     print(strings.SERVICE_STARTED)
                     
@@ -209,6 +298,12 @@ def run_interactive_menu(debug_mode=False):
                 elif choice == 4 and debug_mode:  # Clear files
                     clear_debug_files()
                     
+                elif choice == 5 and debug_mode:  # Search logs
+                    search_log_range()
+                    
+                elif choice == 6 and debug_mode:  # Profiling on/off
+                    toggle_profiling()
+                    
             else:
                 # Service is running
                 if choice == 1:  # Stop service
@@ -217,14 +312,28 @@ def run_interactive_menu(debug_mode=False):
                 elif choice == 2:  # View logs
                     view_live_logs()
                     
-                elif choice == 3:  # Exit
+                elif choice == 3:  # Show stats
+                    show_stats()
+                    
+                elif choice == 4:  # Exit
                     stop_service_background()
                     break
                     
-                elif choice == 4 and debug_mode:  # Clear files (stop service first)
+                elif choice == 5 and debug_mode:  # Clear files (stop service first)
                     stop_service_background()
                     clear_debug_files()
                     
+                elif choice == 6 and debug_mode:  # Search logs
+                    search_log_range()
+                    
+                elif choice == 7 and debug_mode:  # Profiling on/off: restart the service with it
+                    stop_service_background()
+                    toggle_profiling()
+                    service_thread = start_service_background(paths['db_path'], paths['log_path'], debug_mode,
+                                                              config, paths['config_path'])
+                    time.sleep(1)
+                    print(strings.SERVICE_STARTED)
+                    
     except KeyboardInterrupt:
         print(f"\n{strings.SHUTTING_DOWN}")
         if service_running:
@@ -0,0 +1,326 @@
+"""In-process metrics for AtlasPi
+
+Counters and fixed-bucket histograms that are cheap enough to leave on:
+recording a tick is a few attribute updates and a bisect, and action
+latencies take one short lock. Metrics can be read as a snapshot (the
+menu) or as Prometheus text from an optional localhost HTTP endpoint.
+"""
+
+import time
+import bisect
+import logging
+import threading
+from utils.common import strings
+from utils.config import get_service_settings
+
+DEFAULT_METRICS_SETTINGS = {
+    "http_enabled": False,
+    "http_host": "127.0.0.1",
+    "http_port": 9464,
+}
+
+# Histogram upper bounds in seconds (Prometheus "le" buckets)
+TICK_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ACTION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is O(log buckets)"""
+
+    __slots__ = ("bounds", "counts", "total", "count", "_lock")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.total += value
+            self.count += 1
+
+    def snapshot(self):
+        """Return (bucket counts, sum, count) read consistently"""
+        with self._lock:
+            return list(self.counts), self.total, self.count
+
+    def quantile(self, fraction):
+        """Estimate a quantile by interpolating within its bucket"""
+        counts, _, count = self.snapshot()
+        if not count:
+            return 0.0
+        rank = fraction * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if seen + bucket_count >= rank and bucket_count:
+                low = self.bounds[index - 1] if index > 0 else 0.0
+                if index == len(self.bounds):
+                    return low  # beyond the last bound
+                return low + (self.bounds[index] - low) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.bounds[-1]
+
+
+class DbTimer:
+    """Context manager adding elapsed time to the current tick's DB time"""
+
+    __slots__ = ("metrics", "_started")
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self._started = 0.0
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.tick_db_seconds += time.perf_counter() - self._started
+        return False
+
+
+class ActionStats:
+    """Runs, failures and latency for one action"""
+
+    __slots__ = ("latency", "failures")
+
+    def __init__(self):
+        self.latency = Histogram(ACTION_BUCKETS)
+        self.failures = 0
+
+
+class Metrics:
+    """Service metrics: loop ticks, task counts, DB time and action latency
+
+    Tick fields are written by the service loop thread only; action stats
+    are recorded from executor threads.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.tick_seconds = Histogram(TICK_BUCKETS)
+        self.tick_db = Histogram(TICK_BUCKETS)
+        self.db_time = DbTimer(self)
+        self.tasks_evaluated = 0
+        self.tasks_fired = 0
+        self.tasks_missed = 0
+        self.tasks_shed = 0
+        self.tasks_merged = 0
+        self.tick_db_seconds = 0.0
+        self.last_tick = None
+        self.gauges = {}
+        self._actions = {}
+        self._actions_lock = threading.Lock()
+        self._tick_started = None
+        self._tick_counts = (0, 0)
+
+    def begin_tick(self):
+        self._tick_started = time.perf_counter()
+        self._tick_counts = (self.tasks_evaluated, self.tasks_fired)
+        self.tick_db_seconds = 0.0
+
+    def end_tick(self):
+        if self._tick_started is None:
+            return
+        duration = time.perf_counter() - self._tick_started
+        self._tick_started = None
+        self.tick_seconds.observe(duration)
+        self.tick_db.observe(self.tick_db_seconds)
+        evaluated, fired = self._tick_counts
+        self.last_tick = {
+            "duration": duration,
+            "evaluated": self.tasks_evaluated - evaluated,
+            "fired": self.tasks_fired - fired,
+            "db_seconds": self.tick_db_seconds,
+        }
+
+    def observe_action(self, action, ok, duration):
+        """Record one finished action run (called from executor threads)"""
+        stats = self._actions.get(action)
+        if stats is None:
+            with self._actions_lock:
+                stats = self._actions.setdefault(action, ActionStats())
+        stats.latency.observe(duration)
+        if not ok:
+            with self._actions_lock:
+                stats.failures += 1
+
+    def snapshot(self):
+        """Plain-dict view for display"""
+        actions = {}
+        with self._actions_lock:
+            items = sorted(self._actions.items())
+        for action, stats in items:
+            _, total, count = stats.latency.snapshot()
+            actions[action] = {
+                "runs": count,
+                "failures": stats.failures,
+                "mean": total / count if count else 0.0,
+                "p95": stats.latency.quantile(0.95),
+            }
+        _, tick_total, ticks = self.tick_seconds.snapshot()
+        _, db_total, _ = self.tick_db.snapshot()
+        return {
+            "uptime": time.time() - self.started,
+            "ticks": ticks,
+            "tick_mean": tick_total / ticks if ticks else 0.0,
+            "tick_p50": self.tick_seconds.quantile(0.50),
+            "tick_p95": self.tick_seconds.quantile(0.95),
+            "tick_p99": self.tick_seconds.quantile(0.99),
+            "db_mean": db_total / ticks if ticks else 0.0,
+            "evaluated": self.tasks_evaluated,
+            "fired": self.tasks_fired,
+            "missed": self.tasks_missed,
+            "shed": self.tasks_shed,
+            "merged": self.tasks_merged,
+            "last_tick": self.last_tick,
+            "gauges": dict(self.gauges),
+            "actions": actions,
+        }
+
+    def render_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        write_counter(lines, "atlas_tasks_evaluated_total", "Due tasks taken off the schedule",
+                      self.tasks_evaluated)
+        write_counter(lines, "atlas_tasks_fired_total", "Task runs started", self.tasks_fired)
+        write_counter(lines, "atlas_tasks_missed_total", "Task runs skipped as too late", self.tasks_missed)
+        write_counter(lines, "atlas_tasks_shed_total", "Task runs dropped by the dispatch queue", self.tasks_shed)
+        write_counter(lines, "atlas_tasks_merged_total", "Task runs merged into a run still waiting",
+                      self.tasks_merged)
+        write_histogram(lines, "atlas_tick_seconds", "Service loop tick duration", self.tick_seconds)
+        write_histogram(lines, "atlas_tick_db_seconds", "Database time per service loop tick", self.tick_db)
+
+        with self._actions_lock:
+            actions = sorted(self._actions.items())
+        if actions:
+            lines.append("# HELP atlas_action_duration_seconds Task action execution time")
+            lines.append("# TYPE atlas_action_duration_seconds histogram")
+            for action, stats in actions:
+                write_histogram_samples(lines, "atlas_action_duration_seconds", stats.latency,
+                                        f'action="{escape_label(action)}"')
+            lines.append("# HELP atlas_action_failures_total Task action runs that failed")
+            lines.append("# TYPE atlas_action_failures_total counter")
+            for action, stats in actions:
+                lines.append(f'atlas_action_failures_total{{action="{escape_label(action)}"}} {stats.failures}')
+
+        for name, value in sorted(self.gauges.items()):
+            lines.append(f"# TYPE atlas_{name} gauge")
+            lines.append(f"atlas_{name} {value}")
+        lines.append("# TYPE atlas_uptime_seconds gauge")
+        lines.append(f"atlas_uptime_seconds {time.time() - self.started:.3f}")
+        return "\n".join(lines) + "\n"
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def write_counter(lines, name, help_text, value):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} counter")
+    lines.append(f"{name} {value}")
+
+
+def write_histogram(lines, name, help_text, histogram):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    write_histogram_samples(lines, name, histogram)
+
+
+def write_histogram_samples(lines, name, histogram, labels=""):
+    counts, total, count = histogram.snapshot()
+    prefix = labels + "," if labels else ""
+    cumulative = 0
+    for bound, bucket_count in zip(histogram.bounds, counts):
+        cumulative += bucket_count
+        lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {count}')
+    suffix = "{" + labels + "}" if labels else ""
+    lines.append(f"{name}_sum{suffix} {total}")
+    lines.append(f"{name}_count{suffix} {count}")
+
+
+class MetricsServer:
+    """Serves /metrics in Prometheus format from a daemon thread"""
+
+    def __init__(self, metrics, host="127.0.0.1", port=9464):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        # Imported here: http.server is slow to load and the endpoint is off by default
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # keep scrapes out of the service log
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="atlas-metrics", daemon=True)
+        self._thread.start()
+        logging.info(strings.METRICS_SERVING.format(self.host, self.port))
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join(timeout=1)
+            self._server = None
+
+
+# Shared metrics for the service loop, executor callbacks and the menu
+_metrics = Metrics()
+
+
+def get_metrics():
+    """Return the shared Metrics instance"""
+    return _metrics
+
+
+def reset_metrics():
+    """Start a fresh set of metrics (e.g. when the service starts)"""
+    global _metrics
+    _metrics = Metrics()
+    return _metrics
+
+
+def get_metrics_settings(config):
+    """Return metrics settings from the app config"""
+    return get_service_settings(config, "metrics", DEFAULT_METRICS_SETTINGS)
+
+
+def start_metrics_server(config, metrics=None):
+    """Start the /metrics endpoint if enabled in the config; returns it or None"""
+    settings = get_metrics_settings(config)
+    if not settings["http_enabled"]:
+        return None
+    try:
+        return MetricsServer(metrics or get_metrics(), settings["http_host"], settings["http_port"]).start()
+    except OSError as e:
+        logging.error(strings.METRICS_SERVER_ERROR.format(settings["http_host"], settings["http_port"], e))
+        return None
@@ -0,0 +1,246 @@
+"""Profiling mode for the AtlasPi service thread
+
+Started with `setup.py --profile` or from the debug menu, and only
+imported then, so a service without profiling pays nothing. The service
+thread runs under cProfile ("cprofile") or is sampled from a background
+thread ("sampling"). Every `interval_seconds` the profile and a
+tracemalloc snapshot are written to files, and the newest `keep` of each
+kind are kept:
+
+    profile-<stamp>.pstats    python -m pstats, snakeviz
+    samples-<stamp>.folded    collapsed stacks: speedscope, flamegraph.pl
+    memory-<stamp>.tracemalloc    tracemalloc.Snapshot.load()
+
+A tick slower than `slow_tick_ms` is caught while it runs: its stack is
+sampled until it ends, and a slow-tick-<stamp>.txt report holds the
+samples and the tick's timing breakdown.
+"""
+
+import os
+import sys
+import time
+import cProfile
+import logging
+import threading
+import tracemalloc
+from collections import Counter
+from utils.common import strings
+from utils.config import get_service_settings
+
+DEFAULT_PROFILING_SETTINGS = {
+    "directory": "profiles",   # relative to the database's directory
+    "interval_seconds": 300,   # how often profiles and snapshots are written
+    "sample_seconds": 0.01,    # stack sampling period
+    "slow_tick_ms": 250,       # ticks slower than this are reported
+    "tracemalloc_frames": 10,  # 0 turns memory snapshots off
+    "keep": 10,                # files kept of each kind
+}
+
+MODE_CPROFILE = "cprofile"
+MODE_SAMPLING = "sampling"
+PROFILE_MODES = (MODE_CPROFILE, MODE_SAMPLING)
+
+# Most distinct stacks listed in a slow-tick report, and allocation sites
+# logged with each memory snapshot
+SLOW_TICK_STACKS = 5
+MEMORY_TOP_LINES = 3
+
+TIMESTAMP_FORMAT = "%Y%m%d-%H%M%S"
+
+
+def get_profiling_settings(config):
+    """Return profiling settings from the app config"""
+    return get_service_settings(config, "profiling", DEFAULT_PROFILING_SETTINGS)
+
+
+def profile_directory(db_path, settings):
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), settings["directory"])
+
+
+def collapse_stack(frame):
+    """A frame's stack, root first, as one collapsed-stack line"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    names.reverse()
+    return ";".join(names)
+
+
+def rotate_files(directory, prefix, keep):
+    """Delete all but the newest `keep` files named `prefix`<stamp>..."""
+    try:
+        names = sorted(name for name in os.listdir(directory) if name.startswith(prefix))
+    except FileNotFoundError:
+        return
+    for name in names[:-keep] if keep else ():
+        os.remove(os.path.join(directory, name))
+
+
+class ServiceProfiler:
+    """Profiles the thread that calls start() until stop()
+
+    The service loop calls begin_tick() and end_tick() around each tick.
+    """
+
+    def __init__(self, mode, directory, settings=None):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"unknown profile mode {mode!r}")
+        self.mode = mode
+        self.directory = directory
+        self.settings = settings or DEFAULT_PROFILING_SETTINGS
+        self.slow_tick_seconds = self.settings["slow_tick_ms"] / 1000
+        self.thread_id = None
+        self._profile = None
+        self._samples = Counter()   # sampling mode: stack -> samples
+        self._slow = Counter()      # samples of the tick in progress past the threshold
+        self._snapshot = None
+        self._tick_started = None
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._monitor = None
+        self._next_dump = None
+        self.slow_ticks = 0
+
+    def start(self):
+        """Start profiling the calling thread"""
+        os.makedirs(self.directory, exist_ok=True)
+        self.thread_id = threading.get_ident()
+        if self.settings["tracemalloc_frames"] and not tracemalloc.is_tracing():
+            tracemalloc.start(self.settings["tracemalloc_frames"])
+        if self.mode == MODE_CPROFILE:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        self._monitor = threading.Thread(target=self._watch, name="atlas-profiler", daemon=True)
+        self._monitor.start()
+        self._next_dump = time.monotonic() + self.settings["interval_seconds"]
+        logging.info(strings.PROFILE_STARTED.format(self.mode, self.directory))
+
+    def stop(self):
+        """Write the last profile and stop; call from the profiled thread"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._monitor is not None:
+            self._monitor.join()
+        self.dump()
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._snapshot = None
+
+    def begin_tick(self):
+        with self._cond:
+            self._tick_started = time.perf_counter()
+            self._slow = Counter()
+            self._cond.notify_all()
+
+    def end_tick(self, breakdown=None):
+        """Report the tick if it was slow, and write files when due
+
+        `breakdown` is the tick's timing dict from Metrics.last_tick.
+        """
+        with self._cond:
+            started, self._tick_started = self._tick_started, None
+            slow = self._slow
+        if started is not None:
+            duration = time.perf_counter() - started
+            if duration >= self.slow_tick_seconds:
+                self._report_slow_tick(duration, breakdown, slow)
+        if time.monotonic() >= self._next_dump:
+            self.dump()
+
+    def dump(self):
+        """Write the profile and memory snapshot collected so far"""
+        self._next_dump = time.monotonic() + self.settings["interval_seconds"]
+        stamp = self._stamp()
+        keep = self.settings["keep"]
+        if self._profile is not None:
+            # Each file covers one interval: a new profiler takes over
+            profile, self._profile = self._profile, cProfile.Profile()
+            profile.disable()
+            profile.dump_stats(os.path.join(self.directory, f"profile-{stamp}.pstats"))
+            self._profile.enable()
+            rotate_files(self.directory, "profile-", keep)
+        if self.mode == MODE_SAMPLING:
+            with self._cond:
+                samples, self._samples = self._samples, Counter()
+            with open(os.path.join(self.directory, f"samples-{stamp}.folded"), "w") as file:
+                for stack, count in samples.most_common():
+                    file.write(f"{stack} {count}\n")
+            rotate_files(self.directory, "samples-", keep)
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot().filter_traces(
+                (tracemalloc.Filter(False, tracemalloc.__file__),))
+            snapshot.dump(os.path.join(self.directory, f"memory-{stamp}.tracemalloc"))
+            rotate_files(self.directory, "memory-", keep)
+            if self._snapshot is not None:
+                for stat in snapshot.compare_to(self._snapshot, "lineno")[:MEMORY_TOP_LINES]:
+                    logging.info(strings.PROFILE_MEMORY_GROWTH.format(stat))
+            self._snapshot = snapshot
+        logging.info(strings.PROFILE_WRITTEN.format(self.directory, stamp))
+
+    def _report_slow_tick(self, duration, breakdown, slow):
+        self.slow_ticks += 1
+        path = os.path.join(self.directory, f"slow-tick-{self._stamp()}.txt")
+        lines = [strings.PROFILE_SLOW_TICK_HEADER.format(duration * 1000, self.settings["slow_tick_ms"])]
+        if breakdown:
+            lines.append(strings.PROFILE_SLOW_TICK_BREAKDOWN.format(
+                breakdown["evaluated"], breakdown["fired"], breakdown["db_seconds"] * 1000))
+        total = sum(slow.values())
+        lines.append(strings.PROFILE_SLOW_TICK_SAMPLES.format(total, self.settings["sample_seconds"] * 1000))
+        for stack, count in slow.most_common(SLOW_TICK_STACKS):
+            lines.append(f"\n{count} samples ({count * 100 / total:.0f}%):")
+            lines.extend(f"  {name}" for name in stack.split(";"))
+        with open(path, "w") as file:
+            file.write("\n".join(lines) + "\n")
+        rotate_files(self.directory, "slow-tick-", self.settings["keep"])
+        logging.warning(strings.PROFILE_SLOW_TICK.format(duration * 1000, path))
+
+    def _watch(self):
+        # Samples the profiled thread: all the time in sampling mode, and
+        # in both modes while a tick runs past the slow-tick threshold
+        sampling = self.mode == MODE_SAMPLING
+        period = self.settings["sample_seconds"]
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                started = self._tick_started
+                if not sampling:
+                    if started is None:
+                        self._cond.wait()
+                        continue
+                    remaining = started + self.slow_tick_seconds - time.perf_counter()
+                    if remaining > 0:
+                        self._cond.wait(remaining)
+                        continue
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                stack = collapse_stack(frame)
+                del frame
+                with self._cond:
+                    if sampling:
+                        self._samples[stack] += 1
+                    started = self._tick_started
+                    if started is not None and time.perf_counter() - started >= self.slow_tick_seconds:
+                        self._slow[stack] += 1
+            with self._cond:
+                if not self._stopped:
+                    self._cond.wait(period)
+
+    @staticmethod
+    def _stamp():
+        now = time.time()
+        return time.strftime(TIMESTAMP_FORMAT, time.localtime(now)) + f"-{int(now * 1000) % 1000:03d}"
+
+
+def start_profiler(mode, db_path, config=None):
+    """Start profiling the calling thread in `mode`; returns the profiler"""
+    settings = get_profiling_settings(config)
+    profiler = ServiceProfiler(mode, profile_directory(db_path, settings), settings)
+    profiler.start()
+    return profiler
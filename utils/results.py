@@ -0,0 +1,192 @@
+"""Shared action results for AtlasPi
+
+Many tasks can run the same action on the same target (several health
+checks of one endpoint, under different names). For actions that declare
+a `cache_ttl`, the executor asks this cache first: a result younger than
+the TTL is reused, and a run started while an identical one is still in
+flight waits for that run instead of starting its own. Entries are keyed
+by action and normalized target and evicted least recently used first.
+"""
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from urllib.parse import urlsplit, urlunsplit
+from utils.common import strings
+from utils.config import get_service_settings
+
+DEFAULT_RESULT_CACHE_SETTINGS = {
+    "enabled": True,
+    "max_entries": 10000,      # results are small; this bounds memory
+    "log_seconds": 600,        # how often the service logs the cache stats
+}
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def get_result_cache_settings(config):
+    """Return result cache settings from the app config"""
+    return get_service_settings(config, "result_cache", DEFAULT_RESULT_CACHE_SETTINGS)
+
+
+def normalize_target(target):
+    """Canonical form of a target, so equivalent URLs share one entry"""
+    if not isinstance(target, str):
+        return target
+    target = target.strip()
+    parts = urlsplit(target)
+    scheme = parts.scheme.lower()
+    try:
+        port = parts.port
+    except ValueError:
+        return target
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return target
+    host = parts.hostname
+    if ":" in host:
+        host = f"[{host}]"
+    if port and port != DEFAULT_PORTS[scheme]:
+        host = f"{host}:{port}"
+    userinfo = parts.netloc.rpartition("@")[0]
+    netloc = f"{userinfo}@{host}" if userinfo else host
+    return urlunsplit((scheme, netloc, parts.path or "/", parts.query, ""))
+
+
+def _completed(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def _follow(shared):
+    """A Future of its own that completes with `shared`'s outcome"""
+    future = Future()
+    future.set_running_or_notify_cancel()  # like a started run: not cancellable
+
+    def copy(source):
+        if source.cancelled():
+            future.set_result(False)
+        elif source.exception() is not None:
+            future.set_exception(source.exception())
+        else:
+            future.set_result(source.result())
+
+    shared.add_done_callback(copy)
+    return future
+
+
+class ResultCache:
+    """TTL + LRU cache of action results that coalesces identical runs"""
+
+    def __init__(self, max_entries=10000, log_seconds=600):
+        self.max_entries = max_entries
+        self.log_seconds = log_seconds
+        self._entries = OrderedDict()   # key -> (expires, result)
+        self._inflight = {}             # key -> Future shared with followers
+        self._lock = threading.Lock()
+        self._next_log = time.monotonic() + log_seconds
+        self._logged_lookups = 0
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, key):
+        """A Future for `key`'s cached or in-flight result, or None on a miss"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return _completed(entry[1])
+                del self._entries[key]
+            shared = self._inflight.get(key)
+            if shared is not None:
+                self.coalesced += 1
+                return _follow(shared)
+            self.misses += 1
+        return None
+
+    def start(self, key, ttl, run):
+        """Start `run()` (which returns a Future) for a missed `key`
+
+        Its result is kept for `ttl` seconds and handed to runs that look
+        the key up meanwhile. Failed or cancelled runs are not kept.
+        """
+        shared = Future()
+        shared.set_running_or_notify_cancel()
+        with self._lock:
+            self._inflight[key] = shared
+        try:
+            future = run()
+        except BaseException as e:
+            self._finish(key, shared, None, 0)
+            shared.set_exception(e)
+            raise
+        future.add_done_callback(lambda done: self._done(key, shared, done, ttl))
+        return future
+
+    def _done(self, key, shared, future, ttl):
+        if future.cancelled():
+            self._finish(key, shared, None, 0)
+            shared.set_result(False)
+        elif future.exception() is not None:
+            self._finish(key, shared, None, 0)
+            shared.set_exception(future.exception())
+        else:
+            self._finish(key, shared, future.result(), ttl)
+            shared.set_result(future.result())
+
+    def _finish(self, key, shared, result, ttl):
+        with self._lock:
+            if self._inflight.get(key) is shared:
+                del self._inflight[key]
+            if ttl > 0:
+                self._entries[key] = (time.monotonic() + ttl, result)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Counters for logs and metrics"""
+        with self._lock:
+            lookups = self.hits + self.coalesced + self.misses
+            return {
+                "hits": self.hits,
+                "coalesced": self.coalesced,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            }
+
+    def log_stats(self):
+        logging.info(strings.RESULT_CACHE_STATS.format(**self.stats()))
+
+    def log_stats_if_due(self, now=None):
+        """Log the stats every `log_seconds`, if there were lookups since last time"""
+        if now is None:
+            now = time.monotonic()
+        if now < self._next_log:
+            return
+        self._next_log = now + self.log_seconds
+        lookups = self.hits + self.coalesced + self.misses
+        if lookups != self._logged_lookups:
+            self._logged_lookups = lookups
+            self.log_stats()
+
+
+def create_result_cache(config):
+    """A ResultCache from the config, or None when it is disabled"""
+    settings = get_result_cache_settings(config)
+    if not settings["enabled"]:
+        return None
+    return ResultCache(settings["max_entries"], settings["log_seconds"])
@@ -0,0 +1,175 @@
+"""Next-fire-time scheduler for AtlasPi"""
+
+import heapq
+import logging
+import itertools
+from datetime import datetime
+from utils.common import strings
+from utils.conditions import compile_condition
+
+# How late a run may start and still count. Newly scheduled tasks may fire
+# this far in the past, matching the old behaviour where a "time" task fired
+# anywhere in its minute; later runs follow the task's misfire policy.
+MISFIRE_GRACE_SECONDS = 60
+
+# What happens to a run that is later than the grace period (see
+# utils/dispatch.py): dropped, run once, or run with the occurrences
+# missed since, up to a limit
+MISFIRE_SKIP = "skip"
+MISFIRE_COALESCE = "coalesce"
+MISFIRE_CATCH_UP = "catch_up"
+MISFIRE_POLICIES = (MISFIRE_SKIP, MISFIRE_COALESCE, MISFIRE_CATCH_UP)
+
+# How far ahead the scheduler loads due tasks from the next_run_at index.
+# Only tasks due inside this window are held in memory.
+SCHEDULE_WINDOW_SECONDS = 60
+
+
+def next_fire_time(after, condition_type, condition_value):
+    """Return the first fire time (epoch seconds) strictly after `after`, or None"""
+    try:
+        condition = compile_condition(condition_type, condition_value)
+    except (TypeError, ValueError):
+        # Unknown or malformed conditions never fire
+        return None
+    return condition.next_fire_time(after)
+
+
+def parse_last_run(last_run):
+    """Convert a stored last_run value into epoch seconds (or None)"""
+    if not last_run:
+        return None
+    try:
+        return datetime.fromisoformat(last_run).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def first_fire_time(task, now):
+    """Initial fire time for a task row that has no next_run_at yet"""
+    name, condition_type, condition_value, last_run = task[1], task[3], task[4], task[6]
+    try:
+        condition = compile_condition(condition_type, condition_value)
+    except (TypeError, ValueError) as e:
+        logging.warning(strings.SCHEDULER_BAD_CONDITION.format(name, e))
+        return None
+
+    after = now - MISFIRE_GRACE_SECONDS
+    last_run_ts = parse_last_run(last_run)
+    if last_run_ts is not None and last_run_ts > after:
+        after = last_run_ts
+    return condition.next_fire_time(after)
+
+
+class TaskScheduler:
+    """Min-heap of (next_fire_time, task) entries for one lookahead window
+
+    The persisted next_run_at index decides which tasks are due soon; this
+    heap turns that window into precise wake-ups. Each task's condition is
+    compiled once when it is added, and only the task that fires is
+    recomputed. Entries are invalidated lazily, so rescheduling or removing
+    a task is O(log n) and never requires a rebuild.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._tasks = {}
+        self._conditions = {}
+        self._deadlines = {}
+        self._counter = itertools.count()
+        self.horizon = None
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def load(self, tasks, now, horizon=None):
+        """Replace the schedule with the given task rows, up to `horizon`"""
+        self._heap = []
+        self._tasks = {}
+        self._conditions = {}
+        self._deadlines = {}
+        self.horizon = horizon
+        for task in tasks:
+            self.add(task, now)
+        return len(self._deadlines)
+
+    def add(self, task, now):
+        """Schedule a task row; returns its next fire time (or None)
+
+        Rows carry next_run_at once scheduled; otherwise the first fire
+        time is derived from the condition and last_run.
+        """
+        task_id = task[0]
+        fire_at = task[8]
+        if fire_at is None:
+            fire_at = first_fire_time(task, now)
+        if fire_at is None:
+            self.remove(task_id)
+            return None
+
+        self._tasks[task_id] = task
+        # Cached, so this is a dict lookup for already-compiled conditions
+        self._conditions[task_id] = compile_condition(task[3], task[4])
+        self._push(task_id, fire_at)
+        return fire_at
+
+    def remove(self, task_id):
+        """Drop a task from the schedule (its heap entry is skipped later)"""
+        self._tasks.pop(task_id, None)
+        self._conditions.pop(task_id, None)
+        self._deadlines.pop(task_id, None)
+
+    def reschedule(self, task_id, fired_at, now=None):
+        """Queue the next occurrence of a task that fired at `fired_at`
+
+        Occurrences that already passed by `now` are coalesced into the one
+        run that just happened. Returns the next fire time (or None).
+        """
+        condition = self._conditions.get(task_id)
+        if condition is None:
+            return None
+        after = fired_at if now is None else max(fired_at, now)
+        fire_at = condition.next_fire_time(after)
+        self._push(task_id, fire_at)
+        return fire_at
+
+    def occurrences(self, task_id, after, until, limit):
+        """Up to `limit` fire times of a task in (after, until]"""
+        condition = self._conditions.get(task_id)
+        fire_times = []
+        while condition is not None and len(fire_times) < limit:
+            after = condition.next_fire_time(after)
+            if after is None or after > until:
+                break
+            fire_times.append(after)
+        return fire_times
+
+    def next_deadline(self):
+        """Return the earliest pending fire time, or None if nothing is scheduled"""
+        heap = self._heap
+        while heap:
+            fire_at, _, task_id = heap[0]
+            if self._deadlines.get(task_id) == fire_at:
+                return fire_at
+            heapq.heappop(heap)  # stale entry
+        return None
+
+    def pop_due(self, now):
+        """Pop every task due at or before `now` as (fire_at, task) pairs"""
+        due = []
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            fire_at, _, task_id = heapq.heappop(heap)
+            if self._deadlines.get(task_id) != fire_at:
+                continue  # stale entry
+            del self._deadlines[task_id]
+            due.append((fire_at, self._tasks[task_id]))
+        return due
+
+    def _push(self, task_id, fire_at):
+        if fire_at is None or (self.horizon is not None and fire_at > self.horizon):
+            # Outside the window: forget it until the index brings it back
+            self.remove(task_id)
+            return
+        self._deadlines[task_id] = fire_at
+        heapq.heappush(self._heap, (fire_at, next(self._counter), task_id))
@@ -0,0 +1,238 @@
+"""Compact in-memory task table for AtlasPi
+
+Holds the active task rows column by column in `array`s, so a million
+tasks cost a few dozen bytes each instead of a tuple, its strings and a
+heap entry apiece. Actions, conditions, targets and misfire policies are
+interned once and stored as integer codes. Rows (in TASK_COLUMNS order)
+are only built for the tasks a caller asks for, such as the ones due.
+
+Due lookups use a calendar queue: each task's slot is filed under the
+BUCKET_SECONDS bucket of its next fire time, so finding the due set only
+reads the buckets up to the deadline and allocates nothing for the rest.
+Entries left behind by rescheduled or removed tasks are dropped when
+their bucket is next read.
+"""
+
+import math
+import bisect
+from array import array
+from datetime import datetime
+
+# Width of a next-fire-time bucket
+BUCKET_SECONDS = 1
+
+# Task ids index a dense array; ids further than this past the largest
+# one seen (hand-inserted rows) are mapped through a dict instead
+MAX_ID_GAP = 1 << 20
+
+NOT_SET = float("nan")
+
+
+class TaskTable:
+    """Active tasks by id, stored in parallel arrays indexed by slot"""
+
+    def __init__(self):
+        self._slot_of = array("i")      # task id -> slot (-1 if absent)
+        self._sparse = {}               # far-off task ids -> slot
+        self._ids = array("q")          # slot -> task id (-1 if free)
+        self._next_run = array("d")     # NaN when not scheduled
+        self._last_run = array("d")     # epoch seconds, NaN if never run
+        self._action = array("I")       # codes into _values
+        self._condition = array("I")    # code of (condition_type, condition_value)
+        self._target = array("I")
+        self._priority = array("i")
+        self._misfire = array("I")
+        self._names = []
+        self._free = array("i")
+        self._values = []               # interned values, by code
+        self._codes = {}
+        self._unscheduled = set()       # task ids without a next fire time
+        self._buckets = {}              # bucket -> array of slots
+        self._keys = []                 # bucket keys, sorted
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, task_id):
+        return self._lookup(task_id) >= 0
+
+    def store(self, row):
+        """Add or replace a task row (in TASK_COLUMNS order)"""
+        task_id = row[0]
+        slot = self._lookup(task_id)
+        if slot < 0:
+            slot = self._allocate(task_id)
+        code = self._code
+        self._names[slot] = row[1]
+        self._action[slot] = code(row[2])
+        self._condition[slot] = code((row[3], row[4]))
+        self._last_run[slot] = _epoch(row[6])
+        self._target[slot] = code(row[7])
+        self._priority[slot] = row[9] or 0
+        self._misfire[slot] = code(row[10])
+        self._set_next_run(slot, task_id, row[8])
+
+    def discard(self, task_id):
+        slot = self._lookup(task_id)
+        if slot < 0:
+            return
+        # Bucket entries for the slot become stale and are dropped lazily
+        self._ids[slot] = -1
+        self._next_run[slot] = NOT_SET
+        self._names[slot] = None
+        self._assign(task_id, -1)
+        self._free.append(slot)
+        self._unscheduled.discard(task_id)
+        self._count -= 1
+
+    def get(self, task_id):
+        """The row of a task, or None"""
+        slot = self._lookup(task_id)
+        return self._row(slot) if slot >= 0 else None
+
+    def rows(self):
+        """Rows of all tasks"""
+        return [self._row(slot) for slot, task_id in enumerate(self._ids) if task_id >= 0]
+
+    def unscheduled(self):
+        """Rows of the tasks without a next fire time"""
+        return [self.get(task_id) for task_id in self._unscheduled]
+
+    def set_next_run(self, task_id, next_run_at):
+        slot = self._lookup(task_id)
+        if slot >= 0:
+            self._set_next_run(slot, task_id, next_run_at)
+
+    def set_last_run(self, task_id, epoch):
+        """Record a task's last run, in epoch seconds"""
+        slot = self._lookup(task_id)
+        if slot >= 0:
+            self._last_run[slot] = epoch
+
+    def due(self, until):
+        """Rows of the tasks due at or before `until`, soonest first"""
+        next_run = self._next_run
+        due = []
+        keys = self._keys
+        last = bisect.bisect_right(keys, math.floor(until / BUCKET_SECONDS))
+        for key in keys[:last]:
+            for slot in self._compact(key):
+                if next_run[slot] <= until:
+                    due.append(slot)
+        due.sort(key=next_run.__getitem__)
+        return [self._row(slot) for slot in due]
+
+    def next_run_at(self):
+        """Earliest next fire time, or None"""
+        while self._keys:
+            live = self._compact(self._keys[0])
+            if live:
+                return min(self._next_run[slot] for slot in live)
+        return None
+
+    def _compact(self, key):
+        # Keep each slot still filed under `key` once; returns those slots
+        next_run = self._next_run
+        live = array("i")
+        seen = set()
+        for slot in self._buckets[key]:
+            fire_at = next_run[slot]
+            if fire_at == fire_at and math.floor(fire_at / BUCKET_SECONDS) == key and slot not in seen:
+                seen.add(slot)
+                live.append(slot)
+        if live:
+            self._buckets[key] = live
+        else:
+            del self._buckets[key]
+            del self._keys[bisect.bisect_left(self._keys, key)]
+        return live
+
+    def _set_next_run(self, slot, task_id, next_run_at):
+        previous = self._next_run[slot]
+        if next_run_at is None:
+            self._next_run[slot] = NOT_SET
+            self._unscheduled.add(task_id)
+            return
+        self._next_run[slot] = next_run_at
+        self._unscheduled.discard(task_id)
+        key = math.floor(next_run_at / BUCKET_SECONDS)
+        if previous == previous and math.floor(previous / BUCKET_SECONDS) == key:
+            return  # already filed there
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = array("i")
+            bisect.insort(self._keys, key)
+        bucket.append(slot)
+
+    def _row(self, slot):
+        values = self._values
+        condition_type, condition_value = values[self._condition[slot]]
+        next_run, last_run = self._next_run[slot], self._last_run[slot]
+        return (
+            self._ids[slot],
+            self._names[slot],
+            values[self._action[slot]],
+            condition_type,
+            condition_value,
+            1,
+            datetime.fromtimestamp(last_run).isoformat() if last_run == last_run else None,
+            values[self._target[slot]],
+            next_run if next_run == next_run else None,
+            self._priority[slot],
+            values[self._misfire[slot]],
+        )
+
+    def _code(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self._values)
+            self._values.append(value)
+        return code
+
+    def _allocate(self, task_id):
+        if self._free:
+            slot = self._free.pop()
+            self._ids[slot] = task_id
+        else:
+            slot = len(self._ids)
+            self._ids.append(task_id)
+            self._next_run.append(NOT_SET)
+            self._last_run.append(NOT_SET)
+            self._action.append(0)
+            self._condition.append(0)
+            self._target.append(0)
+            self._priority.append(0)
+            self._misfire.append(0)
+            self._names.append(None)
+        self._assign(task_id, slot)
+        self._count += 1
+        return slot
+
+    def _lookup(self, task_id):
+        if 0 <= task_id < len(self._slot_of):
+            return self._slot_of[task_id]
+        return self._sparse.get(task_id, -1)
+
+    def _assign(self, task_id, slot):
+        slot_of = self._slot_of
+        if task_id >= len(slot_of) and task_id < len(slot_of) + MAX_ID_GAP:
+            grow = max(task_id + 1 - len(slot_of), len(slot_of))
+            slot_of.extend(array("i", [-1]) * grow)
+        if 0 <= task_id < len(slot_of):
+            slot_of[task_id] = slot
+        elif slot < 0:
+            self._sparse.pop(task_id, None)
+        else:
+            self._sparse[task_id] = slot
+
+
+def _epoch(last_run):
+    # Stored last_run values are local ISO timestamps written by the
+    # service; rows give them back in the same form
+    if not last_run:
+        return NOT_SET
+    try:
+        return datetime.fromisoformat(last_run).timestamp()
+    except (TypeError, ValueError):
+        return NOT_SET
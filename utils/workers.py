@@ -0,0 +1,308 @@
+"""Multi-process task workers for AtlasPi
+
+With `services.workers.processes` set, the service runs that many worker
+processes sharing tasks.db instead of the single scheduler thread. A
+worker claims due tasks by leasing them (owner + expiry) in one short
+transaction, runs them on its own executor, then stores each task's next
+fire time and releases the lease. Leases are renewed while runs are in
+flight; when a worker dies its leases expire and the tasks become
+claimable again. All workers must run on the host that holds tasks.db:
+WAL mode keeps its index in shared memory, which a network filesystem
+does not share between hosts.
+"""
+
+import os
+import time
+import random
+import socket
+import logging
+import sqlite3
+import threading
+import multiprocessing
+from datetime import datetime
+from utils.common import strings
+from utils.database import (
+    claim_due_tasks, finish_leased_tasks, renew_leases, release_leases, get_unscheduled_tasks,
+    get_next_run_after, update_tasks_next_run, import_tasks, deactivate_tasks, close_thread_connections
+)
+from utils.app import execute_task_action, execute_task_action_async, wait_for_wakeup
+from utils.actions import action_settings, configure_actions, shutdown_actions
+from utils.config import ConfigWatcher, get_service_settings
+from utils.executor import TaskExecutor, get_executor_settings, ignore_stop_signals
+from utils.history import start_history, OUTCOME_OK, OUTCOME_FAILED, OUTCOME_TIMEOUT, OUTCOME_MISSED
+from utils.logging_config import start_log_relay, setup_worker_logging
+from utils.scheduler import first_fire_time, next_fire_time, MISFIRE_SKIP
+from utils.conditions import FileChangedCondition
+from utils.dispatch import RateLimiter, get_dispatch_settings, misfire_policy
+
+DEFAULT_WORKER_SETTINGS = {
+    "processes": 0,            # 0 keeps the single-process scheduler
+    "lease_seconds": 120,      # how long a claim lasts without renewal
+    "claim_batch": 100,        # most tasks claimed per transaction
+    "poll_seconds": 1.0,       # longest wait between claim attempts
+    "restart_crashed": True,   # start a new worker when one dies
+}
+
+# How often the parent checks its workers and the config
+POOL_CHECK_SECONDS = 1.0
+
+# Random extra wait so idle workers do not all poll at the same moment
+POLL_JITTER_SECONDS = 0.1
+
+
+def get_worker_settings(config):
+    """Return worker settings from the app config"""
+    return get_service_settings(config, "workers", DEFAULT_WORKER_SETTINGS)
+
+
+def lease_owner():
+    """Lease owner name for this process, unique across hosts"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class TaskWorker:
+    """Claims, runs and reschedules due tasks for one worker process
+
+    `step()` does one round of work; `run()` repeats it until stopped.
+    """
+
+    def __init__(self, db_path, config=None, owner=None, run_action=execute_task_action,
+                 run_action_async=execute_task_action_async):
+        self.db_path = db_path
+        self.config = config
+        self.settings = get_worker_settings(config)
+        self.dispatch = get_dispatch_settings(config)
+        self.rates = RateLimiter(config)
+        self.owner = owner or lease_owner()
+        self.executor = TaskExecutor(run_action, config, self._on_complete, run_action_async, action_settings)
+        self.history = None
+        self._inflight = {}
+        self._finished = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._unschedulable = set()
+        self._next_renewal = 0.0
+
+    def _on_complete(self, run, ok, duration):
+        # Runs on an executor thread; the database is written by step()
+        outcome = OUTCOME_OK if ok else (OUTCOME_TIMEOUT if run.timed_out else OUTCOME_FAILED)
+        with self._lock:
+            self._finished.append(run.task_id)
+        if self.history is not None:
+            self.history.record(run.task_id, outcome, duration)
+        self._wake.set()
+
+    def step(self, now=None):
+        """Store finished runs, schedule new tasks and start due ones
+
+        Returns the number of tasks claimed and kept.
+        """
+        if now is None:
+            now = time.time()
+        self.finish_runs(now)
+        self._schedule_new(now)
+
+        # At most claim_batch runs in flight, so one worker never hoards due tasks
+        limit = self.settings["claim_batch"] - len(self._inflight)
+        claimed = []
+        if limit > 0:
+            claimed = claim_due_tasks(self.db_path, self.owner, now, self.settings["lease_seconds"], limit)
+        not_run = []
+        handed_back = 0
+        for task in claimed:
+            task_id, name, action, target, fire_at = task[0], task[1], task[2], task[7], task[8]
+            late = now - fire_at > self.dispatch["misfire_grace_seconds"]
+            if late and misfire_policy(task, self.dispatch) == MISFIRE_SKIP:
+                logging.info(strings.SCHEDULER_MISSED_RUN.format(name, now - fire_at))
+                not_run.append((next_fire_time(max(fire_at, now), task[3], task[4]), None, task_id))
+                if self.history is not None:
+                    self.history.record(task_id, OUTCOME_MISSED)
+                continue
+            # A task runs in one worker at a time, so "catch_up" runs once
+            # here like "coalesce"
+            if self.executor.has_capacity(action) and self.rates.take(action, now):
+                if late:
+                    logging.info(strings.DISPATCH_COALESCED_RUN.format(name, now - fire_at))
+                logging.info(f"Executing task: {name}")
+                self._inflight[task_id] = (task, fire_at)
+                if self.executor.submit(task_id, name, action, fire_at, target):
+                    continue
+                del self._inflight[task_id]
+            # At its concurrency or rate limit here: hand it back, still
+            # due, for another worker or a later claim
+            not_run.append((fire_at, None, task_id))
+            handed_back += 1
+        if not_run:
+            finish_leased_tasks(self.db_path, self.owner, not_run)
+
+        self.executor.check_timeouts()
+        if self.executor.results is not None:
+            self.executor.results.log_stats_if_due()
+        if self._inflight and now >= self._next_renewal:
+            renew_leases(self.db_path, self.owner, now + self.settings["lease_seconds"])
+            self._next_renewal = now + self.settings["lease_seconds"] / 3
+        return len(claimed) - handed_back
+
+    def finish_runs(self, now=None):
+        """Write the next fire time of finished runs and release their leases"""
+        with self._lock:
+            finished, self._finished = self._finished, []
+        if not finished:
+            return 0
+        if now is None:
+            now = time.time()
+        last_run = datetime.now().isoformat()
+        updates = []
+        for task_id in finished:
+            entry = self._inflight.pop(task_id, None)
+            if entry is not None:
+                task, fire_at = entry
+                # Occurrences that passed while running coalesce into this run
+                updates.append((next_fire_time(max(fire_at, now), task[3], task[4]), last_run, task_id))
+        if updates:
+            finish_leased_tasks(self.db_path, self.owner, updates)
+        return len(updates)
+
+    def _schedule_new(self, now):
+        # Any worker may do this; racing workers write equivalent values
+        updates = []
+        for task in get_unscheduled_tasks(self.db_path):
+            key = (task[0], task[3], task[4])
+            if key in self._unschedulable:
+                continue
+            fire_at = first_fire_time(task, now)
+            if fire_at is None:
+                self._unschedulable.add(key)
+                if task[3] == FileChangedCondition.condition_type:
+                    # Workers share no file watcher; only the single-process service runs these
+                    logging.warning(strings.WORKER_FILE_CHANGED.format(task[1]))
+            else:
+                updates.append((fire_at, task[0]))
+        if updates:
+            update_tasks_next_run(self.db_path, updates)
+
+    def seconds_until_wakeup(self, now=None):
+        """Seconds until the next task is due, capped at poll_seconds
+
+        Due tasks leased by other workers are only noticed by polling.
+        """
+        if now is None:
+            now = time.time()
+        timeout = self.settings["poll_seconds"]
+        next_run = get_next_run_after(self.db_path, now)
+        if next_run is not None:
+            timeout = min(timeout, max(next_run - now, 0.0))
+        remaining = self.executor.seconds_until_timeout()
+        if remaining is not None:
+            timeout = min(timeout, remaining)
+        return timeout
+
+    def run(self, stop_event):
+        """Claim and run due tasks until `stop_event` is set"""
+        self.history = start_history(self.db_path, self.config)
+        try:
+            while not stop_event.is_set():
+                try:
+                    if self.step() >= self.settings["claim_batch"]:
+                        continue  # more may be due right now
+                    timeout = self.seconds_until_wakeup()
+                except sqlite3.Error as e:
+                    logging.error(strings.WORKER_DB_ERROR.format(self.owner, e))
+                    timeout = self.settings["poll_seconds"]
+                if timeout > 0:
+                    timeout += random.uniform(0, POLL_JITTER_SECONDS)
+                self._wake.wait(timeout)
+                self._wake.clear()
+        finally:
+            # Finish what is running, then hand anything left back to the pool
+            self.executor.shutdown(timeout=self.executor.settings["drain_seconds"])
+            try:
+                self.finish_runs()
+                release_leases(self.db_path, self.owner)
+            except sqlite3.Error as e:
+                logging.error(strings.WORKER_DB_ERROR.format(self.owner, e))
+            if self.history is not None:
+                self.history.close()
+            close_thread_connections()
+
+
+def worker_main(db_path, config, stop_event, log_queue, log_level):
+    """Entry point of a worker process"""
+    # Ctrl+C and SIGTERM reach the whole process group; the parent decides
+    # when to stop
+    ignore_stop_signals()
+    setup_worker_logging(log_queue, log_level)
+    configure_actions(config, db_path)
+    worker = TaskWorker(db_path, config)
+    logging.info(strings.WORKER_STARTED.format(worker.owner))
+    try:
+        worker.run(stop_event)
+    finally:
+        shutdown_actions()
+        logging.info(strings.WORKER_STOPPED.format(worker.owner))
+
+
+def run_worker_pool(db_path, log_path, debug_mode=False, stop_flag=None, config=None, config_path=None,
+                    watcher=None, on_ready=None):
+    """Run the service as worker processes until `stop_flag` is set
+
+    Crashed workers are replaced. Config edits (seen through `config_path`
+    or `watcher`) are written to the database here; workers pick them up
+    on their next claim. `on_ready` is called once the workers are started.
+    """
+    settings = get_worker_settings(config)
+    if stop_flag is None:
+        stop_flag = threading.Event()
+    context = multiprocessing.get_context("spawn")
+    stop_event = context.Event()
+    log_queue, relay = start_log_relay(context)
+    workers = {}
+
+    def start_worker(index):
+        process = context.Process(target=worker_main, name=f"atlas-worker-{index}", daemon=True,
+                                  args=(db_path, config, stop_event, log_queue, logging.root.level))
+        process.start()
+        workers[index] = process
+
+    logging.info(strings.WORKERS_STARTING.format(settings["processes"], db_path))
+    if debug_mode:
+        logging.info(strings.PATHS_LOG_FILE.format(log_path))
+    if watcher is None and config_path:
+        watcher = ConfigWatcher(config_path, config)
+    try:
+        for index in range(settings["processes"]):
+            start_worker(index)
+        if on_ready is not None:
+            on_ready()
+        while not stop_flag.is_set():
+            changes = wait_for_wakeup(stop_flag, POOL_CHECK_SECONDS, watcher)
+            if changes:
+                upserts, removed = changes
+                try:
+                    if upserts:
+                        import_tasks(db_path, upserts)
+                    if removed:
+                        deactivate_tasks(db_path, removed)
+                except Exception as e:
+                    logging.error(strings.CONFIG_APPLY_ERROR.format(e))
+            for index, process in list(workers.items()):
+                if process.is_alive() or stop_flag.is_set():
+                    continue
+                logging.warning(strings.WORKER_EXITED.format(process.name, process.exitcode))
+                del workers[index]
+                if settings["restart_crashed"]:
+                    start_worker(index)
+        logging.info("Service stop requested")
+    except KeyboardInterrupt:
+        logging.info("Service interrupted by Ctrl+C")
+    finally:
+        stop_event.set()
+        drain_seconds = get_executor_settings(config)[0]["drain_seconds"]
+        for process in workers.values():
+            process.join(drain_seconds + 2)
+            if process.is_alive():
+                logging.warning(strings.WORKER_STOP_TIMEOUT.format(process.name))
+                process.kill()  # SIGTERM is ignored by workers
+        relay.stop()
+        close_thread_connections()
+        logging.info("AtlasPi service stopped")